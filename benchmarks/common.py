@@ -0,0 +1,125 @@
+'''common - helpers shared by the benchmark scripts
+
+Timing and memory measurement, a description of the environment, and
+machine-readable output, so that results from different releases and
+machines can be compared.
+'''
+
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def environment():
+    '''Describe the interpreter, machine and checkout the benchmark ran on'''
+
+    try:
+        from importlib.metadata import version
+        dices_version = version('dices-client')
+    except Exception:
+        dices_version = None
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+
+    return dict(
+        timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        python = platform.python_version(),
+        implementation = platform.python_implementation(),
+        platform = platform.platform(),
+        machine = platform.machine(),
+        cpus = os.cpu_count(),
+        dices_client = dices_version,
+        commit = commit,
+    )
+
+
+def measure(run, setup=None, memory=True, repeat=1):
+    '''Time a function and measure the memory it allocates
+
+    Args:
+        run: Function to measure; called with the result of setup(), if given
+        setup: Function preparing a fresh argument for each call of run();
+            not measured
+        memory (bool): Also make one extra call under tracemalloc to find
+            the peak memory allocated by run() (slower, so not timed)
+        repeat (int): Number of timed calls; the fastest is reported
+
+    Returns:
+        dict with 'seconds' (fastest call), 'peak_bytes' (or None) and
+        'result' (what the last timed call returned)
+    '''
+
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        t0 = time.perf_counter()
+        result = run(arg) if setup is not None else run()
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+
+    peak = None
+    if memory:
+        arg = setup() if setup is not None else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(arg) if setup is not None else run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return dict(seconds=best, peak_bytes=peak, result=result)
+
+
+def writeResults(suite, results, path=None, params=None):
+    '''Write results as JSON, to `path` or stdout
+
+    The document holds the suite name, its parameters, the environment
+    (see environment()) and the list of result dicts.
+    '''
+
+    doc = dict(
+        version = RESULTS_FORMAT_VERSION,
+        suite = suite,
+        params = params or {},
+        environment = environment(),
+        results = results,
+    )
+
+    if path is None or path == '-':
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(doc, f, indent=2)
+    return doc
+
+
+def formatTable(results, cols):
+    '''Format result dicts as a tab-separated table'''
+
+    lines = ['\t'.join(cols)]
+    for r in results:
+        row = []
+        for col in cols:
+            val = r.get(col)
+            row.append(f'{val:.4f}' if isinstance(val, float) else str(val))
+        lines.append('\t'.join(row))
+    return '\n'.join(lines)
@@ -0,0 +1,116 @@
+'''import_bench - time to import dicesapi in a fresh interpreter
+
+What a CLI tool or short-lived worker pays on every start. Each case runs
+in a new interpreter, so nothing is already imported:
+
+    package     import dicesapi
+    client      from dicesapi import DicesAPI
+    api         ... and make a DicesAPI
+    text        from dicesapi import text
+
+Each case reports the time of the import itself (measured inside the
+child, so without interpreter startup), the time of the whole child
+process, the number of modules the import loaded and which of the
+heavy dependencies (pandas, numpy, requests, lxml) it pulled in.
+
+Usage:
+
+    python benchmarks/import_bench.py [--cases package,client] [--repeat 10]
+        [--output results.json]
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import formatTable, writeResults
+
+CASES = dict(
+    package = 'import dicesapi',
+    client = 'from dicesapi import DicesAPI',
+    api = "from dicesapi import DicesAPI; DicesAPI(dices_api='')",
+    text = 'from dicesapi import text',
+)
+
+HEAVY = ('pandas', 'numpy', 'requests', 'lxml')
+
+# run in the child: time the statement, report what it loaded
+_CHILD = '''
+import json, sys, time
+before = set(sys.modules)
+t0 = time.perf_counter()
+exec({stmt!r})
+seconds = time.perf_counter() - t0
+print(json.dumps(dict(seconds=seconds, modules=len(set(sys.modules) - before),
+                        heavy=[m for m in {heavy!r} if m in sys.modules])))
+'''
+
+
+def importOnce(stmt):
+    '''Run `stmt` in a fresh interpreter
+
+    Returns:
+        dict with 'seconds' (the statement), 'process_seconds' (the whole
+        child), 'modules' (count loaded by the statement) and 'heavy'
+    '''
+
+    code = _CHILD.format(stmt=stmt, heavy=HEAVY)
+    t0 = time.perf_counter()
+    res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if res.returncode != 0:
+        raise RuntimeError(f'{stmt!r} failed:\n{res.stderr}')
+    result = json.loads(res.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = elapsed
+    return result
+
+
+def run(cases=None, repeat=5, log=None):
+    '''Run the suite
+
+    Returns:
+        list of result dicts with keys 'case', 'statement', 'seconds',
+        'process_seconds' (both the fastest of `repeat` runs), 'modules'
+        and 'heavy'
+    '''
+
+    if cases is None:
+        cases = list(CASES)
+    for name in cases:
+        if name not in CASES:
+            raise ValueError(f"Unknown case '{name}'; choose from {', '.join(CASES)}")
+
+    results = []
+    for name in cases:
+        runs = [importOnce(CASES[name]) for _ in range(max(1, repeat))]
+        result = dict(case=name, statement=CASES[name],
+                        seconds=min(r['seconds'] for r in runs),
+                        process_seconds=min(r['process_seconds'] for r in runs),
+                        modules=runs[-1]['modules'], heavy=runs[-1]['heavy'])
+        results.append(result)
+        if log is not None:
+            print(formatTable([result], ('case', 'seconds', 'process_seconds', 'modules',
+                                'heavy')).split('\n')[1], file=log, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='dicesapi import-time benchmark')
+    parser.add_argument('--cases', help=f"comma-separated cases (default all: {', '.join(CASES)})")
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per case; the fastest counts')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    cases = args.cases.split(',') if args.cases else None
+    results = run(cases, repeat=args.repeat, log=sys.stderr)
+
+    writeResults('import', results, args.output, params=dict(repeat=args.repeat))
+
+
+if __name__ == '__main__':
+    main()
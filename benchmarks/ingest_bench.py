@@ -0,0 +1,183 @@
+'''ingest_bench - bulk ingest() against record-by-record hydration
+
+Compares, on a full DB dump (a real one, or a synthetic corpus):
+
+    dump        indexing every table of the dump: one indexed*() call per
+                row (the path fromDump() used to take) vs. one
+                DicesAPI.ingest() call per table (what it takes now)
+    payloads    indexing the speeches as the API returns them, with full
+                nested work, cluster, speaker and addressee payloads: one
+                indexedSpeech() per record (what getSpeeches() used to do)
+                vs. one ingest('speech', ...) call
+    requery     the same payloads indexed again, as when a query is
+                repeated: both paths find every record unchanged and skip
+                hydrating it
+
+Each case reports the time and peak memory of both paths and the speedup.
+Both paths are checked to index the same number of objects.
+
+Usage:
+
+    python benchmarks/ingest_bench.py [--snapshot speechdb.json | --size 100000]
+        [--repeat 3] [--no-memory] [--output results.json]
+'''
+
+import argparse
+import copy
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dicesapi import DicesAPI, _dumpTables
+
+from common import formatTable, measure, writeResults
+from synth import apiPayloads, synthDump
+
+INDEXERS = dict(
+    author = 'indexedAuthor',
+    work = 'indexedWork',
+    character = 'indexedCharacter',
+    characterinstance = 'indexedCharacterInstance',
+    speechcluster = 'indexedSpeechCluster',
+    speech = 'indexedSpeech',
+)
+
+
+def _count(api):
+    return sum(len(getattr(api, f'_{model}_index')) for model in INDEXERS)
+
+
+def dumpPerRecord(tables):
+    api = DicesAPI(dices_api='')
+    for model, method in INDEXERS.items():
+        index = getattr(api, method)
+        for row in tables[model]:
+            index(row)
+    return _count(api)
+
+
+def dumpIngest(tables):
+    api = DicesAPI(dices_api='')
+    for model in DicesAPI.INGEST_ORDER:
+        api.ingest(model, tables[model])
+    return _count(api)
+
+
+def payloadsPerRecord(payloads):
+    api = DicesAPI(dices_api='')
+    for p in payloads:
+        api.indexedSpeech(p)
+    return _count(api)
+
+
+def payloadsIngest(payloads):
+    api = DicesAPI(dices_api='')
+    api.ingest('speech', payloads)
+    return _count(api)
+
+
+def _loaded(payloads):
+    '''A DicesAPI that has indexed the payloads once already, and a fresh copy of them'''
+
+    api = DicesAPI(dices_api='')
+    api.ingest('speech', copy.deepcopy(payloads))
+    return api, copy.deepcopy(payloads)
+
+
+def requeryPerRecord(loaded):
+    api, payloads = loaded
+    for p in payloads:
+        api.indexedSpeech(p)
+    return _count(api)
+
+
+def requeryIngest(loaded):
+    api, payloads = loaded
+    api.ingest('speech', payloads)
+    return _count(api)
+
+
+# name -> (function making input from the dump, function making a fresh
+# argument for each call from it, per-record path, ingest path)
+CASES = dict(
+    dump = (lambda dump: _dumpTables(dump), copy.deepcopy, dumpPerRecord, dumpIngest),
+    payloads = (apiPayloads, copy.deepcopy, payloadsPerRecord, payloadsIngest),
+    requery = (apiPayloads, _loaded, requeryPerRecord, requeryIngest),
+)
+
+
+def run(snapshot=None, size=100_000, cases=None, repeat=1, memory=True, seed=0, log=None):
+    '''Run the suite
+
+    Returns:
+        list of result dicts with keys 'case', 'speeches', 'objects',
+        'per_record_seconds', 'ingest_seconds', 'speedup',
+        'per_record_peak_bytes' and 'ingest_peak_bytes'
+    '''
+
+    if cases is None:
+        cases = list(CASES)
+    for name in cases:
+        if name not in CASES:
+            raise ValueError(f"Unknown case '{name}'; choose from {', '.join(CASES)}")
+
+    if snapshot is None:
+        snapshot = synthDump(size, seed=seed)
+    n_speeches = sum(1 for rec in snapshot if rec['model'].endswith('.speech'))
+
+    results = []
+    for name in cases:
+        prepare, fresh, per_record, ingest = CASES[name]
+        # every call gets a fresh copy of the input
+        base = prepare(snapshot)
+        setup = lambda: fresh(base)
+
+        slow = measure(per_record, setup=setup, memory=memory, repeat=repeat)
+        fast = measure(ingest, setup=setup, memory=memory, repeat=repeat)
+        if slow['result'] != fast['result']:
+            raise AssertionError(f"{name}: per-record path indexed {slow['result']} objects, "
+                                    f"ingest() {fast['result']}")
+
+        result = dict(case=name, speeches=n_speeches, objects=fast['result'],
+                        per_record_seconds=slow['seconds'], ingest_seconds=fast['seconds'],
+                        speedup=slow['seconds'] / fast['seconds'],
+                        per_record_peak_bytes=slow['peak_bytes'],
+                        ingest_peak_bytes=fast['peak_bytes'])
+        results.append(result)
+        if log is not None:
+            print(formatTable([result], ('case', 'speeches', 'per_record_seconds',
+                                'ingest_seconds', 'speedup')).split('\n')[1], file=log, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DicesAPI bulk ingest benchmark')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--snapshot', help='DB dump to index (JSON)')
+    source.add_argument('--size', type=int, default=100_000,
+                        help='speeches in the synthetic corpus, if no snapshot')
+    parser.add_argument('--cases', help=f"comma-separated cases (default all: {', '.join(CASES)})")
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per path; the fastest counts')
+    parser.add_argument('--no-memory', action='store_true', help='skip memory measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    snapshot = None
+    if args.snapshot:
+        with open(args.snapshot, encoding='utf-8') as f:
+            snapshot = json.load(f)
+
+    cases = args.cases.split(',') if args.cases else None
+    results = run(snapshot, args.size, cases, repeat=args.repeat,
+                    memory=not args.no_memory, seed=args.seed, log=sys.stderr)
+
+    writeResults('ingest', results, args.output, params=dict(
+        snapshot=args.snapshot, size=None if args.snapshot else args.size,
+        repeat=args.repeat, memory=not args.no_memory, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
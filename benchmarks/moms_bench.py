@@ -0,0 +1,354 @@
+'''moms_bench - mother-child speech detection benchmark
+
+Finds every speech between a mother and her child in a local DICES
+snapshot and scores the result against the gold standard in
+data/moms-bench.csv. Each kinship strategy is run from a cold in-memory
+cache and reported with precision, recall, wall time, the number of
+requests that would have gone to the network and cache hit rates, so
+strategies can be compared with one another and across versions.
+
+Nothing is downloaded. The inputs are:
+    --snapshot   a DICES DB dump, as read by DicesAPI.fromDumpFile()
+    --manto      a MANTO stand-in: an SQLite store as written by
+                 dicesapi.manto.useStore()
+    --wikidata   (optional) a Wikidata stand-in: a JSON file mapping
+                 entity ids to entity data, as found under "entities" in
+                 Special:EntityData/<id>.json
+
+Requests for entities missing from a stand-in are counted but never sent;
+they are answered as failures (MANTO) or as entities with no claims
+(Wikidata).
+
+Usage:
+
+    python benchmarks/moms_bench.py --snapshot speechdb.json \\
+        --manto manto.sqlite --wikidata wikidata.json [--json]
+'''
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from unittest.mock import Mock, patch
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dicesapi
+from dicesapi import DicesAPI, SpeechGroup, manto
+from dicesapi import stats as _stats
+from dicesapi.manto import Tie
+
+from common import formatTable
+
+GOLD_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'moms-bench.csv')
+
+STRATEGIES = ('manto-graph', 'manto-pairwise', 'wikidata')
+
+
+def loadGold(path=GOLD_PATH):
+    '''Read the gold standard as a set of (work title, l_fi, l_la) keys
+
+    The file abbreviates the last line to its line number ("1.352", "356");
+    the book is restored from the first line.
+    '''
+
+    gold = set()
+    with open(path, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            l_fi = row['l_first'].strip()
+            l_la = row['l_last'].strip()
+            if '.' in l_fi and '.' not in l_la:
+                l_la = l_fi.rsplit('.', 1)[0] + '.' + l_la
+            gold.add((row['work'].strip().lower(), l_fi, l_la))
+    return gold
+
+
+def speechKey(speech):
+    '''Key comparable with loadGold() entries'''
+
+    title = speech.work.title if speech.work is not None else None
+    return ((title or '').strip().lower(), speech.l_fi, speech.l_la)
+
+
+def score(found, gold, available=None):
+    '''Precision and recall of a set of found keys against the gold keys
+
+    Args:
+        found (set): Keys of the speeches a strategy returned
+        gold (set): Gold keys
+        available (set): Keys of every speech in the snapshot; gold
+            speeches missing from it are reported separately
+
+    Returns:
+        dict of counts and scores
+    '''
+
+    tp = len(found & gold)
+    result = dict(
+        found = len(found),
+        gold = len(gold),
+        tp = tp,
+        fp = len(found - gold),
+        fn = len(gold - found),
+        precision = tp / len(found) if found else 0.0,
+        recall = tp / len(gold) if gold else 0.0,
+    )
+    if available is not None:
+        result['gold_missing'] = len(gold - available)
+    return result
+
+
+def _offline(*args, **kwargs):
+    '''Stand-in for requests.get: every request fails without being sent'''
+
+    res = Mock()
+    res.ok = False
+    res.status_code = 503
+    return res
+
+
+class MantoCounters(object):
+    '''Count MANTO lookups and where they were answered from
+
+    The counts are what the MANTO module records in `dicesapi.stats.shared`
+    while the counter is active: its 'manto' (memory) and 'manto.store'
+    caches and its 'manto' requests. While active, requests.get in
+    dicesapi.manto is replaced by a stub that fails every request.
+    '''
+
+    def __init__(self):
+        self._before = None
+        self._after = None
+        self._patch = None
+
+    def __enter__(self):
+        self._before = _stats.shared.snapshot()
+        self._after = None
+        self._patch = patch('dicesapi.manto.requests.get', _offline)
+        self._patch.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._patch.stop()
+        self._after = _stats.shared.snapshot()
+
+    @staticmethod
+    def _counts(snap):
+        memory = snap['caches'].get('manto', {})
+        store = snap['caches'].get('manto.store', {})
+        return dict(
+            requests = sum(entry['count'] for entry in snap['requests'].get('manto', {}).values()),
+            memory_hits = memory.get('hits', 0),
+            memory_misses = memory.get('misses', 0),
+            store_hits = store.get('hits', 0),
+            store_misses = store.get('misses', 0),
+        )
+
+    def report(self):
+        after = self._after if self._after is not None else _stats.shared.snapshot()
+        before = self._counts(self._before)
+        counts = {key: value - before[key] for key, value in self._counts(after).items()}
+        lookups = counts['memory_hits'] + counts['memory_misses']
+        hits = counts['memory_hits'] + counts['store_hits']
+        return dict(
+            requests = counts['requests'],
+            lookups = lookups,
+            memory_hits = counts['memory_hits'],
+            store_hits = counts['store_hits'],
+            hit_rate = hits / lookups if lookups else None,
+        )
+
+
+def _isMotherManto(mother, child, graph=None):
+    '''Pairwise MANTO test: is `mother` the mother of `child`?'''
+
+    if manto.charIsMantoTie(mother, child, [Tie.MOTHER], graph=graph):
+        return True
+    gender = mother.gender
+    if gender is None and mother.char is not None:
+        gender = mother.char.gender
+    return (gender == 'female'
+                and bool(manto.charIsMantoTie(child, mother, [Tie.SON, Tie.DAUGHTER],
+                                                graph=graph)))
+
+
+def _pairwise(speeches, is_mother):
+    '''Speeches in which some speaker and addressee are mother and child'''
+
+    found = []
+    for s in speeches:
+        if any(is_mother(a, b) or is_mother(b, a) for a in s.spkr for b in s.addr):
+            found.append(s)
+    return SpeechGroup(found, api=speeches.api)
+
+
+def findMantoGraph(speeches):
+    '''Build one KinshipGraph, then answer every speech by set lookup'''
+
+    instances = [inst for s in speeches for inst in s.spkr + s.addr]
+    graph = manto.KinshipGraph(instances)
+    return graph.kinSpeeches(speeches, ['mother'], symmetric=True)
+
+
+def findMantoPairwise(speeches):
+    '''Resolve MANTO ties separately for every speaker/addressee pair'''
+
+    return _pairwise(speeches, _isMotherManto)
+
+
+def findWikidata(speeches):
+    '''Batch-fetch entities, then check "mother" and "child" claims per pair'''
+
+    from dicesapi import wikidata as wd
+
+    wd.prefetch(inst for s in speeches for inst in s.spkr + s.addr)
+
+    def is_mother(mother, child):
+        return bool(wd.checkWDRelation(child, mother, wd.HAS_MOTHER)
+                        or wd.checkWDRelation(mother, child, wd.HAS_CHILD))
+
+    return _pairwise(speeches, is_mother)
+
+
+def _wikidataStandIn(path):
+    '''Return (client, counters) answering entity requests from a JSON file'''
+
+    from wikidata.client import Client
+
+    with open(path, encoding='utf-8') as f:
+        entities = json.load(f)
+
+    counters = dict(requests=0, snapshot_hits=0, batch_requests=0)
+
+    class SnapshotClient(Client):
+        def request(self, path):
+            if 'wbgetentities' in path:
+                counters['batch_requests'] += 1
+                ids = parse_qs(urlparse(path).query)['ids'][0].split('|')
+                return {'entities': {i: entities.get(i, dict(id=i, missing=''))
+                                        for i in ids}}
+
+            entity_id = path.rsplit('/', 1)[-1].split('.')[0]
+            if entity_id in entities:
+                counters['snapshot_hits'] += 1
+                return {'entities': {entity_id: entities[entity_id]}}
+            # counted as a request, but answered as an entity with no claims
+            counters['requests'] += 1
+            entity_type = 'property' if entity_id.startswith('P') else 'item'
+            return {'entities': {entity_id: dict(id=entity_id, type=entity_type, claims={})}}
+
+    return SnapshotClient(), counters
+
+
+def runStrategy(strategy, speeches, manto_path=None, wikidata_path=None):
+    '''Run one strategy from a cold cache; return (found SpeechGroup, stats)'''
+
+    if strategy.startswith('manto'):
+        if manto_path is None:
+            raise ValueError(f'{strategy} needs a MANTO stand-in')
+        find = findMantoGraph if strategy == 'manto-graph' else findMantoPairwise
+
+        manto.__manto_index__.clear()
+        manto.useStore(manto_path)
+        try:
+            with MantoCounters() as counters:
+                t0 = time.perf_counter()
+                found = find(speeches)
+                wall = time.perf_counter() - t0
+        finally:
+            manto.useStore(None)
+        return found, dict(wall_time=wall, **counters.report())
+
+    if strategy == 'wikidata':
+        if wikidata_path is None:
+            raise ValueError('wikidata needs a Wikidata stand-in')
+        from dicesapi import wikidata as wd
+
+        client, counters = _wikidataStandIn(wikidata_path)
+        saved = wd._client
+        wd._client = client
+        wd.__wd_cache__.clear()
+        wd.useClaimIndex(None)
+        try:
+            t0 = time.perf_counter()
+            found = findWikidata(speeches)
+            wall = time.perf_counter() - t0
+        finally:
+            wd._client = saved
+        lookups = counters['requests'] + counters['snapshot_hits']
+        return found, dict(
+            wall_time = wall,
+            requests = counters['requests'],
+            lookups = lookups,
+            snapshot_hits = counters['snapshot_hits'],
+            batch_requests = counters['batch_requests'],
+            cache_entries = len(wd.__wd_cache__),
+        )
+
+    raise ValueError(f"Unknown strategy '{strategy}'; choose from {', '.join(STRATEGIES)}")
+
+
+def run(snapshot, manto_path=None, wikidata_path=None, strategies=None, gold_path=GOLD_PATH):
+    '''Load the snapshot once and benchmark each strategy on it
+
+    Returns:
+        list of result dicts, one per strategy
+    '''
+
+    t0 = time.perf_counter()
+    api = DicesAPI.fromDumpFile(snapshot)
+    load_time = time.perf_counter() - t0
+
+    speeches = SpeechGroup(list(api._speech_index.values()), api=api)
+    available = {speechKey(s) for s in speeches}
+    gold = loadGold(gold_path)
+
+    if strategies is None:
+        strategies = [s for s in STRATEGIES
+                        if (s.startswith('manto') and manto_path is not None)
+                        or (s == 'wikidata' and wikidata_path is not None)]
+
+    results = []
+    for strategy in strategies:
+        found, stats = runStrategy(strategy, speeches, manto_path, wikidata_path)
+        result = dict(strategy=strategy, speeches=len(speeches), load_time=load_time)
+        result.update(score({speechKey(s) for s in found}, gold, available))
+        result.update(stats)
+        results.append(result)
+        dicesapi.logger.info(f"{strategy}: P={result['precision']:.3f} "
+                                f"R={result['recall']:.3f} in {stats['wall_time']:.3f}s")
+
+    return results
+
+
+# columns of the plain-text report
+REPORT_COLS = ('strategy', 'found', 'tp', 'fp', 'fn', 'precision', 'recall',
+                'wall_time', 'requests', 'lookups', 'hit_rate')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--snapshot', required=True, help='DICES DB dump (JSON)')
+    parser.add_argument('--manto', help='MANTO stand-in (SQLite store)')
+    parser.add_argument('--wikidata', help='Wikidata stand-in (JSON)')
+    parser.add_argument('--gold', default=GOLD_PATH, help='gold standard CSV')
+    parser.add_argument('--strategy', action='append', choices=STRATEGIES,
+                        help='strategy to run; may be repeated (default: all available)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.snapshot, manto_path=args.manto, wikidata_path=args.wikidata,
+                    strategies=args.strategy, gold_path=args.gold)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print(formatTable(results, REPORT_COLS))
+
+
+if __name__ == '__main__':
+    main()
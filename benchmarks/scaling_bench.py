@@ -0,0 +1,180 @@
+'''scaling_bench - how client-side operations scale with corpus size
+
+Times, and measures the peak memory of, core DicesAPI operations on
+synthetic corpora (see synth.py) of increasing size:
+
+    fromDump            parse a DB dump (what fromGitDump() does after
+                        downloading)
+    indexedSpeech       ingest nested API payloads one speech at a time
+    filterBy            SpeechGroup.filterBy() on speech type
+    advancedFilter      SpeechGroup.advancedFilter() on speaker gender
+    union, difference,
+    intersect           SpeechGroup +, - and intersect() of two halves
+                        that overlap by half
+    sorted              SpeechGroup.sorted(), i.e. by work and seq
+    sortedByLocus       SpeechGroup.sortedByLocus()
+    ExportToCSV         write a SpeechGroup to CSV
+    buildLineArray      Passage._buildLineArray() on a TEI passage of
+                        n / 10 lines
+
+Results are written as JSON (see common.writeResults()), one entry per
+case and size, so they can be tracked across releases.
+
+Some set operations are quadratic in this version of the client; they are
+skipped, and reported as such, above --max-quadratic speeches.
+
+Usage:
+
+    python benchmarks/scaling_bench.py [--sizes 10000,100000,1000000]
+        [--cases filterBy,sorted] [--repeat 3] [--no-memory] [--output results.json]
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lxml import etree
+
+from dicesapi import DicesAPI, SpeechGroup
+from dicesapi.text import Passage
+
+from common import formatTable, measure, writeResults
+from synth import apiPayloads, synthDump, teiPassage
+
+SIZES = (10_000, 100_000, 1_000_000)
+MAX_QUADRATIC = 10_000
+
+
+def _speeches(ctx):
+    '''The corpus as a SpeechGroup, built once per size'''
+
+    if 'speeches' not in ctx:
+        api = DicesAPI.fromDump(ctx['dump'])
+        ctx['speeches'] = SpeechGroup(list(api._speech_index.values()), api=api)
+    return ctx['speeches']
+
+
+def _halves(ctx):
+    '''Two groups, each half the corpus, overlapping by half of each'''
+
+    speeches = _speeches(ctx)
+    n = len(speeches)
+    return speeches[:n // 2], speeches[n // 4:n // 4 + n // 2]
+
+
+def _ingest(payloads):
+    api = DicesAPI(dices_api='')
+    for p in payloads:
+        api.indexedSpeech(p)
+    return api
+
+
+def _exportCSV(speeches):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        speeches.ExportToCSV(path)
+        return os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def _buildLineArray(xml):
+    passage = Passage()
+    passage.xml = xml
+    passage._buildLineArray()
+    return passage.line_array
+
+
+# name -> (setup(ctx) returning a function preparing run's argument,
+#          run(arg), items processed given n, quadratic?)
+CASES = dict(
+    fromDump = (lambda ctx: lambda: ctx['dump'],
+                DicesAPI.fromDump, lambda n: n, False),
+    indexedSpeech = (lambda ctx: lambda: apiPayloads(ctx['dump']),
+                    _ingest, lambda n: n, False),
+    filterBy = (lambda ctx: lambda: _speeches(ctx),
+                lambda s: s.filterBy('type', {'D', 'M'}), lambda n: n, False),
+    advancedFilter = (lambda ctx: lambda: _speeches(ctx),
+                        lambda s: s.advancedFilter(
+                            lambda x: any(i.gender == 'female' for i in x.spkr)),
+                        lambda n: n, False),
+    union = (lambda ctx: lambda: _halves(ctx),
+                lambda ab: ab[0] + ab[1], lambda n: n, False),
+    difference = (lambda ctx: lambda: _halves(ctx),
+                    lambda ab: ab[0] - ab[1], lambda n: n, True),
+    intersect = (lambda ctx: lambda: _halves(ctx),
+                    lambda ab: ab[0].intersect(ab[1]), lambda n: n, True),
+    sorted = (lambda ctx: lambda: _speeches(ctx),
+                lambda s: s.sorted(), lambda n: n, False),
+    sortedByLocus = (lambda ctx: lambda: _speeches(ctx),
+                        lambda s: s.sortedByLocus(), lambda n: n, False),
+    ExportToCSV = (lambda ctx: lambda: _speeches(ctx),
+                    _exportCSV, lambda n: n, False),
+    buildLineArray = (lambda ctx: lambda: etree.fromstring(teiPassage(max(1, ctx['n'] // 10))),
+                        _buildLineArray, lambda n: max(1, n // 10), False),
+)
+
+
+def run(sizes=SIZES, cases=None, repeat=1, memory=True, max_quadratic=MAX_QUADRATIC,
+        seed=0, log=None):
+    '''Run the suite
+
+    Returns:
+        list of result dicts with keys 'case', 'n' (speeches in the
+        corpus), 'items' (items processed), 'seconds', 'peak_bytes' and
+        'status' ('ok' or 'skipped')
+    '''
+
+    if cases is None:
+        cases = list(CASES)
+    for name in cases:
+        if name not in CASES:
+            raise ValueError(f"Unknown case '{name}'; choose from {', '.join(CASES)}")
+
+    results = []
+    for n in sizes:
+        ctx = dict(n=n, dump=synthDump(n, seed=seed))
+        for name in cases:
+            setup, fn, items, quadratic = CASES[name]
+            result = dict(case=name, n=n, items=items(n))
+            if quadratic and max_quadratic is not None and n > max_quadratic:
+                result.update(seconds=None, peak_bytes=None, status='skipped')
+            else:
+                m = measure(fn, setup=setup(ctx), memory=memory, repeat=repeat)
+                result.update(seconds=m['seconds'], peak_bytes=m['peak_bytes'], status='ok')
+            results.append(result)
+            if log is not None:
+                print(formatTable([result], ('case', 'n', 'seconds', 'peak_bytes',
+                                    'status')).split('\n')[1], file=log, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DicesAPI scaling benchmarks')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in SIZES),
+                        help='comma-separated corpus sizes, in speeches')
+    parser.add_argument('--cases', help=f"comma-separated cases (default all: {', '.join(CASES)})")
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per case; the fastest counts')
+    parser.add_argument('--no-memory', action='store_true', help='skip memory measurement')
+    parser.add_argument('--max-quadratic', type=int, default=MAX_QUADRATIC,
+                        help='largest corpus for quadratic cases')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    sizes = [int(n) for n in args.sizes.split(',')]
+    cases = args.cases.split(',') if args.cases else None
+    results = run(sizes, cases, repeat=args.repeat, memory=not args.no_memory,
+                    max_quadratic=args.max_quadratic, seed=args.seed, log=sys.stderr)
+
+    writeResults('scaling', results, args.output, params=dict(
+        sizes=sizes, repeat=args.repeat, memory=not args.no_memory,
+        max_quadratic=args.max_quadratic, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+'''scenario_bench - end-to-end benchmarks of analysts' queries
+
+Runs the workloads of the scripts in Examples/SpeechTests against a local
+DICES stand-in (dicesapi.standin) serving either a DB dump or a synthetic
+corpus, and reports for each scenario the total time, requests issued,
+bytes transferred and peak client memory. The server runs in a child
+process, so its work isn't counted against the client.
+
+Scenarios (adapted to the current client API where the example scripts
+have drifted from it):
+
+    all_speeches            RetrieveAllSpeeches.py, without fetching texts
+    speeches_from_author    GetAllSpeechesFromAuthor.py
+    female_speakers         GetAllFemaleSpeakersFromAuthor.py
+    two_people              GetAllSpeechesBetweenTwoPeople.py
+    with_females            GetAllSpeechesWithFemales.py
+    men_to_women            MenTalkingToWomen.py
+
+Each run starts from a cold client. Latency, error rate and page size of
+the stand-in are parameters, so the effect of round trips can be studied.
+
+Usage:
+
+    python benchmarks/scenario_bench.py [--snapshot speechdb.json | --size 10000]
+        [--latency 0.05] [--page-size 100] [--author Homer] [--repeat 3]
+        [--scenarios men_to_women,two_people] [--output results.json]
+'''
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dicesapi import DicesAPI, FilterParams
+from dicesapi.standin import DEFAULT_PAGE_SIZE, StandInProcess
+
+from common import formatTable, writeResults
+from synth import synthDump
+
+FEMALE = FilterParams.CHARACTER_GENDER_FEMALE
+MALE = FilterParams.CHARACTER_GENDER_MALE
+
+
+def allSpeeches(api, author):
+    return len(api.getSpeeches())
+
+
+def speechesFromAuthor(api, author):
+    return len(api.getSpeeches(author_name=author))
+
+
+def femaleSpeakers(api, author):
+    speeches = api.getSpeeches(author_name=author)
+    return len(speeches.getSpkrs(flatten=True).filterGenders([FEMALE]).getNames())
+
+
+def twoPeople(api, author):
+    return len(api.getSpeeches().advancedFilter(
+        lambda s: len(s.spkr) == 1 and len(s.addr) == 1 and s.spkr[0] is not s.addr[0]))
+
+
+def withFemales(api, author):
+    return len(api.getSpeeches().advancedFilter(
+        lambda s: any(c.gender == FEMALE for c in s.spkr + s.addr)))
+
+
+def menToWomen(api, author):
+    return len(api.getSpeeches().advancedFilter(
+        lambda s: any(c.gender == MALE for c in s.spkr)
+                    and any(c.gender == FEMALE for c in s.addr)))
+
+
+SCENARIOS = dict(
+    all_speeches = allSpeeches,
+    speeches_from_author = speechesFromAuthor,
+    female_speakers = femaleSpeakers,
+    two_people = twoPeople,
+    with_females = withFemales,
+    men_to_women = menToWomen,
+)
+
+
+def runScenario(server, scenario, author='Homer', memory=True):
+    '''Run one scenario from a cold client
+
+    Returns:
+        dict with 'seconds', 'requests', 'bytes', 'errors', 'peak_bytes'
+        and 'result' (the scenario's count)
+    '''
+
+    fn = SCENARIOS[scenario]
+    gc.collect()
+    server.resetStats()
+    if memory:
+        tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        api = DicesAPI(dices_api=server.url)
+        result = fn(api, author)
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    stats = server.stats()
+
+    return dict(seconds=seconds, requests=stats['requests'], bytes=stats['bytes'],
+                errors=stats['errors'], peak_bytes=peak, result=result)
+
+
+def run(snapshot=None, size=10_000, scenarios=None, author='Homer', latency=0,
+        error_rate=0, page_size=DEFAULT_PAGE_SIZE, repeat=1, memory=True, seed=0, log=None):
+    '''Serve the corpus once and run each scenario `repeat` times
+
+    The fastest run of each scenario is reported; requests and bytes are
+    the same for every run.
+
+    Returns:
+        list of result dicts, one per scenario
+    '''
+
+    if scenarios is None:
+        scenarios = list(SCENARIOS)
+    for name in scenarios:
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'; choose from {', '.join(SCENARIOS)}")
+
+    if snapshot is None:
+        snapshot = synthDump(size, seed=seed)
+
+    results = []
+    with StandInProcess(snapshot, page_size=page_size, latency=latency,
+                        error_rate=error_rate, seed=seed) as server:
+        for name in scenarios:
+            runs = [runScenario(server, name, author, memory) for _ in range(max(1, repeat))]
+            best = min(runs, key=lambda r: r['seconds'])
+            result = dict(scenario=name, latency=latency, page_size=page_size,
+                            error_rate=error_rate, **best)
+            result['peak_bytes'] = max((r['peak_bytes'] or 0) for r in runs) if memory else None
+            results.append(result)
+            if log is not None:
+                print(formatTable([result], ('scenario', 'seconds', 'requests', 'bytes',
+                                    'peak_bytes', 'result')).split('\n')[1], file=log, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DicesAPI scenario benchmarks')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--snapshot', help='DB dump to serve (JSON)')
+    source.add_argument('--size', type=int, default=10_000,
+                        help='speeches in the synthetic corpus, if no snapshot')
+    parser.add_argument('--scenarios',
+                        help=f"comma-separated scenarios (default all: {', '.join(SCENARIOS)})")
+    parser.add_argument('--author', default='Homer')
+    parser.add_argument('--latency', type=float, default=0, help='seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help='skip memory measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    scenarios = args.scenarios.split(',') if args.scenarios else None
+    results = run(args.snapshot, args.size, scenarios, author=args.author,
+                    latency=args.latency, error_rate=args.error_rate,
+                    page_size=args.page_size, repeat=args.repeat,
+                    memory=not args.no_memory, seed=args.seed, log=sys.stderr)
+
+    writeResults('scenario', results, args.output, params=dict(
+        snapshot=args.snapshot, size=None if args.snapshot else args.size,
+        author=args.author, latency=args.latency, error_rate=args.error_rate,
+        page_size=args.page_size, repeat=args.repeat, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
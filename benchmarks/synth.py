@@ -0,0 +1,157 @@
+'''synth - synthetic DICES corpora for benchmarks
+
+Generates DB dumps of any size, in the format read by DicesAPI.fromDump()
+and served by dicesapi.standin, with speakers, addressees, works and
+clusters drawn at random (but reproducibly, from a seed). The first few
+characters and authors have familiar names, so scenario benchmarks can ask
+for e.g. speeches between Achilles and Thetis, or Homer's female speakers.
+'''
+
+import random
+
+AUTHORS = ['Homer', 'Vergil', 'Apollonius', 'Ovid', 'Lucan', 'Statius',
+            'Valerius Flaccus', 'Silius Italicus', 'Quintus Smyrnaeus', 'Nonnus']
+
+WORKS_PER_AUTHOR = 3
+
+# (name, gender, being)
+NAMED_CHARACTERS = [
+    ('Achilles', 'male', 'mortal'),
+    ('Thetis', 'female', 'divine'),
+    ('Agamemnon', 'male', 'mortal'),
+    ('Hector', 'male', 'mortal'),
+    ('Andromache', 'female', 'mortal'),
+    ('Hecuba', 'female', 'mortal'),
+    ('Aeneas', 'male', 'mortal'),
+    ('Venus', 'female', 'divine'),
+    ('Jupiter', 'male', 'divine'),
+    ('Juno', 'female', 'divine'),
+]
+
+GENDERS = ['male'] * 6 + ['female'] * 3 + ['x']
+BEINGS = ['mortal'] * 6 + ['divine'] * 3 + ['creature']
+NUMBERS = ['individual'] * 8 + ['collective', 'other']
+SPEECH_TYPES = ['D'] * 6 + ['M'] * 2 + ['S', 'G']
+
+SPEECHES_PER_CLUSTER = 3
+LINES_PER_BOOK = 900
+
+
+def _record(model, pk, **fields):
+    return dict(model=f'speechdb.{model}', pk=pk, fields=fields)
+
+
+def synthDump(n_speeches, seed=0, n_characters=None):
+    '''Return a synthetic DB dump with `n_speeches` speeches
+
+    Args:
+        n_speeches (int): Number of speeches
+        seed: Random seed; the same seed gives the same corpus
+        n_characters (int): Number of characters; by default one per 50
+            speeches, and at least as many as there are named characters
+
+    Returns:
+        list of dump records
+    '''
+
+    rng = random.Random(seed)
+
+    if n_characters is None:
+        n_characters = max(len(NAMED_CHARACTERS) * 5, n_speeches // 50)
+
+    dump = [_record('metadata', 1, name='date', value='synthetic')]
+
+    works = []
+    for a, name in enumerate(AUTHORS, start=1):
+        dump.append(_record('author', a, name=name, wd=f'QA{a}', urn=f'urn:cts:synth:a{a}'))
+        for w in range(WORKS_PER_AUTHOR):
+            work_id = len(works) + 1
+            works.append(work_id)
+            dump.append(_record('work', work_id, title=f'{name} {w + 1}', author=a,
+                                lang='greek' if a % 2 else 'latin',
+                                wd=f'QW{work_id}', urn=f'urn:cts:synth:a{a}.w{work_id}'))
+
+    for c in range(1, n_characters + 1):
+        if c <= len(NAMED_CHARACTERS):
+            name, gender, being = NAMED_CHARACTERS[c - 1]
+        else:
+            name, gender, being = f'Character {c}', rng.choice(GENDERS), rng.choice(BEINGS)
+        number = 'individual' if c <= len(NAMED_CHARACTERS) else rng.choice(NUMBERS)
+        dump.append(_record('character', c, name=name, gender=gender, being=being,
+                            number=number, wd=f'QC{c}', manto=f'M{c}'))
+        # instance ids match character ids
+        dump.append(_record('characterinstance', c, char=c, name=name, gender=gender,
+                            being=being, number=number, anon=False))
+
+    n_clusters = -(-n_speeches // SPEECHES_PER_CLUSTER)
+    cluster_work = {}
+    for k in range(1, n_clusters + 1):
+        cluster_work[k] = rng.choice(works)
+        dump.append(_record('speechcluster', k, type=rng.choice(SPEECH_TYPES),
+                            work=cluster_work[k]))
+
+    line = {}
+    for s in range(1, n_speeches + 1):
+        cluster = (s - 1) // SPEECHES_PER_CLUSTER + 1
+        work = cluster_work[cluster]
+        first = line.get(work, 0) + rng.randint(1, 20)
+        last = first + rng.randint(0, 30)
+        line[work] = last
+        spkr = rng.randint(1, n_characters)
+        addr = rng.randint(1, n_characters - 1)
+        if addr >= spkr:
+            addr += 1
+        dump.append(_record('speech', s, cluster=cluster, work=work, seq=s,
+                            l_fi=_locus(first), l_la=_locus(last),
+                            spkr=[spkr], addr=[addr], part=1, level=0,
+                            type=rng.choice(SPEECH_TYPES)))
+
+    return dump
+
+
+def _locus(n):
+    '''Line counter to "book.line"'''
+    return f'{n // LINES_PER_BOOK + 1}.{n % LINES_PER_BOOK + 1}'
+
+
+def apiPayloads(dump):
+    '''Speech records as the API returns them, nested, for indexedSpeech()
+
+    Every speech gets its own speaker/addressee dicts, since indexing a
+    payload replaces nested dicts with objects.
+    '''
+
+    tables = {}
+    for rec in dump:
+        tables.setdefault(rec['model'].split('.')[-1], {})[rec['pk']] = rec['fields']
+
+    def row(model, pk):
+        return dict(tables[model][pk], id=pk)
+
+    def inst(pk):
+        data = row('characterinstance', pk)
+        data['char'] = row('character', data['char'])
+        return data
+
+    payloads = []
+    for pk, fields in tables.get('speech', {}).items():
+        work = row('work', fields['work'])
+        work['author'] = row('author', work['author'])
+        speech = dict(fields, id=pk, work=work)
+        speech['cluster'] = dict(id=fields['cluster'],
+                                    type=tables['speechcluster'][fields['cluster']]['type'])
+        speech['spkr'] = [inst(i) for i in fields['spkr']]
+        speech['addr'] = [inst(i) for i in fields['addr']]
+        payloads.append(speech)
+    return payloads
+
+
+def teiPassage(n_lines):
+    '''A TEI passage of `n_lines` verse lines, with a note every tenth line'''
+
+    lines = []
+    for n in range(1, n_lines + 1):
+        note = '<note>editorial note</note>' if n % 10 == 0 else ''
+        lines.append(f'<l n="{n}">arma virumque cano  {note} Troiae qui primus ab oris</l>')
+    return ('<TEI xmlns="http://www.tei-c.org/ns/1.0"><text><body><div>'
+            + ''.join(lines) + '</div></body></text></TEI>').encode()
@@ -0,0 +1,1387 @@
+'''client - DicesAPI, the connection to the DICES API
+
+Queries the API (or loads a DB dump) and hydrates the records into the
+indexed objects of `dicesapi.models`. `DicesAPI` is importable from
+`dicesapi`.
+'''
+
+import gc
+import json
+import logging
+import re
+import threading
+from urllib.parse import urlparse
+
+from . import logger
+from . import stats as _stats
+from . import tracing
+from .locus import IntervalIndex
+from .models import (
+    AuthorGroup, Author, WorkGroup, Work, CharacterGroup, Character,
+    CharacterInstanceGroup, CharacterInstance, SpeechClusterGroup, SpeechCluster,
+    SpeechGroup, Speech,
+)
+
+
+def _dumpTables(db_dump):
+    '''Sort DB dump records into one list of rows per model
+
+    Each row is a copy of the record's fields plus its primary key as "id".
+    '''
+
+    tables = dict(
+        metadata = [],
+        author = [],
+        work = [],
+        character = [],
+        characterinstance = [],
+        speech = [],
+        speechcluster = [],
+        speechtag = []
+    )
+
+    for rec in db_dump:
+        model = rec["model"].split(".")[-1]
+        row = dict(rec["fields"])
+        row["id"] = rec["pk"]
+        tables.setdefault(model, []).append(row)
+
+    return tables
+
+
+def _speechSpan(speech):
+    '''What a speech's place in the interval indexes depends on'''
+    return (speech.work, speech.l_fi, speech.l_la)
+
+
+def _isStub(obj):
+    '''True if an indexed object was made from its id alone'''
+    return obj._attributes is None or len(obj._attributes) < 2
+
+
+# ingest() calls under way, in any thread, and whether cyclic garbage
+# collection was enabled when the first of them began
+_gc_lock = threading.Lock()
+_gc_paused = 0
+_gc_was_enabled = False
+
+
+def _pauseGC():
+    '''Disable cyclic garbage collection until as many _resumeGC() calls
+
+    gc is process-wide, so the calls are counted: it's enabled again only
+    once the last one ends, and only if it was enabled before the first.
+    '''
+
+    global _gc_paused, _gc_was_enabled
+    with _gc_lock:
+        if _gc_paused == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_paused += 1
+
+
+def _resumeGC():
+    global _gc_paused
+    with _gc_lock:
+        _gc_paused -= 1
+        if _gc_paused == 0 and _gc_was_enabled:
+            gc.enable()
+
+
+def _ingested(index, value):
+    '''The object in `index` for a payload dict or id; objects pass through'''
+
+    if isinstance(value, dict):
+        return index[value['id']]
+    if isinstance(value, int):
+        return index[value]
+    return value
+
+
+class DicesAPI(object):
+    '''a connection to the DICES API'''
+
+    DEFAULT_API = 'http://db.dices.mta.ca/api/'
+
+    # Deprecated `logdetail` levels, retained for backward compatibility with
+    # code written against earlier versions of dicesapi. New code should
+    # configure the `dicesapi` logger directly, e.g.:
+    #
+    #     import logging
+    #     logging.getLogger('dicesapi').setLevel(logging.INFO)
+    #
+    LOG_NODETAIL = 0
+    LOG_LOWDETAIL = 1
+    LOG_MEDDETAIL = 2
+    LOG_HIGHDETAIL = 3
+
+    _LOGDETAIL_LEVELS = {
+        LOG_NODETAIL: logging.WARNING,
+        LOG_LOWDETAIL: logging.INFO,
+        LOG_MEDDETAIL: logging.DEBUG,
+        LOG_HIGHDETAIL: logging.DEBUG,
+    }
+
+    # models ingest() accepts, nested models first
+    INGEST_ORDER = ('author', 'work', 'character', 'characterinstance', 'speechcluster', 'speech')
+
+    # plural (endpoint) names accepted for models
+    _MODEL_ALIASES = dict(
+        authors = 'author',
+        works = 'work',
+        characters = 'character',
+        instances = 'characterinstance',
+        clusters = 'speechcluster',
+        speeches = 'speech',
+    )
+
+    # nested fields of each model's records, and the models they hold
+    _NESTED_FIELDS = dict(
+        work = dict(author='author'),
+        characterinstance = dict(char='character'),
+        speechcluster = dict(work='work'),
+        speech = dict(work='work', cluster='speechcluster',
+                        spkr='characterinstance', addr='characterinstance'),
+    )
+    _LIST_FIELDS = frozenset(('spkr', 'addr'))
+
+    # nested fields whose payloads _from_data() replaces with objects in
+    # the record itself; the others keep their payloads in _attributes
+    _REPLACED_FIELDS = dict(
+        work = frozenset(('author',)),
+        characterinstance = frozenset(('char',)),
+        speechcluster = frozenset(('work',)),
+        speech = frozenset(('spkr', 'addr')),
+    )
+
+
+    def __init__(self, dices_api=DEFAULT_API, logfile=None,
+                    logdetail=None, progress_class=None):
+        """Create a connection to the DICES API.
+
+        Args:
+            dices_api: Base URL of the DICES API.
+            logfile (str): If given, also write log messages to this file.
+            logdetail: Deprecated. If given, sets the verbosity of the
+                shared `dicesapi` logger (one of the LOG_* constants).
+                New code should call
+                `logging.getLogger('dicesapi').setLevel(...)` instead.
+            progress_class: Optional progress-bar class used by
+                `getPagedJSON`.
+        """
+        self.API = dices_api
+        self.config = {}
+        if logdetail is not None:
+            logger.setLevel(self._LOGDETAIL_LEVELS.get(logdetail, logging.DEBUG))
+        if logfile is not None:
+            self.createLog(logfile)
+        self._ProgressClass = progress_class
+        self._work_index = {}
+        self._author_index = {}
+        self._character_index = {}
+        self._characterinstance_index = {}
+        self._speech_index = {}
+        self._speechcluster_index = {}
+        self._tag_index = {}
+        self._interval_index = {}
+        # bumped whenever speeches are added or their work or loci change;
+        # interval indexes are rebuilt when it's moved on since they were built
+        self._speech_generation = 0
+        self._interval_index_generation = None
+        self._stats = _stats.Stats()
+        self.version = "DEBUG VERSION 1.0"
+        logger.info("Database Initialized")
+
+
+    def initializeCts(self, cts_pattern=None):
+        '''Enable text retrieval via the dicesapi.text module.
+
+        Call this before using Speech.fetchPassage(). Optionally pass a custom
+        URL pattern with a {cts_urn} placeholder to override the default
+        Perseus endpoint.
+        '''
+        from dicesapi import text
+        from dicesapi.text import DEFAULT_CTS_PATTERN
+        self.config.setdefault('cts_pattern', cts_pattern or DEFAULT_CTS_PATTERN)
+        self.config.setdefault('cts_cache', {})
+        logger.info("CTS text retrieval initialized")
+
+
+    def initializeNlp(self, latin_model=None, greek_model=None, cache_dir=None,
+                        cache_max_entries=None, cache_max_bytes=None, lazy=True,
+                        enable=None, disable=None, exclude=None):
+        '''Enable NLP via the dicesapi.nlp_spacy module.
+
+        Call this before using Passage.runSpacyPipeline(). Pass model names
+        for the languages you need; omit a language to skip loading it.
+        At least one model must be specified.
+
+        By default each model is loaded only when a passage in its language
+        is first parsed, and loaded models are shared with other DicesAPI
+        instances in the same process. Pass lazy=False to load immediately.
+        `enable`, `disable` and `exclude` are lists of pipeline component
+        names, passed to spacy.load(); e.g. exclude=['parser', 'ner'] when
+        only lemmas are needed.
+
+        If `cache_dir` is given, parsed docs are cached on disk there, keyed
+        by model and text, and reused by later runs instead of re-parsing.
+        `cache_max_entries` and `cache_max_bytes` bound the cache's size.
+        '''
+        import dicesapi.nlp_spacy as nlp_spacy
+        self.config.setdefault('nlp', nlp_spacy.spacy_load(latin_model, greek_model,
+                        lazy=lazy, enable=enable, disable=disable, exclude=exclude))
+        if cache_dir is not None:
+            self.config.setdefault('nlp_cache', nlp_spacy.DocCache(cache_dir,
+                        max_entries=cache_max_entries, max_bytes=cache_max_bytes))
+        logger.info("NLP initialized")
+
+
+    @tracing.traced(cat='query')
+    def getPagedJSON(self, endpoint, params=None, progress=False):
+        '''Collect paged results from the API'''
+
+        import requests
+
+        logger.info("Retrieving data from the database")
+        
+        # tidy slashes
+        api = self.API.rstrip('/')
+        endpoint = endpoint.lstrip('/')
+        
+        # make the request, retrieve json
+        url = f'{api}/{endpoint}'
+        with self._stats.timeRequest('dices', endpoint, url) as req:
+            res = requests.get(url, params)
+            req.done(_stats.responseSize(res), res.status_code == requests.codes.ok)
+        pages = 1
+        
+        if res.status_code == requests.codes.ok:
+            data = res.json()
+        else:
+            res.raise_for_status()
+        
+        # how many results in total?
+        count = data['count']
+        
+        # collect results
+        results = data['results']
+        
+        # create a progress bar
+        pbar = None
+        if progress:
+            if self._ProgressClass is not None:
+                pbar = self._ProgressClass(max=count)
+        
+        # check for more pages
+        while data['next']:
+            with self._stats.timeRequest('dices', endpoint, data['next']) as req:
+                res = requests.get(data['next'])
+                req.done(_stats.responseSize(res), res.status_code == requests.codes.ok)
+            pages += 1
+            if res.status_code == requests.codes.ok:
+                data = res.json()
+            else:
+                res.raise_for_status()
+            results.extend(data['results'])
+            if pbar is not None:
+                pbar.update(len(results))
+
+        if pbar is not None:
+            pbar.update(len(results))
+
+        self._stats.recordQuery('dices', endpoint, pages)
+
+        # check that we got everything
+        if len(results) != count:
+            logger.warning(f'Expected {count} results, got {len(results)}!')
+        logger.info("Successfully fetched data from the database")
+        return results
+
+
+    def getSchema(self, force=False):
+        '''Retrieve (and cache) the API's OpenAPI schema.
+
+        The schema is generated live by the server from its current filter
+        and serializer definitions, so it reflects exactly what's
+        searchable right now. Used internally by `getSearchFields()`; most
+        users won't need to call this directly.
+
+        Args:
+            force (bool): If True, re-download even if already cached.
+        '''
+        if force or 'schema' not in self.config:
+            import requests
+
+            api = self.API.rstrip('/')
+            url = f'{api}/schema/'
+            with self._stats.timeRequest('dices', 'schema', url) as req:
+                res = requests.get(url, headers={'Accept': 'application/json'})
+                req.done(_stats.responseSize(res), res.status_code == requests.codes.ok)
+            res.raise_for_status()
+            self.config['schema'] = res.json()
+        return self.config['schema']
+
+
+    def getSearchFields(self, endpoint):
+        '''Retrieve the set of query parameters available for a list endpoint.
+
+        Queries the API's live OpenAPI schema, so the result always
+        reflects what the server currently supports -- e.g.:
+
+            >>> api.getSearchFields('speeches')
+            {'spkr_name': {'type': 'string', 'choices': None},
+             'spkr_gender': {'type': 'string', 'choices':
+                {'male': 'Male', 'female': 'Female', ...}},
+             ...}
+
+        Args:
+            endpoint (str): One of the API's list endpoints, e.g.
+                'speeches', 'clusters', 'authors', 'works', 'characters',
+                'instances'.
+
+        Returns:
+            dict: Maps each query parameter name to a dict with keys
+            'type' (the parameter's JSON type) and 'choices' (a dict of
+            {value: human-readable label} for choice fields, or None).
+        '''
+        schema = self.getSchema()
+        api_path = urlparse(self.API).path.rstrip('/')
+        path_key = f"{api_path}/{endpoint.strip('/')}/"
+
+        try:
+            params = schema['paths'][path_key]['get']['parameters']
+        except KeyError:
+            available = sorted(
+                p[len(api_path):].strip('/')
+                for p in schema['paths']
+                if p.startswith(api_path) and p.endswith('/') and '{' not in p
+            )
+            available = [name for name in available if name and name != 'schema']
+            raise ValueError(
+                f"No such endpoint '{endpoint}'. Available endpoints: "
+                f"{', '.join(available)}"
+            )
+
+        fields = {}
+        for param in params:
+            if param.get('in') != 'query':
+                continue
+            field_schema = param.get('schema', {})
+            choices = None
+            if 'enum' in field_schema:
+                choices = self._parseChoiceDescription(
+                    param.get('description', ''), field_schema['enum'])
+            fields[param['name']] = {
+                'type': field_schema.get('type'),
+                'choices': choices,
+            }
+        return fields
+
+
+    @staticmethod
+    def _parseChoiceDescription(description, enum_values):
+        '''Parse drf-spectacular's "* `value` - Label" description into a dict'''
+
+        choices = {}
+        for line in description.splitlines():
+            match = re.match(r'\*\s*`([^`]+)`\s*-\s*(.+)', line.strip())
+            if match:
+                choices[match.group(1)] = match.group(2)
+
+        # fall back to the raw value if a label couldn't be parsed
+        for value in enum_values:
+            choices.setdefault(value, value)
+
+        return choices
+
+
+    def printSearchFields(self, endpoint):
+        '''Print a human-readable summary of an endpoint's search fields.
+
+        Convenience wrapper around `getSearchFields()` for interactive use,
+        e.g. in a notebook:
+
+            >>> api.printSearchFields('speeches')
+            spkr_name (string)
+            spkr_gender (string): male=Male, female=Female, x=Mixed/non-binary, none=Unknown/not-applicable
+            ...
+        '''
+        fields = self.getSearchFields(endpoint)
+        for name, info in sorted(fields.items()):
+            line = f"{name} ({info['type']})"
+            if info['choices']:
+                choice_str = ', '.join(f'{k}={v}' for k, v in info['choices'].items())
+                line += f": {choice_str}"
+            print(line)
+
+
+    def createLog(self, logfile):
+        """Add a file handler so log messages are also written to `logfile`.
+
+        Args:
+            logfile (str): Path to the log file.
+        """
+        formatter = logging.Formatter(fmt='%(asctime)s - [%(levelname)s] %(message)s')
+        fh = logging.FileHandler(logfile)
+        fh.setFormatter(formatter)
+        logger.addHandler(fh)
+        logger.debug("New log created at " + logfile)
+
+
+    def stats(self):
+        '''Counts of requests made and cache lookups, for finding where time goes
+
+        Covers this object's requests to the DICES API and to CTS, its
+        object indexes and CTS cache, and the process-wide MANTO and
+        WikiData caches and requests. See `dicesapi.stats.Stats.snapshot()`
+        for the layout.
+        '''
+        return _stats.combine(self._stats.snapshot(), _stats.shared.snapshot())
+
+
+    def resetStats(self, shared=True):
+        '''Zero the counts reported by stats()
+
+        Args:
+            shared (bool): Also zero the process-wide MANTO and WikiData
+                counts, which other DicesAPI objects report too.
+        '''
+        self._stats.reset()
+        if shared:
+            _stats.shared.reset()
+
+
+    def addStatsCallback(self, callback):
+        '''Call `callback(event)` with each request, query and cache event
+
+        Events are dicts; see `dicesapi.stats`. Includes MANTO and WikiData
+        events. Returns the callback, so this can be used as a decorator.
+        '''
+        self._stats.addCallback(callback)
+        _stats.shared.addCallback(callback)
+        return callback
+
+
+    def removeStatsCallback(self, callback):
+        '''Stop calling a callback added with addStatsCallback()'''
+        self._stats.removeCallback(callback)
+        _stats.shared.removeCallback(callback)
+
+
+    def memoryReport(self):
+        '''Object counts and approximate bytes held by each index and cache
+
+        Covers the object indexes, the raw `_attributes` and kept
+        `_payload` payloads of indexed objects, `_raw_data` from a DB
+        dump, the CTS cache, fetched passages and their spaCy docs, the
+        text index and the interval indexes. See `dicesapi.memory` for how sizes are
+        estimated.
+
+        Returns:
+            DataFrame indexed by component, with columns objects and bytes
+        '''
+        from dicesapi import memory
+        return memory.memoryReport(self)
+
+
+    def profile(self, cpu=True, memory=True, frames=None):
+        '''Profile a block of code, reporting time and memory by subsystem
+
+        Use as a context manager:
+
+            with api.profile() as report:
+                speeches = api.getSpeeches(author_name='Homer')
+            print(report.summary())
+
+        Wraps cProfile and tracemalloc; the report only covers dicesapi's
+        own code. See `dicesapi.profiling`.
+        '''
+        from dicesapi import profiling
+        return profiling.profile(cpu=cpu, memory=memory,
+                                    frames=frames or profiling.DEFAULT_FRAMES)
+
+
+    @tracing.traced(cat='query')
+    def getSpeeches(self, progress=False, **kwargs):
+        '''Retrieve speeches from API.
+
+        Accepts any search parameter supported by the API's 'speeches'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('speeches').
+        '''
+
+        logger.debug("Attempting to fetch a SpeechGroup")
+        # get the results from the speeches endpoint
+        results = self.getPagedJSON('speeches', dict(**kwargs), progress=progress)
+        
+        # convert to Speech objects
+        speeches = self.ingest('speech', results)
+
+        logger.debug("Successfully retrieved a list of speeches")
+        
+        return speeches
+
+
+    @tracing.traced(cat='query')
+    def getClusters(self, progress=False, **kwargs):
+        '''Retrieve speech clusters from API.
+
+        Accepts any search parameter supported by the API's 'clusters'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('clusters').
+        '''
+
+        logger.debug("Attempting to fetch a ClusterGroup")
+                
+        # get the results from the clusters endpoint
+        results = self.getPagedJSON('clusters', dict(**kwargs), progress=progress)
+        
+        # convert to Clusters objects
+        clusters = self.ingest('speechcluster', results)
+        logger.debug("Successfully retrieved a list of clusters")
+        
+        return clusters
+
+    
+    @tracing.traced(cat='query')
+    def getCharacters(self, progress=False, **kwargs):
+        '''Retrieve characters from API.
+
+        Accepts any search parameter supported by the API's 'characters'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('characters').
+        '''
+
+        logger.debug("Attempting to fetch a CharactersGroup")
+        
+        # get the results from the characters endpoint
+        results = self.getPagedJSON('characters', dict(**kwargs), progress=progress)
+        
+        # convert to Character objects
+        characters = self.ingest('character', results)
+        logger.debug("Successfully retrieved a list of characters")
+        
+        return characters
+
+
+    @tracing.traced(cat='query')
+    def getWorks(self, progress=False, **kwargs):
+        '''Fetch works from the API.
+
+        Accepts any search parameter supported by the API's 'works'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('works').
+        '''
+
+        logger.debug("Attempting to fetch a WorksGroup")
+        
+        results = self.getPagedJSON('works', dict(**kwargs), progress=progress)
+
+        works = self.ingest('work', results)
+        logger.debug("Successfully retrieved a list of works")
+        return works
+
+
+    @tracing.traced(cat='query')
+    def getAuthors(self, progress=False, **kwargs):
+        '''Fetch authors from the API.
+
+        Accepts any search parameter supported by the API's 'authors'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('authors').
+        '''
+
+        logger.debug("Attempting to fetch a AuthorGroup")
+
+        results = self.getPagedJSON('authors', dict(**kwargs), progress=progress)
+
+        authors = self.ingest('author', results)
+        logger.debug("Successfully retrieved a list of authors")
+        return authors
+
+
+    @tracing.traced(cat='query')
+    def getInstances(self, progress=False, **kwargs):
+        '''Fetch character instances from the API.
+
+        Accepts any search parameter supported by the API's 'instances'
+        endpoint as a keyword argument. To see what's available, call
+        api.printSearchFields('instances').
+        '''
+
+        logger.debug("Attempting to fetch a CharacterInstanceGroup")
+        results = self.getPagedJSON('instances', dict(**kwargs), progress=progress)
+
+        instances = self.ingest('characterinstance', results)
+        logger.debug("Successfully retrieved a list of character instances")
+        return instances
+        
+    
+    def indexedAuthor(self, data):
+        '''Create an author in the index'''
+
+        # if someone has passed an existing author object
+        if isinstance(data, Author):
+            if data.id in self._author_index:
+                if data is not self._author_index[data.id]:
+                    logger.info("Refused to add non-identical duplicate author ID {data.id} to index")
+                
+            else:
+                if data.api is not self:
+                    logger.debug("Importing author ID {data.id} from other api {data.api}")
+                    data.api = self
+                else:
+                    logger.debug("Adding a new author with ID {data.id}")
+                data.index = True
+                self._author_index[data.id] = data
+                
+            return self._author_index[data.id]
+        
+        # if someone has passed just an ID
+        if isinstance(data, int):
+            data = {"id": data}
+        
+        # otherwise, assume JSON data
+        else:
+            hit = data['id'] in self._author_index
+            self._stats.recordCache('index.author', hit)
+            if hit:
+                a = self._author_index[data['id']]
+                if len(data) > 1 and not self._unchanged('author', a, data):
+                    self._rehydrate('author', a, data)
+                logger.debug("Fetching author with ID " + str(data['id']))
+            else:
+                logger.debug("Creating new author with ID " + str(data['id']))
+                self._author_index[data['id']] = Author(data, api=self, index=True)
+ 
+        return self._author_index[data['id']]
+
+
+    def indexedWork(self, data):
+        '''Create a work in the index'''
+
+        # an object already in the index, e.g. hydrated by ingest()
+        if isinstance(data, Work) and self._work_index.get(data.id) is data:
+            return data
+
+        if isinstance(data, int):
+            data = {"id": data}
+        
+        hit = data['id'] in self._work_index
+        self._stats.recordCache('index.work', hit)
+        if hit:
+            w = self._work_index[data['id']]
+            if len(data) > 1 and not self._unchanged('work', w, data):
+                self._rehydrate('work', w, data)
+            logger.debug("Fetching work with ID " + str(data['id']))
+        else:
+            w = Work(data, api=self, index=True)
+            self._work_index[data['id']] = w
+            logger.debug("Creating new work with ID " + str(data['id']))
+ 
+        return w
+
+    
+    def indexedSpeech(self, data):
+        '''Create a speech in the index'''
+
+        # an object already in the index, e.g. hydrated by ingest()
+        if isinstance(data, Speech) and self._speech_index.get(data.id) is data:
+            return data
+
+        if isinstance(data, int):
+            data = {"id": data}
+        
+        hit = data['id'] in self._speech_index
+        self._stats.recordCache('index.speech', hit)
+        if hit:
+            s = self._speech_index[data['id']]
+            if len(data) > 1 and not self._unchanged('speech', s, data):
+                self._rehydrate('speech', s, data)
+            logger.debug("Fetching speech with ID " + str(data['id']))
+        else:
+            s = Speech(data, api=self, index=True)
+            self._speech_index[data['id']] = s
+            self._speech_generation += 1
+            logger.debug("Creating new speech with ID " + str(data['id']))
+        return s
+
+        
+    def indexedSpeechCluster(self, data):
+        '''Create a speech cluster in the index'''
+
+        # an object already in the index, e.g. hydrated by ingest()
+        if isinstance(data, SpeechCluster) and self._speechcluster_index.get(data.id) is data:
+            return data
+
+        if isinstance(data, int):
+            data = {"id": data}
+                
+        hit = data['id'] in self._speechcluster_index
+        self._stats.recordCache('index.speechcluster', hit)
+        if hit:
+            s = self._speechcluster_index[data['id']]
+            if len(data) > 1 and not self._unchanged('speechcluster', s, data):
+                self._rehydrate('speechcluster', s, data)
+            logger.debug("Fetching cluster with ID " + str(data['id']))
+        else:
+            s = SpeechCluster(data, api=self, index=True)
+            self._speechcluster_index[data['id']] = s
+            logger.debug("Creating new cluster with ID " + str(data['id']))
+        
+        return s
+
+
+    def indexedCharacter(self, data):
+        '''Create a character in the index'''
+
+        # an object already in the index, e.g. hydrated by ingest()
+        if isinstance(data, Character) and self._character_index.get(data.id) is data:
+            return data
+
+        if isinstance(data, int):
+            data = {"id": data}
+                
+        hit = data['id'] in self._character_index
+        self._stats.recordCache('index.character', hit)
+        if hit:
+            #print("Recycling character with ID " + str(data['id']))
+            c = self._character_index[data['id']]
+            if len(data) > 1 and not self._unchanged('character', c, data):
+                self._rehydrate('character', c, data)
+            logger.debug("Fetching character with ID " + str(data['id']))
+        else:
+            #print("Adding character with ID " + str(data['id']))
+            c = Character(data, api=self, index=True)
+            self._character_index[data['id']] = c
+            logger.debug("Creating new character with ID " + str(data['id']))
+        
+        return c
+
+
+    def indexedCharacterInstance(self, data):
+        '''Create a character instance in the index'''
+
+        # an object already in the index, e.g. hydrated by ingest()
+        if isinstance(data, CharacterInstance) and self._characterinstance_index.get(data.id) is data:
+            return data
+
+        if isinstance(data, int):
+            data = {"id": data}
+                
+        hit = data['id'] in self._characterinstance_index
+        self._stats.recordCache('index.characterinstance', hit)
+        if hit:
+            c = self._characterinstance_index[data['id']]
+            if len(data) > 1 and not self._unchanged('characterinstance', c, data):
+                self._rehydrate('characterinstance', c, data)
+            logger.debug("Fetching character instance with ID " + str(data['id']))
+        else:
+            c = CharacterInstance(data, api=self, index=True)
+            self._characterinstance_index[data['id']] = c
+            logger.debug("Creating new character instance with ID " + str(data['id']))
+        
+        return c
+        
+    def _unchanged(self, model, obj, data):
+        '''True if `data` equals the payload an indexed object was last hydrated from
+
+        A differing `changed` timestamp, where the server sends one, settles
+        it without comparing the payloads. Otherwise they're compared in
+        full, nested records included, which costs much less than
+        hydrating again. The nested records must also still be the ones
+        the nested objects were last hydrated from: one updated since, by
+        a payload of its own, would be reset by hydrating this one again.
+        A payload only now rebuilt from the objects is current already.
+        '''
+
+        fresh = obj._payload is None
+        payload = self._storedPayload(model, obj)
+        if payload is None:
+            return False
+        if data is not payload:
+            changed = data.get('changed')
+            if changed is not None and changed != payload.get('changed'):
+                return False
+            if data != payload:
+                return False
+        return fresh or model not in self._NESTED_FIELDS or self._current(model, obj, payload)
+
+
+    def _current(self, model, obj, payload):
+        '''True if every nested record in an object's kept payload is still
+        the payload its nested object keeps'''
+
+        nested_fields = self._NESTED_FIELDS
+        for field, sub in nested_fields[model].items():
+            value = payload.get(field)
+            if value is None:
+                continue
+            if field in self._LIST_FIELDS:
+                pairs = zip(getattr(obj, field), value)
+            else:
+                pairs = ((getattr(obj, field), value),)
+            for nested, v in pairs:
+                if not isinstance(v, dict) or len(v) < 2:
+                    continue
+                if nested is None or nested._payload is not v:
+                    return False
+                if sub in nested_fields and not self._current(sub, nested, v):
+                    return False
+        return True
+
+
+    def _storedPayload(self, model, obj):
+        '''The payload an indexed object was last hydrated from, or None
+
+        An object hydrated only once has just its `_attributes`, where
+        nested payloads have been replaced with objects, so the payload is
+        rebuilt from those when first needed. Nested objects are taken to
+        have come from payloads rather than bare ids.
+        '''
+
+        if obj._payload is None and obj._attributes is not None:
+            if model in self._NESTED_FIELDS:
+                self._keepPayload(model, obj, dict(obj._attributes))
+            else:
+                obj._payload = obj._attributes
+        return obj._payload
+
+
+    def _keepPayload(self, model, obj, payload):
+        '''Keep a shallow copy of the payload an object was hydrated from
+
+        Nested payloads in it, or the objects that replaced them, are
+        swapped for the equal payloads the nested objects keep, so they're
+        shared rather than copied.
+        '''
+
+        for field, sub in self._NESTED_FIELDS.get(model, {}).items():
+            value = payload.get(field)
+            if isinstance(value, list):
+                payload[field] = [self._nestedPayload(sub, o, v)
+                                    for o, v in zip(getattr(obj, field), value)]
+            elif value is not None:
+                payload[field] = self._nestedPayload(sub, getattr(obj, field), value)
+        obj._payload = payload
+
+
+    def _nestedPayload(self, model, obj, value):
+        if obj is None or isinstance(value, int) or (isinstance(value, dict) and len(value) < 2):
+            return value
+        payload = self._storedPayload(model, obj)
+        return value if payload is None else payload
+
+
+    def _queueCurrent(self, obj, payload, fields, settled, current):
+        '''Queue the nested records of an object with an unchanged payload for ingest()
+
+        They're queued as the nested objects, whose payloads they are, so
+        they aren't compared again but still count towards the last
+        payload winning. An object already queued since the last payload
+        of its model isn't queued again.
+        '''
+
+        for field, sub, sub_queue, is_list in fields:
+            value = payload.get(field)
+            if value is None:
+                continue
+            if is_list:
+                pairs = zip(getattr(obj, field), value)
+            else:
+                pairs = ((getattr(obj, field), value),)
+            queued = current[sub]
+            for nested, v in pairs:
+                if not isinstance(v, dict) or len(v) < 2:
+                    continue
+                if nested is None or nested._payload is not v:
+                    sub_queue.append(v)
+                    settled[sub] = len(sub_queue)
+                elif queued.get(nested.id, -1) < settled[sub]:
+                    sub_queue.append(nested)
+                    queued[nested.id] = len(sub_queue)
+
+
+    def _rehydrate(self, model, obj, data):
+        '''Update an indexed object from a changed payload, and keep the payload'''
+
+        if model not in self._NESTED_FIELDS:
+            obj._from_data(data)
+            obj._attributes = obj._payload = data
+            return
+
+        # copied before hydrating replaces nested payloads with objects
+        payload = dict(data)
+        span = _speechSpan(obj) if model == 'speech' else None
+        obj._from_data(data)
+        obj._attributes = data
+        self._keepPayload(model, obj, payload)
+        if span is not None and span != _speechSpan(obj):
+            self._speech_generation += 1
+
+
+    def _modelClasses(self, model):
+        '''(model class, group class, index dict) of a model name'''
+
+        return dict(
+            author = (Author, AuthorGroup, self._author_index),
+            work = (Work, WorkGroup, self._work_index),
+            character = (Character, CharacterGroup, self._character_index),
+            characterinstance = (CharacterInstance, CharacterInstanceGroup,
+                                    self._characterinstance_index),
+            speechcluster = (SpeechCluster, SpeechClusterGroup, self._speechcluster_index),
+            speech = (Speech, SpeechGroup, self._speech_index),
+        )[model]
+
+
+    def ingest(self, model, records):
+        '''Index many records of one model at once
+
+        A bulk version of the indexed*() methods, e.g. for the results of
+        getPagedJSON() or the rows of a DB dump. Nested payloads (a
+        speech's work, cluster, speakers and addressees; an instance's
+        character; a work's author) are collected across the whole batch
+        first, and each distinct object is hydrated once, nested objects
+        before the objects that contain them. Where the same id appears
+        more than once, the last payload with more than an id wins, as it
+        would record by record. Payloads equal to the one an object was
+        last hydrated from are skipped, as are their nested records while
+        those are still the payloads of the nested objects.
+
+        Cyclic garbage collection is paused for the whole process while
+        any ingest() runs, and enabled again when the last one ends, if it
+        was enabled before.
+
+        Args:
+            model (str): 'author', 'work', 'character', 'characterinstance',
+                'speechcluster' or 'speech', or the plural endpoint name
+            records (list): Payload dicts, ids or already-indexed objects
+
+        Returns:
+            DataGroup of the indexed objects, in the order of `records`
+        '''
+
+        model = self._MODEL_ALIASES.get(model, model)
+        if model not in self.INGEST_ORDER:
+            raise ValueError(f"Unknown model '{model}'; choose from {', '.join(self.INGEST_ORDER)}")
+
+        # everything created here stays alive in the indexes, so cyclic
+        # garbage collection during the load only re-scans live objects
+        _pauseGC()
+        try:
+            return self._ingest(model, records)
+        finally:
+            _resumeGC()
+
+
+    def _ingest(self, model, records):
+        indexes = {m: self._modelClasses(m)[2] for m in self.INGEST_ORDER}
+        nested_fields = self._NESTED_FIELDS
+        list_fields = self._LIST_FIELDS
+
+        # collect distinct payloads by model and id (None for a bare id or
+        # an unchanged payload), containing models first, so their nested
+        # payloads are queued before those models are visited
+        batch = {m: {} for m in self.INGEST_ORDER}
+        queued = {m: [] for m in self.INGEST_ORDER}
+        queued[model] = list(records)
+        # changed payloads of ids seen more than once, other than the one
+        # hydrated; repeats of the same payload are left alone
+        dupes = []
+        # nested objects of unchanged payloads are queued in place of their
+        # payloads; one queued again with no payload queued in between
+        # changes nothing, so each model keeps the queue's length after its
+        # last payload, and after each of those objects
+        settled = {m: 0 for m in self.INGEST_ORDER}
+        current = {m: {} for m in self.INGEST_ORDER}
+
+        for m in reversed(self.INGEST_ORDER):
+            payloads = batch[m]
+            index = indexes[m]
+            fields = [(field, sub, queued[sub], field in list_fields)
+                        for field, sub in nested_fields.get(m, {}).items()]
+            for data in queued[m]:
+                if isinstance(data, dict):
+                    key = data['id']
+                    prev = payloads.get(key)
+                    if prev is data:
+                        continue
+                    if len(data) == 1:
+                        payloads.setdefault(key, None)
+                        continue
+                    if prev is None:
+                        obj = index.get(key)
+                        if obj is not None and self._unchanged(m, obj, data):
+                            # nothing to hydrate, but its nested records
+                            # still count towards the last payload winning
+                            payloads[key] = None
+                            self._queueCurrent(obj, obj._payload, fields, settled, current)
+                            continue
+                    elif data == prev:
+                        continue
+                    else:
+                        dupes.append((m, prev))
+                    payloads[key] = data
+                    for field, sub, sub_queue, is_list in fields:
+                        value = data.get(field)
+                        if value is not None:
+                            if is_list:
+                                sub_queue.extend(value)
+                            else:
+                                sub_queue.append(value)
+                            settled[sub] = len(sub_queue)
+                elif isinstance(data, int):
+                    payloads.setdefault(data, None)
+                elif data is not None:
+                    # an object whose payload is current: as good as that
+                    # payload sent again
+                    payloads[data.id] = None
+                    if fields:
+                        payload = self._storedPayload(m, data)
+                        if payload is not None:
+                            self._queueCurrent(data, payload, fields, settled, current)
+
+        # hydrate, nested models first
+        for m in self.INGEST_ORDER:
+            payloads = batch[m]
+            if not payloads:
+                continue
+            cls, group, index = self._modelClasses(m)
+            replaced = self._REPLACED_FIELDS.get(m, ())
+            fields = [(field, indexes[sub], field in list_fields, field in replaced)
+                        for field, sub in nested_fields.get(m, {}).items()]
+            spans = m == 'speech'
+            hits = 0
+            moved = False
+
+            with tracing.span('hydrate', cat='hydrate', model=m, records=len(payloads)):
+                for key, data in payloads.items():
+                    if data is None:
+                        if key in index:
+                            hits += 1
+                        else:
+                            index[key] = cls({"id": key}, api=self, index=True)
+                            moved = True
+                        continue
+
+                    # hydrate from a view with nested objects in place of
+                    # payloads, so they aren't hydrated again; an object
+                    # hydrated again keeps the payload, as in _rehydrate()
+                    obj = index.get(key)
+                    payload = dict(data) if obj is not None else None
+                    view = data
+                    for field, sub_index, is_list, is_replaced in fields:
+                        value = data.get(field)
+                        if value is None:
+                            continue
+                        if is_list:
+                            value = [_ingested(sub_index, v) for v in value]
+                        else:
+                            value = _ingested(sub_index, value)
+                        if not is_replaced and view is data:
+                            view = dict(data)
+                        view[field] = value
+                        if is_replaced:
+                            data[field] = value
+
+                    if obj is None:
+                        obj = index[key] = cls(view, api=self, index=True)
+                        obj._attributes = data
+                        moved = True
+                    else:
+                        hits += 1
+                        span = _speechSpan(obj) if spans else None
+                        obj._from_data(view)
+                        obj._attributes = data
+                        self._keepPayload(m, obj, payload)
+                        if spans and span != _speechSpan(obj):
+                            moved = True
+
+            if spans and moved:
+                self._speech_generation += 1
+            self._stats.recordCache(f'index.{m}', True, hits)
+            self._stats.recordCache(f'index.{m}', False, len(payloads) - hits)
+
+        # leave duplicate payloads as hydrating them would have
+        for m, data in dupes:
+            for field in self._REPLACED_FIELDS.get(m, ()):
+                value = data.get(field)
+                if value is None:
+                    continue
+                sub_index = indexes[nested_fields[m][field]]
+                if field in list_fields:
+                    data[field] = [_ingested(sub_index, v) for v in value]
+                else:
+                    data[field] = _ingested(sub_index, value)
+
+        cls, group, index = self._modelClasses(model)
+        return group([_ingested(index, rec) for rec in records], api=self)
+
+
+    # def indexedTag(self, data):
+    #     '''Create a tag in the index'''
+    #
+    #     if isinstance(data, int):
+    #         data = {"id": data}
+    #
+    #     if data['id'] in self._tag_index:
+    #         tag = self._tag_index[data['id']]
+    #         self.logThis("Fetching tag with ID " + str(data['id']), self.LOG_HIGHDETAIL)
+    #     else:
+    #         tag = Tag(data, api=self, index=True)
+    #         self._tag_index[data['id']] = tag
+    #         self.logThis("Creating new tag with ID " + str(data['id']), self.LOG_HIGHDETAIL)
+    #
+    #     return tag
+    
+    def cachedAuthors(self):
+        return AuthorGroup([auth for auth in self._author_index.values()], api=self)
+        
+    def cachedWorks(self):
+        return WorkGroup([work for work in self._work_index.values()], api=self)
+        
+    def cachedCharacters(self):
+        return CharacterGroup([char for char in self._character_index.values()], api=self)
+        
+    def cachedCharacterInstances(self):
+        return CharacterInstanceGroup([inst for inst in self._characterinstance_index.values()], api=self)
+
+    def cachedSpeechClusters(self):
+        return SpeechClusterGroup([cluster for cluster in self._speechcluster_index.values()], api=self)
+        
+    def cachedSpeeches(self):
+        return SpeechGroup([s for s in self._speech_index.values()], api=self)
+
+
+    def buildTextIndex(self, speeches=None, path=None):
+        '''Build a full-text index over fetched passages, for searchText()
+
+        Args:
+            speeches: Speeches to index; defaults to all cached speeches.
+                Only speeches with a fetched passage are indexed.
+            path (str): If given, also save the index to this file
+
+        Returns:
+            The dicesapi.search.TextIndex
+        '''
+
+        from dicesapi.search import TextIndex
+
+        if speeches is None:
+            speeches = self.cachedSpeeches()
+
+        index = TextIndex()
+        index.addSpeeches(speeches)
+        self.config['text_index'] = index
+
+        if path is not None:
+            index.save(path)
+
+        return index
+
+
+    def loadTextIndex(self, path):
+        '''Load a full-text index saved by buildTextIndex(), for searchText()'''
+
+        from dicesapi.search import TextIndex
+
+        index = TextIndex.load(path)
+        self.config['text_index'] = index
+        return index
+
+
+    def searchText(self, query, hydrate=False):
+        '''Search the full-text index for a word or phrase
+
+        Call buildTextIndex() or loadTextIndex() first. Matching ignores
+        case, Greek diacritics and Latin u/v, i/j.
+
+        An index loaded from a file knows only the ids of its speeches, so
+        matching speeches this api hasn't hydrated yet are returned holding
+        only an id. With `hydrate`, they're fetched instead, with
+        getSpeeches(id=...): that's one request for each of them, so for a
+        common word it's usually quicker to fetch the speeches of the
+        works searched first, e.g. with getSpeeches(work_id=...).
+
+        Args:
+            query (str): One or more words
+            hydrate (bool): Fetch matching speeches that aren't hydrated,
+                one request each
+
+        Returns:
+            A (SpeechGroup, hits) tuple. `hits` is a list of dicts with keys
+            'speech', 'n' (line number), 'line' (index into the passage's
+            line_array), 'offset' and 'length' (chars within the line).
+        '''
+
+        if 'text_index' not in self.config:
+            raise RuntimeError(
+                "No text index. Call api.buildTextIndex() or api.loadTextIndex() first."
+            )
+
+        hits = self.config['text_index'].search(query)
+
+        if hydrate:
+            missing = {}
+            for hit in hits:
+                speech = self._speech_index.get(hit['speech_id'])
+                if speech is None or _isStub(speech):
+                    missing[hit['speech_id']] = True
+            if missing:
+                logger.info(f"Fetching {len(missing)} speeches matching '{query}'")
+            for speech_id in missing:
+                self.getSpeeches(id=speech_id)
+
+        speeches = []
+        seen = set()
+        for hit in hits:
+            speech = self.indexedSpeech(hit.pop('speech_id'))
+            hit['speech'] = speech
+            if speech.id not in seen:
+                seen.add(speech.id)
+                speeches.append(speech)
+
+        return SpeechGroup(speeches, api=self), hits
+
+
+    def _workIntervalIndex(self, work):
+        '''Return the IntervalIndex for a work, (re)building it if needed
+
+        Indexes cover the speeches currently in the speech index; all are
+        rebuilt if speeches have been added, or moved to other loci or
+        works, since they were built.
+        '''
+
+        if isinstance(work, Work):
+            work = work.id
+
+        if self._interval_index_generation != self._speech_generation:
+            by_work = {}
+            for s in self._speech_index.values():
+                if s.work is not None:
+                    by_work.setdefault(s.work.id, []).append(s)
+            self._interval_index = {w: IntervalIndex(speeches)
+                                        for w, speeches in by_work.items()}
+            self._interval_index_generation = self._speech_generation
+            logger.debug(f"Built interval indexes for {len(by_work)} works")
+
+        return self._interval_index.get(work, IntervalIndex())
+
+
+    def speechesAt(self, work, locus):
+        '''Return cached speeches in `work` that contain `locus`
+
+        Only speeches already retrieved (e.g. with getSpeeches() or
+        fromGitDump()) are searched.
+
+        Args:
+            work: A Work or work ID
+            locus (str): A locus such as "9.312"
+
+        Returns:
+            A SpeechGroup, in line order
+        '''
+
+        return SpeechGroup(self._workIntervalIndex(work).at(locus), api=self)
+
+
+    def speechesOverlapping(self, work, l_from, l_to):
+        '''Return cached speeches in `work` overlapping the range l_from-l_to
+
+        Only speeches already retrieved (e.g. with getSpeeches() or
+        fromGitDump()) are searched.
+
+        Args:
+            work: A Work or work ID
+            l_from (str): First locus of the range, e.g. "9.300"
+            l_to (str): Last locus of the range, e.g. "10.20"
+
+        Returns:
+            A SpeechGroup, in line order
+        '''
+
+        return SpeechGroup(self._workIntervalIndex(work).overlapping(l_from, l_to), api=self)
+        
+    
+    @classmethod
+    @tracing.traced(cat='dump')
+    def fromGitDump(cls, commit):
+        '''Create a self-contained dataset from a DB dump saved to GitHub
+
+            Returns a fake DicesAPI with cached data downloaded from Github, specifically, from the file data/speechdb.json
+        '''
+
+        import requests
+
+        url = "https://github.com/cwf2/dices/raw/{commit}/data/speechdb.json".format(commit=commit)
+
+        # download json data
+        print(f"Downloading from {url}")
+        with tracing.span('download', cat='http', url=url):
+            res = requests.get(url)
+            if not res.ok:
+                res.raise_for_status()
+        with tracing.span('parseJSON', cat='dump'):
+            db_dump = res.json()
+
+        api = cls.fromDump(db_dump)
+        api._git_hash = commit
+
+        print(f"timestamp: {api._dump_timestamp}")
+
+        return api
+
+
+    @classmethod
+    def fromDumpFile(cls, path):
+        '''Create a self-contained dataset from a local copy of a DB dump
+
+            Reads a file in the format of data/speechdb.json in the DICES
+            repository, e.g. one saved earlier from fromGitDump(); nothing
+            is downloaded.
+        '''
+
+        with open(path, encoding='utf-8') as f:
+            db_dump = json.load(f)
+
+        return cls.fromDump(db_dump)
+
+
+    @classmethod
+    @tracing.traced(cat='dump')
+    def fromDump(cls, db_dump):
+        '''Create a self-contained dataset from parsed DB dump records
+
+            Args:
+                db_dump (list): Django fixture records, each a dict with
+                    "model", "pk" and "fields"
+
+            Returns a fake DicesAPI with every record indexed
+        '''
+
+        api = cls(dices_api="")
+
+        # build tables
+        with tracing.span('dumpTables', cat='dump', records=len(db_dump)):
+            tables = _dumpTables(db_dump)
+
+        # diagnostic info
+        ts = None
+        for row in tables["metadata"]:
+            if row["name"] == "date":
+                ts = row["value"]
+    
+        # add records, nested objects first
+        for model in cls.INGEST_ORDER:
+            api.ingest(model, tables[model])
+
+        api._raw_data = tables
+        api._git_hash = None
+        api._dump_timestamp = ts
+    
+        # # add tags
+        # for tag in tables["speechtag"]:
+        #     api.indexedTag(s)
+    
+        return api
@@ -0,0 +1,300 @@
+'''locus - parsing and natural ordering of DICES line references
+
+DICES gives the extent of each speech as a pair of loci, `l_fi` and `l_la`,
+e.g. "9.312", "2.praef.4" or "123a". Each locus is a dot-separated list of
+components: zero or more prefixes (book, poem, preface, ...) followed by a
+line number, possibly with an alphabetic suffix.
+
+`parseLocus()` parses a locus string once and memoizes the result, so the
+many speeches that share a locus string also share one `Locus` object. A
+`Locus` carries a structured sort `key` that orders loci naturally (book 10
+after book 9, line 100 after line 99, the preface before line 1) rather than
+as strings.
+'''
+
+import bisect
+import re
+from functools import lru_cache
+
+SEP = '.'
+
+# component ranks, used to order mixed components at the same level
+RANK_PRAEF = 0
+RANK_NUMERIC = 1
+RANK_OTHER = 2
+
+PRAEF_NAMES = ('praef', 'pr')
+
+_component_re = re.compile(r'^(\d+)([^\d]*)$')
+
+
+def _componentKey(part):
+    '''Sort key for a single locus component
+
+    Prefaces sort before any numbered line at the same level; numbered
+    components sort numerically, then by alphabetic suffix ("12" < "12a" <
+    "12b" < "13"); anything else sorts last, alphabetically.
+    '''
+
+    lower = part.lower()
+    if lower in PRAEF_NAMES:
+        return (RANK_PRAEF, 0, '')
+
+    match = _component_re.match(lower)
+    if match:
+        return (RANK_NUMERIC, int(match.group(1)), match.group(2))
+
+    return (RANK_OTHER, 0, lower)
+
+
+class Locus(object):
+    '''A parsed locus, e.g. "9.312" or "2.praef.4"
+
+    Loci compare and hash by their sort key, so they can be used directly
+    as sort keys, set members or dict keys. Don't create these directly;
+    use `parseLocus()`, which memoizes them.
+    '''
+
+    __slots__ = ('text', 'parts', 'key')
+
+    def __init__(self, text, parts, key):
+        self.text = text
+        self.parts = parts
+        self.key = key
+
+    def __repr__(self):
+        return f'<Locus {self.text}>'
+
+    def __str__(self):
+        return self.text
+
+    def __eq__(self, other):
+        if isinstance(other, Locus):
+            return self.key == other.key
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __lt__(self, other):
+        if isinstance(other, Locus):
+            return self.key < other.key
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Locus):
+            return self.key <= other.key
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Locus):
+            return self.key > other.key
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Locus):
+            return self.key >= other.key
+        return NotImplemented
+
+    @property
+    def depth(self):
+        '''Number of components, including the line'''
+        return len(self.parts)
+
+    @property
+    def line(self):
+        '''The last component, e.g. "312" for "9.312"'''
+        return self.parts[-1]
+
+    @property
+    def lineno(self):
+        '''The numeric part of the line, or None for "praef" etc.'''
+        rank, num, suffix = self.key[-1]
+        if rank == RANK_NUMERIC:
+            return num
+
+    @property
+    def suffix(self):
+        '''Alphabetic suffix of the line, e.g. "a" for "123a"'''
+        rank, num, suffix = self.key[-1]
+        if rank == RANK_NUMERIC:
+            return suffix
+        return ''
+
+    @property
+    def book(self):
+        '''The first component if there is a prefix, otherwise ""'''
+        if len(self.parts) > 1:
+            return self.parts[0]
+        return ''
+
+    @property
+    def prefix(self):
+        '''All components except the line, e.g. "2.praef" for "2.praef.4"'''
+        return SEP.join(self.parts[:-1])
+
+    @property
+    def prefix_key(self):
+        '''Sort key of the prefix alone'''
+        return self.key[:-1]
+
+    def isPraef(self):
+        '''True if any component marks a preface'''
+        return any(rank == RANK_PRAEF for rank, num, suffix in self.key)
+
+
+@lru_cache(maxsize=None)
+def parseLocus(loc):
+    '''Parse a locus string, returning a (memoized) Locus
+
+    Returns None if `loc` is None or empty.
+    '''
+
+    if loc is None:
+        return None
+
+    text = loc.strip()
+    if text == '':
+        return None
+
+    parts = tuple(part.strip() for part in text.split(SEP))
+    key = tuple(_componentKey(part) for part in parts)
+
+    return Locus(text, parts, key)
+
+
+def parseLoci(loci):
+    '''Parse a sequence of locus strings, returning a list of Locus objects
+
+    Each distinct string is parsed only once.
+    '''
+
+    return [parseLocus(loc) for loc in loci]
+
+
+def locusKey(loc):
+    '''Sort key for a locus string or Locus; None sorts before everything'''
+
+    if not isinstance(loc, Locus):
+        loc = parseLocus(loc)
+    if loc is None:
+        return ()
+    return loc.key
+
+
+def locusArrays(loci):
+    '''Parse many loci at once into parallel NumPy arrays
+
+    Args:
+        loci: Sequence of locus strings (None allowed)
+
+    Returns:
+        dict with keys:
+            'rank': int64 natural-order rank of each locus among the distinct
+                    loci given, so that `np.argsort(rank)` sorts the input;
+                    missing loci get -1
+            'lineno': int64 numeric line number, or -1 if there is none
+            'depth': int64 number of components, 0 for missing loci
+            'prefix': object array of prefix strings ("" if none)
+    '''
+
+    import numpy as np
+
+    parsed = parseLoci(loci)
+    n = len(parsed)
+
+    distinct = sorted(set(loc for loc in parsed if loc is not None))
+    ranks = {loc.key: i for i, loc in enumerate(distinct)}
+
+    rank = np.fromiter((-1 if loc is None else ranks[loc.key] for loc in parsed),
+                        dtype=np.int64, count=n)
+    lineno = np.fromiter((-1 if loc is None or loc.lineno is None else loc.lineno
+                        for loc in parsed), dtype=np.int64, count=n)
+    depth = np.fromiter((0 if loc is None else loc.depth for loc in parsed),
+                        dtype=np.int64, count=n)
+    prefix = np.array(['' if loc is None else loc.prefix for loc in parsed],
+                        dtype=object)
+
+    return dict(rank=rank, lineno=lineno, depth=depth, prefix=prefix)
+
+
+def naturalSort(loci, reverse=False):
+    '''Return locus strings in natural order'''
+
+    return sorted(loci, key=locusKey, reverse=reverse)
+
+
+class IntervalIndex(object):
+    '''Index of speeches by line range, for one work
+
+    Answers "which speeches contain this locus?" and "which speeches overlap
+    this range?" by bisection over speeches sorted by first line, rather
+    than scanning every speech. Ranges are compared by natural sort key, so
+    speeches spanning a book boundary (e.g. 9.999-10.5) are found by
+    queries in either book.
+    '''
+
+    def __init__(self, speeches=None):
+        self._starts = []
+        self._ends = []
+        self._max_ends = []
+        self._speeches = []
+
+        if speeches is not None:
+            self._build(speeches)
+
+    def __len__(self):
+        return len(self._speeches)
+
+    def _build(self, speeches):
+        '''Sort speeches by first line, precompute running max of last lines'''
+
+        items = []
+        for s in speeches:
+            start = parseLocus(s.l_fi)
+            if start is None:
+                continue
+            end = parseLocus(s.l_la)
+            if end is None or end < start:
+                end = start
+            items.append((start.key, end.key, s))
+
+        items.sort(key=lambda item: (item[0], item[1]))
+
+        running = None
+        for start, end, s in items:
+            if running is None or end > running:
+                running = end
+            self._starts.append(start)
+            self._ends.append(end)
+            self._max_ends.append(running)
+            self._speeches.append(s)
+
+    def overlapping(self, l_from, l_to=None):
+        '''Return speeches whose range overlaps [l_from, l_to], in line order
+
+        Args:
+            l_from: First locus of the query range (string or Locus)
+            l_to: Last locus of the query range; defaults to l_from
+
+        Returns:
+            list of speeches
+        '''
+
+        lo = locusKey(l_from)
+        hi = lo if l_to is None else locusKey(l_to)
+        if hi < lo:
+            lo, hi = hi, lo
+
+        # speeches starting after the end of the range can't overlap
+        stop = bisect.bisect_right(self._starts, hi)
+
+        # nor can any speech before the first whose running max end reaches lo
+        first = bisect.bisect_left(self._max_ends, lo, 0, stop)
+
+        return [self._speeches[i] for i in range(first, stop) if self._ends[i] >= lo]
+
+    def at(self, loc):
+        '''Return speeches containing a single locus, in line order'''
+
+        return self.overlapping(loc, loc)
@@ -13,22 +13,232 @@ for at least two well-documented characters (Achilles, Telemachos) -- the
 gendered ties (Son of/Daughter of/Mother of/Father of) carry the real data.
 '''
 import requests
+import json
 import re
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import dicesapi
+from dicesapi import stats as _stats
+from dicesapi import tracing
 
 
 MANTO_API = 'https://api.manto.unh.edu/project/2616'
 NGID = '6580' # nodegoat project number
 DEBUG = True
 
-# courtesy delay before each live request, to avoid hammering MANTO's
-# server when iterating over many characters; doesn't affect cached lookups
+# courtesy delay between live requests, to avoid hammering MANTO's server
+# when iterating over many characters; doesn't affect cached lookups. This
+# sets the rate of the shared limiter below (1 / REQUEST_DELAY requests per
+# second), which applies across all threads. It's read on every request, so
+# it can be changed at any time; 0 turns the limit off.
 REQUEST_DELAY = 0.2
 
+# default number of simultaneous requests made by prefetch()
+MAX_CONCURRENCY = 4
+
 __manto_index__ = {}
 
 
+class TokenBucket(object):
+    '''Thread-safe token-bucket rate limiter
+
+    Allows bursts of up to `capacity` requests, refilling at `rate` tokens
+    per second. `acquire()` blocks until a token is available. `rate` may
+    also be a function returning the current rate, which is then read on
+    every call.
+    '''
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Take one token, waiting if necessary; returns seconds waited'''
+
+        waited = 0
+        while True:
+            rate = self.rate() if callable(self.rate) else self.rate
+            with self._lock:
+                now = self._clock()
+                if rate == float('inf'):
+                    self._tokens = self.capacity
+                    self._last = now
+                    return waited
+                self._tokens = min(self.capacity,
+                                    self._tokens + (now - self._last) * rate)
+                self._last = now
+                # tolerate rounding error, which could otherwise leave us
+                # waiting forever for a vanishingly small fraction of a token
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0, self._tokens - 1)
+                    return waited
+                wait = (1 - self._tokens) / rate
+            self._sleep(wait)
+            waited += wait
+
+
+class _LimiterChain(object):
+    '''Several limiters at once: `acquire()` takes a token from each'''
+
+    def __init__(self, *limiters):
+        self.limiters = limiters
+
+    def acquire(self):
+        '''Take one token from every limiter in turn; returns seconds waited'''
+        return sum(limiter.acquire() for limiter in self.limiters)
+
+
+def _sharedRate():
+    return 1 / REQUEST_DELAY if REQUEST_DELAY > 0 else float('inf')
+
+
+# shared limiter for all live MANTO requests
+_limiter = TokenBucket(_sharedRate)
+
+
+# outcomes of a MANTO request, as recorded in a MantoStore
+STATUS_OK = 'ok'
+STATUS_EMPTY = 'empty'
+STATUS_ERROR = 'error'
+
+
+class MantoStore(object):
+    '''Disk-backed cache of MANTO responses, in an SQLite file
+
+    Every response is recorded with the time it was fetched and its
+    outcome: 'ok' (entity data), 'empty' (MANTO returned no data for the
+    id) or 'error' (HTTP failure or an error payload). Entries older than
+    `max_age` seconds (error entries: `error_max_age`) are considered stale
+    and re-requested; `max_age=None` keeps successful entries forever.
+
+    Normally enabled with `useStore()`.
+    '''
+
+    def __init__(self, path, max_age=None, error_max_age=3600, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.error_max_age = error_max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entities ('
+                'manto_id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                'fetched REAL NOT NULL, data TEXT, error TEXT)'
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entities').fetchone()[0]
+
+    def __contains__(self, manto_id):
+        return self.get(manto_id) is not None
+
+    def get(self, manto_id):
+        '''Return the stored entry for an id as a dict, or None'''
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, fetched, data, error FROM entities WHERE manto_id = ?',
+                (manto_id,)).fetchone()
+        if row is None:
+            return None
+        status, fetched, data, error = row
+        return dict(
+            manto_id = manto_id,
+            status = status,
+            fetched = fetched,
+            data = json.loads(data) if data is not None else None,
+            error = error,
+        )
+
+    def isFresh(self, entry):
+        '''True if an entry is recent enough to use without re-requesting'''
+
+        if entry['status'] == STATUS_ERROR:
+            max_age = self.error_max_age
+        else:
+            max_age = self.max_age
+        if max_age is None:
+            return True
+        return self._clock() - entry['fetched'] <= max_age
+
+    def put(self, manto_id, status, data=None, error=None):
+        '''Record a response'''
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)',
+                (manto_id, status, self._clock(),
+                    json.dumps(data) if data is not None else None, error))
+
+    def ids(self, status=None):
+        '''Return stored ids, optionally only those with a given status'''
+
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute('SELECT manto_id FROM entities')
+            else:
+                rows = self._conn.execute(
+                    'SELECT manto_id FROM entities WHERE status = ?', (status,))
+            return [row[0] for row in rows]
+
+    def delete(self, manto_id):
+        '''Forget one id'''
+
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM entities WHERE manto_id = ?', (manto_id,))
+
+    def clear(self):
+        '''Forget every stored response'''
+
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM entities')
+
+    def close(self):
+        self._conn.close()
+
+
+__manto_store__ = None
+
+
+def useStore(path, max_age=None, error_max_age=3600):
+    '''Persist MANTO responses in an SQLite file at `path`
+
+    Once enabled, getMantoID(), prefetch() and everything built on them
+    consult the store before making requests, and record every response
+    there. Pass path=None to stop using a store.
+
+    Args:
+        path (str): SQLite file, created if it doesn't exist
+        max_age (float): Re-request entities older than this many seconds;
+            None never re-requests successful or empty responses
+        error_max_age (float): Re-request failed ids after this many seconds
+
+    Returns:
+        The MantoStore, or None
+    '''
+
+    global __manto_store__
+
+    if __manto_store__ is not None:
+        __manto_store__.close()
+
+    if path is None:
+        __manto_store__ = None
+    else:
+        __manto_store__ = MantoStore(path, max_age=max_age, error_max_age=error_max_age)
+    return __manto_store__
+
+
 class Tie():
     '''Collection of values for MANTO ties'''
     MOTHER = '31811'    # "Mother of"
@@ -110,17 +320,25 @@ class MantoEntity(object):
         return self in other.getParents()
 
 
-def dlMantoData(manto_id, api=MANTO_API, debug=DEBUG):
-    '''Retrieve a character's record from MANTO'''
+def _requestMantoData(manto_id, api=MANTO_API, limiter=None, retry=False):
+    '''Make one rate-limited request, returning (data, error message)
+
+    `retry` marks a request repeating one that failed, for the stats.
+    '''
 
     # this is the trick to getting JSON data from MANTO's API
     headers = {'Accept': 'application/json'}
 
-    # brief courtesy delay before each live request
-    time.sleep(REQUEST_DELAY)
+    # wait for our turn under the politeness limit
+    if limiter is None:
+        limiter = _limiter
+    limiter.acquire()
 
     # make request
-    res = requests.get(f'{api}/{manto_id}', headers=headers)
+    url = f'{api}/{manto_id}'
+    with _stats.shared.timeRequest('manto', 'entity', url, retry=retry) as req:
+        res = requests.get(url, headers=headers)
+        req.done(_stats.responseSize(res), res.ok)
 
     # check results
     if res.ok:
@@ -128,26 +346,153 @@ def dlMantoData(manto_id, api=MANTO_API, debug=DEBUG):
         if 'error' in data:
             error = data.get('error')
             descr = data.get('error_description')
-            if debug:
-                print(f'Failed to retrieve MANTO id {manto_id}: {error} / {descr}')
-        return data
+            return data, f'{error} / {descr}'
+        return data, None
     else:
-        if debug:
-            print(f'Failed to retrieve MANTO id {manto_id}: HTTP status: {res.status_code}')
+        return None, f'HTTP status: {res.status_code}'
+
+
+def dlMantoData(manto_id, api=MANTO_API, debug=DEBUG, limiter=None):
+    '''Retrieve a character's record from MANTO
+
+    Waits for a token from `limiter` (by default the module's shared
+    limiter) before making the request.
+    '''
+
+    data, error = _requestMantoData(manto_id, api=api, limiter=limiter)
+    if error is not None and debug:
+        print(f'Failed to retrieve MANTO id {manto_id}: {error}')
+    return data
+
+
+def _indexEntity(manto_id, data, cache_empty=False):
+    '''Build a MantoEntity from downloaded data, caching it if non-empty'''
+
+    manto_ent = MantoEntity(manto_id, data)
+    if (manto_ent.data != {}) or cache_empty:
+        __manto_index__[manto_id] = manto_ent
+    return manto_ent
+
+
+def _resolve(manto_id, cache_empty=False, debug=DEBUG, limiter=None, refresh=False):
+    '''Return a MantoEntity, from memory, the persistent store or MANTO'''
+
+    hit = not refresh and manto_id in __manto_index__
+    _stats.shared.recordCache('manto', hit)
+    if hit:
+        return __manto_index__[manto_id]
+
+    store = __manto_store__
+    retry = False
+
+    # a fresh stored entry means no request; empty and error entries are
+    # remembered as such, so they aren't re-requested on every call
+    if store is not None and not refresh:
+        entry = store.get(manto_id)
+        fresh = entry is not None and store.isFresh(entry)
+        _stats.shared.recordCache('manto.store', fresh)
+        if fresh:
+            if entry['status'] == STATUS_OK:
+                return _indexEntity(manto_id, entry['data'])
+            return MantoEntity(manto_id, entry['data'])
+        # an expired error entry: this request repeats one that failed
+        retry = entry is not None and entry['status'] == STATUS_ERROR
+
+    data, error = _requestMantoData(manto_id, limiter=limiter, retry=retry)
+    if error is not None and debug:
+        print(f'Failed to retrieve MANTO id {manto_id}: {error}')
+    manto_ent = _indexEntity(manto_id, data, cache_empty=cache_empty)
+
+    if store is not None:
+        if error is not None:
+            store.put(manto_id, STATUS_ERROR, data, error)
+        elif manto_ent.data == {}:
+            store.put(manto_id, STATUS_EMPTY, data)
+        else:
+            store.put(manto_id, STATUS_OK, data)
+
+    return manto_ent
 
 
-def getMantoID(manto_id, cache_empty=False):
-    '''Retrieve MANTO entity by ID'''
+def getMantoID(manto_id, cache_empty=False, refresh=False):
+    '''Retrieve MANTO entity by ID
+
+    Looks in memory first, then in the persistent store if one is in use
+    (see useStore()), and only then asks MANTO. Pass refresh=True to
+    re-download regardless.
+    '''
     
-    if manto_id in __manto_index__:
-        manto_ent = __manto_index__[manto_id]
+    return _resolve(manto_id, cache_empty=cache_empty, refresh=refresh)
+
+
+def _mantoIDs(things):
+    '''Collect distinct MANTO ids from Characters, CharacterInstances or id strings'''
+
+    ids = []
+    seen = set()
+    for thing in things:
+        if isinstance(thing, (dicesapi.Character, dicesapi.CharacterInstance)):
+            thing = thing.manto
+        if thing is None or len(thing) == 0 or thing in seen:
+            continue
+        seen.add(thing)
+        ids.append(thing)
+    return ids
+
+
+@tracing.traced('manto.prefetch', cat='manto')
+def prefetch(characters, max_rate=None, max_concurrency=MAX_CONCURRENCY,
+                debug=DEBUG, cache_empty=False):
+    '''Download MANTO entities for many characters concurrently
+
+    Fills the module's entity index, so that later calls to getMantoID(),
+    getMantoChar(), charIsMantoTie() etc. for these characters make no
+    requests. Ids already in the index, or fresh in the persistent store,
+    are not requested again.
+
+    Requests run in up to `max_concurrency` threads, but all of them draw
+    on one token bucket, so the overall request rate stays polite no
+    matter how many threads are used.
+
+    Args:
+        characters: Characters, CharacterInstances and/or MANTO id strings
+        max_rate (float): Requests per second for this call, above 0. The
+            shared module-wide limit (1 / REQUEST_DELAY) applies
+            regardless; this can only lower the rate further
+        max_concurrency (int): Maximum simultaneous requests
+        cache_empty (bool): Also cache ids for which MANTO returns no data
+
+    Returns:
+        dict mapping each requested MANTO id to its MantoEntity
+    '''
+
+    if max_rate is not None and not max_rate > 0:
+        raise ValueError(f"max_rate must be above 0, not {max_rate}")
+
+    ids = _mantoIDs(characters)
+    todo = [manto_id for manto_id in ids if manto_id not in __manto_index__]
+
+    if max_rate is None:
+        limiter = _limiter
     else:
-        data = dlMantoData(manto_id)
-        manto_ent = MantoEntity(manto_id, data)
-        if (manto_ent.data != {}) or cache_empty:
-            __manto_index__[manto_id] = manto_ent 
-    
-    return manto_ent
+        limiter = _LimiterChain(TokenBucket(max_rate), _limiter)
+
+    def fetch(manto_id):
+        return _resolve(manto_id, cache_empty=cache_empty, debug=debug, limiter=limiter)
+
+    results = {}
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            for manto_id, manto_ent in zip(todo, pool.map(fetch, todo)):
+                results[manto_id] = manto_ent
+    dicesapi.logger.info(f"Prefetched {len(todo)} MANTO entities "
+                            f"({len(ids) - len(todo)} already cached)")
+
+    for manto_id in ids:
+        if manto_id not in results:
+            results[manto_id] = __manto_index__[manto_id]
+
+    return results
 
 
 def getMantoChar(char, debug=DEBUG, cache_empty=False):
@@ -173,22 +518,32 @@ def getMantoChar(char, debug=DEBUG, cache_empty=False):
     return manto_ent
         
 
-def charIsMantoTie(char_a, char_b, ties, err_val=None, debug=DEBUG, cache_empty=False):
-    '''Compare two DICES Character instances based on MANTO ties'''
-    
+def charIsMantoTie(char_a, char_b, ties, err_val=None, debug=DEBUG, cache_empty=False,
+                    graph=None):
+    '''Compare two DICES Character instances based on MANTO ties
+
+    If a KinshipGraph is passed as `graph`, the answer is a set lookup in
+    the graph and nothing is downloaded.
+    '''
+
+    if graph is not None:
+        return graph.hasTie(char_a, char_b, ties, err_val=err_val)
+
     ent_a = getMantoChar(char_a, debug=debug, cache_empty=cache_empty)
     ent_b = getMantoChar(char_b, debug=debug, cache_empty=cache_empty)
     
     if ent_a and ent_b:
-        valid = ent_a.getTies(ties)
-        return ent_b in valid
+        # compare ids, so that related entities needn't be downloaded
+        valid = ent_a.getTies(ties, as_ent=False)
+        return ent_b.id in valid
     else:
         return err_val
     
 
-def charIsChild(char_a, char_b, err_val=None, debug=DEBUG):
+def charIsChild(char_a, char_b, err_val=None, debug=DEBUG, graph=None):
     '''True if char_b is one of char_a's parents'''
-    return charIsMantoTie(char_a, char_b, [Tie.SON, Tie.DAUGHTER], err_val, debug=debug)
+    return charIsMantoTie(char_a, char_b, [Tie.SON, Tie.DAUGHTER], err_val, debug=debug,
+                            graph=graph)
     
 
 def charTiedIDs(char, ties, debug=DEBUG):
@@ -199,4 +554,219 @@ def charTiedIDs(char, ties, debug=DEBUG):
     if manto_ent is not None:
         return manto_ent.getTies(ties, as_ent=False)
     else:
-        return []
\ No newline at end of file
+        return []
+
+
+def _charID(char):
+    '''Resolve a Character, CharacterInstance or id to a DICES character id'''
+
+    if isinstance(char, dicesapi.CharacterInstance):
+        char = char.char
+    if isinstance(char, dicesapi.Character):
+        return char.id
+    return char
+
+
+class KinshipGraph(object):
+    '''Kinship among DICES characters, precomputed from MANTO ties
+
+    Built once from the MANTO entities of a set of DICES characters; after
+    that, every query is a set lookup by DICES character id, with no
+    downloads. Ties are recorded in both directions, so e.g. Thetis is
+    Achilles' parent whether MANTO records "Achilles son of Thetis" or
+    "Thetis mother of Achilles". Where MANTO only gives "son of"/"daughter
+    of", the DICES gender of the parent decides mother vs. father.
+
+    Only ties between the given characters are kept.
+
+    Relations, as used by related() and kinSpeeches(), read "b is a's ...":
+        parent, mother, father, child, son, daughter, spouse, sibling
+    '''
+
+    RELATIONS = ('parent', 'mother', 'father', 'child', 'son', 'daughter',
+                    'spouse', 'sibling')
+
+    def __init__(self, characters, fetch=True, **prefetch_args):
+        '''Build the graph
+
+        Args:
+            characters: DICES Characters or CharacterInstances
+            fetch (bool): Download missing MANTO entities first, with
+                prefetch(); if False, only already-cached entities are used
+            **prefetch_args: Passed to prefetch(), e.g. max_concurrency
+        '''
+
+        chars = {}
+        for char in characters:
+            if isinstance(char, dicesapi.CharacterInstance):
+                char = char.char
+            if char is not None and char.manto:
+                chars[char.id] = char
+
+        if fetch:
+            prefetch(chars.values(), **prefetch_args)
+
+        by_manto = {}
+        for char_id, char in chars.items():
+            by_manto.setdefault(char.manto, set()).add(char_id)
+        self._gender = {char_id: char.gender for char_id, char in chars.items()}
+
+        # raw adjacency by tie: ties[tie][a] = {b, ...} where a is "<tie>" b
+        self.ties = {}
+        for char_id, char in chars.items():
+            ent = __manto_index__.get(char.manto)
+            if ent is None:
+                continue
+            for tie in (Tie.MOTHER, Tie.FATHER, Tie.WIFE, Tie.HUSBAND, Tie.SON, Tie.DAUGHTER):
+                for manto_id in ent.getTies(tie, as_ent=False):
+                    for other in by_manto.get(manto_id, ()):
+                        self.ties.setdefault(tie, {}).setdefault(char_id, set()).add(other)
+
+        self._build(set(chars))
+
+    def _tie(self, tie, char_id):
+        return self.ties.get(tie, {}).get(char_id, set())
+
+    def _inverse(self, tie):
+        '''Map b -> {a, ...} for every a "<tie>" b'''
+
+        inverse = {}
+        for a, targets in self.ties.get(tie, {}).items():
+            for b in targets:
+                inverse.setdefault(b, set()).add(a)
+        return inverse
+
+    def _build(self, char_ids):
+        '''Derive the symmetric relations from the raw ties'''
+
+        mother_of = self._inverse(Tie.MOTHER)   # child -> mothers
+        father_of = self._inverse(Tie.FATHER)   # child -> fathers
+        spouse_of = {}
+        for tie in (Tie.WIFE, Tie.HUSBAND):
+            for a, targets in self.ties.get(tie, {}).items():
+                for b in targets:
+                    spouse_of.setdefault(a, set()).add(b)
+                    spouse_of.setdefault(b, set()).add(a)
+
+        rel = {name: {} for name in self.RELATIONS}
+        for a in char_ids:
+            parents = (self._tie(Tie.SON, a) | self._tie(Tie.DAUGHTER, a)
+                        | mother_of.get(a, set()) | father_of.get(a, set()))
+            if parents:
+                rel['parent'][a] = parents
+                mothers = mother_of.get(a, set()) | {p for p in parents
+                                    if self._gender.get(p) == 'female'}
+                fathers = father_of.get(a, set()) | {p for p in parents
+                                    if self._gender.get(p) == 'male'}
+                if mothers:
+                    rel['mother'][a] = mothers
+                if fathers:
+                    rel['father'][a] = fathers
+            if a in spouse_of:
+                rel['spouse'][a] = spouse_of[a]
+
+        for a, parents in rel['parent'].items():
+            for p in parents:
+                rel['child'].setdefault(p, set()).add(a)
+        for p, children in rel['child'].items():
+            for c in children:
+                if (p in self._tie(Tie.SON, c) or self._gender.get(c) == 'male'):
+                    rel['son'].setdefault(p, set()).add(c)
+                if (p in self._tie(Tie.DAUGHTER, c) or self._gender.get(c) == 'female'):
+                    rel['daughter'].setdefault(p, set()).add(c)
+        for a, parents in rel['parent'].items():
+            siblings = set()
+            for p in parents:
+                siblings |= rel['child'][p]
+            siblings.discard(a)
+            if siblings:
+                rel['sibling'][a] = siblings
+
+        self._rel = rel
+
+    def __contains__(self, char):
+        return _charID(char) in self._gender
+
+    def __len__(self):
+        '''Number of characters with a MANTO id'''
+        return len(self._gender)
+
+    def related(self, char, relation):
+        '''Return the set of character ids standing in `relation` to char'''
+
+        if relation not in self._rel:
+            raise ValueError(f"Unknown relation '{relation}'; "
+                                f"choose from {', '.join(self.RELATIONS)}")
+        return self._rel[relation].get(_charID(char), set())
+
+    def parents(self, char):
+        return self.related(char, 'parent')
+
+    def mothers(self, char):
+        return self.related(char, 'mother')
+
+    def fathers(self, char):
+        return self.related(char, 'father')
+
+    def children(self, char):
+        return self.related(char, 'child')
+
+    def spouses(self, char):
+        return self.related(char, 'spouse')
+
+    def siblings(self, char):
+        return self.related(char, 'sibling')
+
+    def isRelated(self, char_a, char_b, relations):
+        '''True if char_b stands in any of `relations` to char_a'''
+
+        if isinstance(relations, str):
+            relations = [relations]
+        b = _charID(char_b)
+        return any(b in self.related(char_a, relation) for relation in relations)
+
+    def hasTie(self, char_a, char_b, ties, err_val=None):
+        '''Graph equivalent of charIsMantoTie(): True if a "<tie>" b'''
+
+        if char_a not in self or char_b not in self:
+            return err_val
+        if not isinstance(ties, list):
+            ties = [ties]
+        a, b = _charID(char_a), _charID(char_b)
+        return any(b in self._tie(tie, a) for tie in ties)
+
+    def kinSpeeches(self, speeches, relations=('parent', 'child', 'spouse', 'sibling'),
+                    symmetric=False):
+        '''Return the speeches in which a speaker addresses a relative
+
+        Args:
+            speeches (SpeechGroup): Speeches to search
+            relations (list): Relations to look for; a speech matches if an
+                addressee stands in one of them to a speaker
+            symmetric (bool): Also match if a speaker stands in one of the
+                relations to an addressee, e.g. relations=['mother'] with
+                symmetric=True finds speeches both to and by mothers
+
+        Returns:
+            A new SpeechGroup
+        '''
+
+        if isinstance(relations, str):
+            relations = [relations]
+        for relation in relations:
+            if relation not in self._rel:
+                raise ValueError(f"Unknown relation '{relation}'")
+
+        def ids(insts):
+            return {inst.char.id for inst in insts if inst.char is not None}
+
+        found = []
+        for speech in speeches:
+            spkrs, addrs = ids(speech.spkr), ids(speech.addr)
+            match = any(addrs & self._rel[r].get(s, set()) for r in relations for s in spkrs)
+            if not match and symmetric:
+                match = any(spkrs & self._rel[r].get(a, set()) for r in relations for a in addrs)
+            if match:
+                found.append(speech)
+
+        return dicesapi.SpeechGroup(found, api=speeches.api)
@@ -0,0 +1,176 @@
+'''memory - approximate memory footprint of a DicesAPI's indexes and caches
+
+Used by DicesAPI.memoryReport(). Sizes are estimates: they add up
+sys.getsizeof() over each component's objects and everything those refer
+to, stopping at other components' objects (indexed models, passages, XML
+trees, spaCy docs). An object shared by several components, such as a
+locus string or a record that's both a raw dump row and an object's
+`_attributes`, is counted once, under the first component reported.
+
+XML trees live in libxml2's memory rather than Python's, so the CTS cache
+is estimated from the size of the serialized XML; spaCy docs likewise from
+their serialized size.
+'''
+
+import sys
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+# DicesAPI index attributes, in the order reported
+INDEXES = ('speech', 'characterinstance', 'character', 'work', 'author', 'speechcluster')
+
+# attributes of indexed objects reported as components of their own
+_SEPARATE_ATTRS = frozenset(('_attributes', '_payload', 'passage'))
+
+# attributes of passages reported as components of their own
+_PASSAGE_SEPARATE_ATTRS = frozenset(('xml', 'nlp', 'spacy_doc'))
+
+
+def _stopTypes():
+    '''Types whose instances belong to some component of their own'''
+
+    import dicesapi
+    from dicesapi.text import Passage
+
+    types = [dicesapi.Author, dicesapi.Work, dicesapi.Character, dicesapi.CharacterInstance,
+                dicesapi.Speech, dicesapi.SpeechCluster, dicesapi.DicesAPI, Passage,
+                etree._Element]
+    spacy_tokens = sys.modules.get('spacy.tokens')
+    if spacy_tokens is not None:
+        types.append(spacy_tokens.Doc)
+    return tuple(types)
+
+
+def deepSize(obj, seen, stop=(), skip=frozenset()):
+    '''Approximate bytes of `obj` and everything reachable from it
+
+    Args:
+        obj: Object to measure
+        seen (set): ids of objects already counted; updated
+        stop (tuple): Types not to count or descend into, unless `obj`
+            is one
+        skip (frozenset): Attribute names of `obj` not to descend into
+
+    Returns:
+        int, bytes
+    '''
+
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        if o is not obj and isinstance(o, stop):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif isinstance(o, np.ndarray):
+            # getsizeof() includes the buffer of an array that owns it
+            if o.dtype == object:
+                stack.extend(o.ravel().tolist())
+        else:
+            attrs = getattr(o, '__dict__', None)
+            if attrs is not None:
+                seen.add(id(attrs))
+                total += sys.getsizeof(attrs)
+                for name, value in attrs.items():
+                    if o is obj and name in skip:
+                        continue
+                    stack.append(name)
+                    stack.append(value)
+            for cls in type(o).__mro__:
+                for name in getattr(cls, '__slots__', ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+
+    return total
+
+
+def _xmlSize(xml):
+    return len(etree.tostring(xml))
+
+
+def _docSize(doc):
+    try:
+        return len(doc.to_bytes())
+    except Exception:
+        return sys.getsizeof(doc)
+
+
+def memoryReport(api):
+    '''Object counts and approximate bytes of each of an api's caches
+
+    Returns:
+        DataFrame indexed by component, with columns objects and bytes
+    '''
+
+    stop = _stopTypes()
+    seen = set()
+    rows = []
+
+    def add(component, objects, size):
+        rows.append(dict(component=component, objects=objects, bytes=size))
+
+    indexes = [(name, getattr(api, f'_{name}_index')) for name in INDEXES]
+    for name, index in indexes:
+        size = sys.getsizeof(index)
+        for obj in index.values():
+            size += deepSize(obj, seen, stop, skip=_SEPARATE_ATTRS)
+        add(f'{name}_index', len(index), size)
+
+    n = size = 0
+    for name, index in indexes:
+        for obj in index.values():
+            attributes = getattr(obj, '_attributes', None)
+            if attributes is not None:
+                n += 1
+                size += deepSize(attributes, seen, stop)
+            # the payload last hydrated from, kept to spot unchanged ones
+            payload = getattr(obj, '_payload', None)
+            if payload is not None:
+                size += deepSize(payload, seen, stop)
+    add('attributes', n, size)
+
+    raw = getattr(api, '_raw_data', None)
+    add('raw_data', sum(len(table) for table in raw.values()) if raw else 0,
+        deepSize(raw, seen, stop) if raw is not None else 0)
+
+    cache = api.config.get('cts_cache', {})
+    add('cts_cache', len(cache), sys.getsizeof(cache) + sum(
+        deepSize(url, seen) + _xmlSize(xml) for url, xml in cache.items()))
+    cached_xml = {id(xml) for xml in cache.values()}
+
+    passages = [s.passage for s in api._speech_index.values()
+                    if getattr(s, 'passage', None) is not None]
+    size = 0
+    for p in passages:
+        size += deepSize(p, seen, stop, skip=_PASSAGE_SEPARATE_ATTRS)
+        # a passage's XML outside the CTS cache, e.g. fetched with force=True
+        if p.xml is not None and id(p.xml) not in cached_xml and id(p.xml) not in seen:
+            seen.add(id(p.xml))
+            size += _xmlSize(p.xml)
+    add('passages', len(passages), size)
+
+    docs = {}
+    for p in passages:
+        for doc in (p.spacy_doc, p.nlp):
+            if doc is not None and hasattr(doc, 'to_bytes'):
+                docs[id(doc)] = doc
+    add('spacy_docs', len(docs), sum(_docSize(doc) for doc in docs.values()))
+
+    text_index = api.config.get('text_index')
+    add('text_index', len(text_index) if text_index is not None else 0,
+        deepSize(text_index, seen, stop) if text_index is not None else 0)
+
+    add('interval_index', len(api._interval_index), deepSize(api._interval_index, seen, stop))
+
+    return pd.DataFrame(rows).set_index('component')
@@ -9,15 +9,29 @@ Latin models named below, to be installed separately:
 Usage:
 
     import dicesapi.nlp_spacy   # adds Passage.runSpacyPipeline, etc.
+                                # and SpeechGroup.runSpacyPipeline
 
     speech.fetchPassage()
     speech.passage.runSpacyPipeline()
     for tok in speech.passage.spacy_doc:
         print(tok.text, tok.pos_)
+
+    # or, for many speeches at once, batched by language
+    speeches.fetchPassages()
+    speeches.runSpacyPipeline(batch_size=64, n_process=4)
 '''
 
+import hashlib
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
 import spacy
+from spacy.attrs import IDX, ORTH, LOWER, NORM, LEMMA, POS, TAG, MORPH, DEP, ENT_TYPE
+from spacy.tokens import DocBin
 
+from . import logger, tracing, SpeechGroup
 from .text import Passage
 
 SPACY_MODEL_URLS = {
@@ -28,15 +42,33 @@ SPACY_MODEL_URLS = {
 }
 
 
-def _load_model(name):
+# models loaded so far in this process, shared by all DicesAPI instances;
+# keyed by (name, enable, disable, exclude)
+_shared_models = {}
+
+
+def _missing_message(name):
+    url = SPACY_MODEL_URLS.get(name)
+    if url:
+        return f"    pip install {url}"
+    return f"    # no install URL known for '{name}'"
+
+
+def _load_model(name, enable=None, disable=None, exclude=None):
     '''Load a single spaCy model by name, returning (model, error_message) tuple.'''
+
+    kwargs = {}
+    if enable is not None:
+        kwargs['enable'] = list(enable)
+    if disable is not None:
+        kwargs['disable'] = list(disable)
+    if exclude is not None:
+        kwargs['exclude'] = list(exclude)
+
     try:
-        return spacy.load(name), None
+        return spacy.load(name, **kwargs), None
     except OSError:
-        url = SPACY_MODEL_URLS.get(name)
-        if url:
-            return None, f"    pip install {url}"
-        return None, f"    # no install URL known for '{name}'"
+        return None, _missing_message(name)
     except ValueError as e:
         if '[E002]' in str(e):
             return None, (
@@ -46,18 +78,8 @@ def _load_model(name):
         raise
 
 
-def spacy_load(latin_model=None, greek_model=None):
-    '''Load spaCy models and return them as a dict keyed by language.
-
-    Called by DicesAPI.initializeNlp(); not normally called directly.
-    Pass None for a language to skip loading a model for it.
-    Raises RuntimeError listing any missing models and their install commands.
-    '''
-    if latin_model is None and greek_model is None:
-        raise RuntimeError(
-            "No models specified. Pass at least one of latin_model= or "
-            "greek_model= to api.initializeNlp()."
-        )
+def _register_components():
+    '''Import optional packages that register pipeline components'''
 
     try:
         import latincy_preprocess  # registers LatinCy pipeline components
@@ -68,15 +90,117 @@ def spacy_load(latin_model=None, greek_model=None):
     except ImportError:
         pass
 
-    result = {}
-    errors = {}
 
+def _as_key(names):
+    return None if names is None else tuple(names)
+
+
+def sharedModel(name, enable=None, disable=None, exclude=None):
+    '''Load a model once per process, returning the same object thereafter
+
+    Models loaded with different enable/disable/exclude lists are cached
+    separately. Raises RuntimeError if the model can't be loaded.
+    '''
+
+    key = (name, _as_key(enable), _as_key(disable), _as_key(exclude))
+    if key not in _shared_models:
+        _register_components()
+        model, error = _load_model(name, enable, disable, exclude)
+        if error is not None:
+            raise RuntimeError(
+                "A spaCy model could not be loaded.\n\n"
+                "Run the following in a new cell, then restart your kernel:\n\n"
+                + error
+            )
+        logger.info(f"Loaded spaCy model {name}")
+        _shared_models[key] = model
+    return _shared_models[key]
+
+
+def clearSharedModels():
+    '''Forget all models loaded in this process, so they can be freed'''
+
+    _shared_models.clear()
+
+
+def _is_available(name):
+    '''True if a model is installed as a package or exists as a path'''
+
+    return spacy.util.is_package(name) or os.path.exists(name)
+
+
+class LazyModels(Mapping):
+    '''Models by language, each loaded on first use
+
+    Behaves like a read-only dict from language ("latin", "greek") to spaCy
+    model. A language's model is loaded (or taken from the process-wide
+    cache, see sharedModel()) the first time it is looked up.
+    '''
+
+    def __init__(self, names, enable=None, disable=None, exclude=None):
+        self._names = dict(names)
+        self._options = dict(enable=enable, disable=disable, exclude=exclude)
+        self._models = {}
+
+    def __repr__(self):
+        langs = ', '.join(f"{lang}={name}{'' if self.isLoaded(lang) else ' (not loaded)'}"
+                            for lang, name in self._names.items())
+        return f'<LazyModels {langs}>'
+
+    def __getitem__(self, lang):
+        if lang not in self._models:
+            self._models[lang] = sharedModel(self._names[lang], **self._options)
+        return self._models[lang]
+
+    def __contains__(self, lang):
+        # don't go through __getitem__, which would load the model
+        return lang in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def isLoaded(self, lang):
+        '''True if the model for `lang` has been loaded'''
+        return lang in self._models
+
+
+def spacy_load(latin_model=None, greek_model=None, lazy=True,
+                enable=None, disable=None, exclude=None):
+    '''Prepare spaCy models and return them as a mapping keyed by language.
+
+    Called by DicesAPI.initializeNlp(); not normally called directly.
+    Pass None for a language to skip loading a model for it.
+    Raises RuntimeError listing any missing models and their install commands.
+
+    Models are checked for availability now, but by default each is only
+    loaded the first time a passage in its language is parsed. Models are
+    shared by all DicesAPI instances in the process.
+
+    Args:
+        latin_model (str): Name of the Latin model
+        greek_model (str): Name of the Greek model
+        lazy (bool): If False, load the models immediately
+        enable, disable, exclude (list): Pipeline component names, passed
+            to spacy.load(); `exclude` saves the most memory, since excluded
+            components are never loaded
+    '''
+    if latin_model is None and greek_model is None:
+        raise RuntimeError(
+            "No models specified. Pass at least one of latin_model= or "
+            "greek_model= to api.initializeNlp()."
+        )
+
+    names = {}
     if latin_model is not None:
-        result['latin'], errors['latin'] = _load_model(latin_model)
+        names['latin'] = latin_model
     if greek_model is not None:
-        result['greek'], errors['greek'] = _load_model(greek_model)
+        names['greek'] = greek_model
 
-    missing = {lang: msg for lang, msg in errors.items() if msg is not None}
+    missing = {lang: _missing_message(name) for lang, name in names.items()
+                    if not _is_available(name)}
 
     if missing:
         lines = ["One or more spaCy models could not be loaded.\n"]
@@ -85,34 +209,411 @@ def spacy_load(latin_model=None, greek_model=None):
             lines.append(msg)
         raise RuntimeError("\n".join(lines))
 
+    result = LazyModels(names, enable=enable, disable=disable, exclude=exclude)
+
+    if not lazy:
+        for lang in result:
+            result[lang]
+
     return result
 
 
-def runSpacyPipeline(self, index=True):
-    '''Parse text with spaCy, populating self.spacy_doc'''
+class DocCache(object):
+    '''Disk cache of parsed spaCy docs
 
-    if 'nlp' not in self.speech.api.config:
+    Each doc is stored in its own DocBin file, keyed by the model (name,
+    version and active pipeline components) and a hash of the text, so a
+    cached parse is only reused for the same text and the same model. When
+    `max_entries` or `max_bytes` is exceeded, the least recently used
+    entries are evicted.
+
+    Normally created by `api.initializeNlp(cache_dir=...)`.
+    '''
+
+    SUFFIX = '.spacy'
+
+    def __init__(self, path, max_entries=None, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+        # size of each entry, by file path
+        self._sizes = {}
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    fpath = os.path.join(root, name)
+                    self._sizes[fpath] = os.path.getsize(fpath)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    @property
+    def size(self):
+        '''Total bytes stored'''
+        return sum(self._sizes.values())
+
+    @staticmethod
+    def modelKey(nlp, disabled=()):
+        '''Identify a model by language, name, version and active pipes'''
+
+        meta = nlp.meta
+        pipes = ','.join(name for name in nlp.pipe_names if name not in disabled)
+        return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}[{pipes}]"
+
+    def _path(self, model_key, text):
+        digest = hashlib.sha256(f'{model_key}\0{text}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest[:2], digest + self.SUFFIX)
+
+    def get(self, nlp, text):
+        '''Return the cached doc for `text`, or None'''
+
+        return self.getMany(nlp, [text])[0]
+
+    def getMany(self, nlp, texts, disabled=()):
+        '''Return a list of cached docs (None for misses), one per text,
+        as parsed by `nlp` without the `disabled` pipes'''
+
+        model_key = self.modelKey(nlp, disabled)
+        docs = []
+        for text in texts:
+            fpath = self._path(model_key, text)
+            doc = None
+            if fpath in self._sizes:
+                try:
+                    with open(fpath, 'rb') as f:
+                        doc_bin = DocBin().from_bytes(f.read())
+                    doc = next(iter(doc_bin.get_docs(nlp.vocab)))
+                    os.utime(fpath)
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable cached doc {fpath}: {e}")
+                    self._remove(fpath)
+                    doc = None
+            if doc is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            docs.append(doc)
+        return docs
+
+    def put(self, nlp, text, doc):
+        '''Store a parsed doc'''
+
+        self.putMany(nlp, [text], [doc])
+
+    def putMany(self, nlp, texts, docs, disabled=()):
+        '''Store several parsed docs, then enforce the size limits once'''
+
+        model_key = self.modelKey(nlp, disabled)
+        for text, doc in zip(texts, docs):
+            fpath = self._path(model_key, text)
+            data = DocBin(docs=[doc], store_user_data=True).to_bytes()
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+            tmp = f'{fpath}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, fpath)
+            self._sizes[fpath] = len(data)
+        self.prune()
+
+    def _remove(self, fpath):
+        try:
+            os.remove(fpath)
+        except OSError:
+            pass
+        self._sizes.pop(fpath, None)
+
+    def prune(self):
+        '''Evict least recently used entries until within the size limits'''
+
+        over_entries = self.max_entries is not None and len(self._sizes) > self.max_entries
+        over_bytes = self.max_bytes is not None and self.size > self.max_bytes
+        if not (over_entries or over_bytes):
+            return
+
+        mtimes = {}
+        for fpath in list(self._sizes):
+            try:
+                mtimes[fpath] = os.path.getmtime(fpath)
+            except OSError:
+                # deleted from outside the cache
+                self._sizes.pop(fpath)
+        by_age = sorted(mtimes, key=mtimes.get)
+        total = self.size
+        evicted = 0
+        for fpath in by_age:
+            if ((self.max_entries is None or len(self._sizes) <= self.max_entries)
+                    and (self.max_bytes is None or total <= self.max_bytes)):
+                break
+            total -= self._sizes[fpath]
+            self._remove(fpath)
+            evicted += 1
+        logger.debug(f"Evicted {evicted} docs from cache at {self.path}")
+
+    def clear(self):
+        '''Remove every cached doc'''
+
+        for fpath in list(self._sizes):
+            self._remove(fpath)
+
+
+def _getModel(api, lang):
+    '''Return the spaCy model loaded for `lang`, raising if there is none'''
+
+    if 'nlp' not in api.config:
         raise RuntimeError(
             "NLP is not initialized. Call api.initializeNlp() first."
         )
 
-    text = self.text
-
-    if text is None:
-        return
-
-    nlp = self.speech.api.config['nlp']
-    lang = self.speech.lang
+    nlp = api.config['nlp']
     if lang not in nlp:
         raise RuntimeError(
             f"No NLP model loaded for {lang}. "
             f"Pass {lang}_model=... to api.initializeNlp()."
         )
-    self.spacy_doc = nlp[lang](text)
-    self.nlp = self.spacy_doc
+    return nlp[lang]
+
+
+def _attachDoc(passage, doc, index=True):
+    '''Store a parsed doc on a passage, optionally indexing its tokens'''
+
+    passage.spacy_doc = doc
+    passage.nlp = doc
 
     if index:
-        self.buildSpacyTokenIndex()
+        passage.buildSpacyTokenIndex()
+
+
+def _disabledPipes(nlp, enable=None, disable=None):
+    '''Names of nlp's components to skip, to run only `enable` and not `disable`
+
+    They're passed to each call of the model rather than switched off on
+    it, as the model is shared between threads. Raises ValueError if
+    `enable` or `disable` names a component the pipeline doesn't have,
+    rather than quietly running the wrong ones.
+    '''
+
+    disabled = []
+    for arg, names in (('enable', enable), ('disable', disable)):
+        if names is None:
+            continue
+        names = list(names)
+        unknown = [name for name in names if name not in nlp.pipe_names]
+        if unknown:
+            raise ValueError(f"Unknown pipeline components in {arg}: {', '.join(unknown)}; "
+                                f"the pipeline has: {', '.join(nlp.pipe_names) or 'none'}")
+        if arg == 'enable':
+            disabled.extend(name for name in nlp.pipe_names if name not in names)
+        else:
+            disabled.extend(name for name in names if name not in disabled)
+    return disabled
+
+
+def _parse(api, nlp, texts, batch_size=64, n_process=1, enable=None, disable=None):
+    '''Parse texts with `nlp`, reusing docs from the api's DocCache if any'''
+
+    disabled = _disabledPipes(nlp, enable=enable, disable=disable)
+    with tracing.span('spacy.pipe', cat='nlp', texts=len(texts)) as span:
+        cache = api.config.get('nlp_cache')
+        if cache is None:
+            return list(nlp.pipe(texts, batch_size=batch_size, n_process=n_process,
+                                    disable=disabled))
+
+        docs = cache.getMany(nlp, texts, disabled)
+        todo = [i for i, doc in enumerate(docs) if doc is None]
+        if todo:
+            parsed = nlp.pipe((texts[i] for i in todo), batch_size=batch_size,
+                                n_process=n_process, disable=disabled)
+            for i, doc in zip(todo, parsed):
+                docs[i] = doc
+            cache.putMany(nlp, [texts[i] for i in todo], [docs[i] for i in todo], disabled)
+        span.set(parsed=len(todo))
+        logger.debug(f"Parsed {len(todo)} texts, {len(texts) - len(todo)} from cache")
+
+    return docs
+
+
+@tracing.traced('Passage.runSpacyPipeline', cat='nlp')
+def runSpacyPipeline(self, index=True, enable=None, disable=None):
+    '''Parse text with spaCy, populating self.spacy_doc
+
+    Args:
+        index (bool): Also build the token index
+        enable (list): Run only these pipeline components
+        disable (list): Skip these pipeline components; ValueError if
+            either names a component the model doesn't have
+    '''
+
+    api = self.speech.api
+    nlp = _getModel(api, self.speech.lang)
+
+    text = self.text
+
+    if text is None:
+        return
+
+    if 'nlp_cache' in api.config or enable is not None or disable is not None:
+        doc = _parse(api, nlp, [text], enable=enable, disable=disable)[0]
+    else:
+        doc = nlp(text)
+
+    _attachDoc(self, doc, index=index)
+
+
+@tracing.traced('SpeechGroup.runSpacyPipeline', cat='nlp')
+def runSpacyPipelineGroup(self, batch_size=64, n_process=1, index=True,
+                            enable=None, disable=None):
+    '''Parse the fetched passages of every speech in a SpeechGroup
+
+    Passages are grouped by language and streamed through each model's
+    `nlp.pipe()`, which batches documents and can spread work across
+    processes. Speeches without a fetched passage are skipped; call
+    `SpeechGroup.fetchPassages()` first. If the api has a doc cache (see
+    `api.initializeNlp(cache_dir=...)`), cached docs are reused and only
+    the remaining passages are parsed.
+
+    Args:
+        batch_size (int): Number of passages per batch passed to the model
+        n_process (int): Number of worker processes; -1 uses all CPUs
+        index (bool): Also build each passage's token index
+        enable (list): Run only these pipeline components
+        disable (list): Skip these pipeline components; ValueError if
+            either names a component the model doesn't have
+
+    Returns:
+        The number of passages parsed
+    '''
+
+    by_lang = {}
+    for speech in self:
+        if speech.passage is None or speech.passage.text is None:
+            continue
+        by_lang.setdefault(speech.lang, []).append(speech.passage)
+
+    count = 0
+    for lang, passages in by_lang.items():
+        nlp = _getModel(self.api, lang)
+        docs = _parse(self.api, nlp, [p.text for p in passages],
+                            batch_size=batch_size, n_process=n_process,
+                            enable=enable, disable=disable)
+        for passage, doc in zip(passages, docs):
+            _attachDoc(passage, doc, index=index)
+            count += 1
+        logger.info(f"Parsed {len(passages)} {lang} passages")
+
+    return count
+
+
+# token attributes available to tokenTable(), by name
+TOKEN_ATTRS = {
+    'orth': ORTH,
+    'text': ORTH,
+    'lower': LOWER,
+    'norm': NORM,
+    'lemma': LEMMA,
+    'pos': POS,
+    'tag': TAG,
+    'morph': MORPH,
+    'dep': DEP,
+    'ent_type': ENT_TYPE,
+}
+
+
+def tokenTable(self, attrs=('lemma', 'pos', 'morph')):
+    '''Return one row per token of every parsed passage, as a DataFrame
+
+    Attributes are extracted a whole doc at a time with `Doc.to_array()` and
+    stored as pandas Categoricals, i.e. integer codes plus one table of
+    distinct strings, so counts and group-bys run on integers. Speeches
+    without a parsed passage are skipped; call runSpacyPipeline() first.
+
+    Args:
+        attrs (list): Names of token attributes; see TOKEN_ATTRS
+
+    Returns:
+        pandas.DataFrame with columns 'speech_id', 'token' (index within
+        the doc), 'line' (index into the passage's line_array), 'n' (line
+        number), then one column per attribute. Join on 'speech_id' to
+        bring in speaker, work etc., e.g. to count lemmas by speaker gender.
+    '''
+
+    attrs = list(attrs)
+    unknown = [name for name in attrs if name not in TOKEN_ATTRS]
+    if unknown:
+        raise ValueError(f"Unknown token attributes {unknown}; "
+                            f"choose from {sorted(TOKEN_ATTRS)}")
+    attr_ids = [TOKEN_ATTRS[name] for name in attrs]
+
+    speech_ids = []
+    tokens = []
+    lines = []
+    line_labels = []
+    values = []
+    vocabs = {}
+
+    for speech in self:
+        passage = speech.passage
+        if passage is None or passage.spacy_doc is None:
+            continue
+        doc = passage.spacy_doc
+        n_tokens = len(doc)
+
+        speech_ids.append(np.full(n_tokens, speech.id, dtype=np.int64))
+        tokens.append(np.arange(n_tokens, dtype=np.int64))
+        values.append(doc.to_array(attr_ids).reshape(n_tokens, len(attr_ids)))
+        vocabs[id(doc.vocab)] = doc.vocab
+
+        alignment = passage.alignTokens()
+        if alignment is None:
+            line_index = np.full(n_tokens, -1, dtype=np.int64)
+        else:
+            line_index = alignment[0]
+        lines.append(line_index)
+        labels = np.array([l['n'] for l in passage.line_array] + [None], dtype=object)
+        line_labels.append(labels[line_index])
+
+    if not values:
+        columns = ['speech_id', 'token', 'line', 'n'] + attrs
+        return pd.DataFrame({col: [] for col in columns})
+
+    values = np.concatenate(values)
+    table = {
+        'speech_id': np.concatenate(speech_ids),
+        'token': np.concatenate(tokens),
+        'line': np.concatenate(lines),
+        'n': pd.Categorical(np.concatenate(line_labels)),
+    }
+
+    # decode each distinct hash once, not once per token
+    vocabs = list(vocabs.values())
+    for col, name in enumerate(attrs):
+        uniques, codes = np.unique(values[:, col], return_inverse=True)
+        labels = [_decode(vocabs, h) for h in uniques]
+        table[name] = _categorical(codes, labels)
+
+    return pd.DataFrame(table)
+
+
+def _decode(vocabs, value):
+    '''Look up a string hash (or symbol ID) in whichever vocab knows it'''
+
+    value = int(value)
+    if value == 0:
+        return ''
+    for vocab in vocabs:
+        if value in vocab.strings:
+            return vocab.strings[value]
+    return str(value)
+
+
+def _categorical(codes, labels):
+    '''Build a Categorical from codes into labels, merging duplicate labels'''
+
+    categories, remap = np.unique(np.array(labels, dtype=object), return_inverse=True)
+    return pd.Categorical.from_codes(remap[codes].astype(np.int32), categories)
 
 
 def buildSpacyTokenIndex(self):
@@ -121,7 +622,8 @@ def buildSpacyTokenIndex(self):
     if self.spacy_doc is None:
         return
 
-    self._token_index = [tok.idx for tok in self.spacy_doc]
+    self._token_index = self.spacy_doc.to_array(IDX).astype(np.int64)
+    self._alignment = None
 
 
 def getSpacyWordIndex(self, word):
@@ -129,7 +631,7 @@ def getSpacyWordIndex(self, word):
     if self.spacy_doc is None:
         return
 
-    return list(self.spacy_doc).index(word)
+    return word.i
 
 
 # attach methods to Passage
@@ -137,3 +639,8 @@ def getSpacyWordIndex(self, word):
 Passage.runSpacyPipeline = runSpacyPipeline
 Passage.buildSpacyTokenIndex = buildSpacyTokenIndex
 Passage.getSpacyWordIndex = getSpacyWordIndex
+
+# attach methods to SpeechGroup
+
+SpeechGroup.runSpacyPipeline = runSpacyPipelineGroup
+SpeechGroup.tokenTable = tokenTable
@@ -0,0 +1,291 @@
+'''profiling - CPU and memory profiles of dicesapi workloads
+
+Wraps cProfile and tracemalloc and reports only what was spent in
+dicesapi's own code, grouped by subsystem:
+
+    paging      requests to the DICES API and collecting their pages
+    hydration   turning API records and dumps into indexed objects
+    filtering   DataGroup filtering, sorting and set operations
+    text        CTS passages, line handling, full-text search
+    nlp         spaCy and CLTK pipelines
+    kinship     MANTO, WikiData and relation checks
+    other       anything else in dicesapi
+
+Usage:
+
+    with api.profile(cpu=True, memory=True) as report:
+        speeches = api.getSpeeches(author_name='Homer')
+        speeches.fetchPassages()
+    print(report.summary())
+    report.save('slow-notebook.profile.json')   # attach this to a bug report
+
+Times are cProfile's "self" times, i.e. excluding callees, so the times of
+the subsystems add up to the time spent in dicesapi code; time spent in
+other packages (requests, lxml, spaCy, ...) is reported separately as one
+total. Memory is attributed to the most recent dicesapi frame of each
+allocation's traceback.
+'''
+
+import cProfile
+import json
+import linecache
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SUBSYSTEMS = ('paging', 'hydration', 'filtering', 'text', 'nlp', 'kinship', 'other')
+
+# subsystem of every function in a module, by module file name
+_MODULE_SUBSYSTEMS = {
+    'text.py': 'text',
+    'search.py': 'text',
+    'locus.py': 'text',
+    'nlp_spacy.py': 'nlp',
+    'nlp_cltk.py': 'nlp',
+    'manto.py': 'kinship',
+    'wikidata.py': 'kinship',
+    'relations.py': 'kinship',
+}
+
+# modules whose functions are sorted into paging, hydration and filtering by
+# name; __init__.py held them all before they were split out
+_CORE_MODULES = frozenset(('client.py', 'models.py', '__init__.py'))
+
+# functions in the core modules, by name
+_PAGING = {'getPagedJSON', 'getSchema', 'getSearchFields', 'fromGitDump', 'getSpeeches',
+            'getClusters', 'getCharacters', 'getWorks', 'getAuthors', 'getInstances'}
+_HYDRATION = {'_from_data', '__init__', '_assign_fields', '_dumpTables', 'fromDump',
+                'fromDumpFile', 'ingest', '_ingest', '_ingested', '_modelClasses',
+                '_rehydrate', '_unchanged', '_keepPayload', '_storedPayload',
+                '_nestedPayload', '_speechSpan'}
+_HYDRATION_PREFIXES = ('indexed',)
+_FILTERING_PREFIXES = ('filter', 'advancedFilter', 'sorted', 'intersect', 'pluck',
+                        '__add__', '__sub__', '__and__', '__or__', '__contains__',
+                        'getIDs', 'getNames', 'getSpkrs', 'getAddrs', 'speechesAt',
+                        'speechesOverlapping', '_workIntervalIndex', '__lt__')
+
+DEFAULT_FRAMES = 25
+PROFILE_FORMAT_VERSION = 1
+
+
+def isPackageFile(filename):
+    '''True if `filename` is part of dicesapi'''
+    return os.path.abspath(filename).startswith(PACKAGE_DIR + os.sep)
+
+
+def subsystem(filename, function, line=None):
+    '''Subsystem of a dicesapi function, given its file and name
+
+    Comprehensions and lambdas (`<listcomp>`, `<genexpr>`, ...) count
+    toward the function they're in, if `line`, where they start, is given.
+    '''
+
+    module = os.path.basename(filename)
+    if module in _MODULE_SUBSYSTEMS:
+        return _MODULE_SUBSYSTEMS[module]
+    if module in _CORE_MODULES:
+        if function.startswith('<') and line is not None:
+            function = _functionAt(filename, line)
+        if function in _PAGING:
+            return 'paging'
+        if function in _HYDRATION or function.startswith(_HYDRATION_PREFIXES):
+            return 'hydration'
+        if function.startswith(_FILTERING_PREFIXES):
+            return 'filtering'
+    return 'other'
+
+
+class ProfileReport(object):
+    '''Results of one profile() block
+
+    Filled in when the block exits. `cpu` is a pstats.Stats (or None) and
+    `memory` a tracemalloc.Snapshot (or None), for anyone who wants the
+    unfiltered data.
+    '''
+
+    def __init__(self):
+        self.seconds = None
+        self.cpu = None
+        self.memory = None
+        self.peak_bytes = None
+
+
+    def functions(self):
+        '''CPU time per dicesapi function, slowest first
+
+        Returns:
+            DataFrame with columns subsystem, function, calls,
+            self_seconds and cumulative_seconds
+        '''
+
+        rows = []
+        if self.cpu is not None:
+            for (filename, line, name), (cc, nc, tt, ct, callers) in self.cpu.stats.items():
+                if not isPackageFile(filename):
+                    continue
+                rows.append(dict(
+                    subsystem = subsystem(filename, name, line),
+                    function = f'{os.path.relpath(filename, PACKAGE_DIR)}:{line}({name})',
+                    calls = nc,
+                    self_seconds = tt,
+                    cumulative_seconds = ct,
+                ))
+        cols = ['subsystem', 'function', 'calls', 'self_seconds', 'cumulative_seconds']
+        df = pd.DataFrame(rows, columns=cols)
+        return df.sort_values('self_seconds', ascending=False, ignore_index=True)
+
+
+    def allocations(self):
+        '''Memory still allocated at the end, per dicesapi source line
+
+        Each allocation is attributed to the most recent dicesapi frame in
+        its traceback; allocations with none are left out.
+
+        Returns:
+            DataFrame with columns subsystem, line, blocks and bytes,
+            largest first
+        '''
+
+        totals = {}
+        if self.memory is not None:
+            for stat in self.memory.statistics('traceback'):
+                for frame in reversed(stat.traceback):
+                    if isPackageFile(frame.filename):
+                        key = (frame.filename, frame.lineno)
+                        blocks, size = totals.get(key, (0, 0))
+                        totals[key] = (blocks + stat.count, size + stat.size)
+                        break
+
+        rows = []
+        for (filename, line), (blocks, size) in totals.items():
+            rows.append(dict(
+                subsystem = subsystem(filename, _functionAt(filename, line)),
+                line = f'{os.path.relpath(filename, PACKAGE_DIR)}:{line}',
+                blocks = blocks,
+                bytes = size,
+            ))
+        df = pd.DataFrame(rows, columns=['subsystem', 'line', 'blocks', 'bytes'])
+        return df.sort_values('bytes', ascending=False, ignore_index=True)
+
+
+    def bySubsystem(self):
+        '''CPU seconds and retained bytes per subsystem
+
+        Returns:
+            DataFrame indexed by subsystem, with columns self_seconds,
+            calls and bytes
+        '''
+
+        df = pd.DataFrame(0, index=pd.Index(SUBSYSTEMS, name='subsystem'),
+                            columns=['self_seconds', 'calls', 'bytes'])
+        df['self_seconds'] = df['self_seconds'].astype(float)
+
+        funcs = self.functions()
+        if len(funcs):
+            grouped = funcs.groupby('subsystem')[['self_seconds', 'calls']].sum()
+            df.loc[grouped.index, 'self_seconds'] = grouped['self_seconds']
+            df.loc[grouped.index, 'calls'] = grouped['calls']
+        allocs = self.allocations()
+        if len(allocs):
+            grouped = allocs.groupby('subsystem')['bytes'].sum()
+            df.loc[grouped.index, 'bytes'] = grouped.values
+        return df
+
+
+    def outsideSeconds(self):
+        '''CPU seconds spent outside dicesapi (other packages, builtins)'''
+
+        if self.cpu is None:
+            return None
+        return sum(tt for (filename, line, name), (cc, nc, tt, ct, callers)
+                    in self.cpu.stats.items() if not isPackageFile(filename))
+
+
+    def summary(self, limit=10):
+        '''A plain-text report: per subsystem, then the slowest functions'''
+
+        lines = [f'wall time: {self.seconds:.3f} s']
+        if self.peak_bytes is not None:
+            lines.append(f'peak traced memory: {self.peak_bytes / 2**20:.1f} MiB')
+        if self.cpu is not None:
+            lines.append(f'outside dicesapi: {self.outsideSeconds():.3f} s')
+        lines.append('')
+        lines.append(self.bySubsystem().to_string())
+        if self.cpu is not None:
+            lines.append('')
+            lines.append(self.functions().head(limit).to_string(index=False))
+        return '\n'.join(lines)
+
+
+    def toDict(self, limit=50):
+        '''The report as plain values, for JSON'''
+
+        by_subsystem = self.bySubsystem()
+        return dict(
+            version = PROFILE_FORMAT_VERSION,
+            seconds = self.seconds,
+            peak_bytes = self.peak_bytes,
+            outside_seconds = self.outsideSeconds(),
+            subsystems = {name: dict(self_seconds=float(row['self_seconds']),
+                                        calls=int(row['calls']), bytes=int(row['bytes']))
+                            for name, row in by_subsystem.iterrows()},
+            functions = self.functions().head(limit).to_dict('records'),
+            allocations = self.allocations().head(limit).to_dict('records'),
+        )
+
+
+    def save(self, path, limit=50):
+        '''Write toDict() as JSON, e.g. to attach to a slowness report'''
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.toDict(limit=limit), f, indent=2, default=str)
+
+
+def _functionAt(filename, line):
+    '''Name of the innermost def enclosing a line of a source file, or '' '''
+
+    for n in range(line, 0, -1):
+        text = linecache.getline(filename, n).strip()
+        if text.startswith(('def ', 'async def ')):
+            return text.split('def ', 1)[1].split('(', 1)[0]
+    return ''
+
+
+@contextmanager
+def profile(cpu=True, memory=True, frames=DEFAULT_FRAMES):
+    '''Profile the body of a with block, yielding a ProfileReport
+
+    Args:
+        cpu (bool): Run cProfile
+        memory (bool): Run tracemalloc (slows the block down a lot)
+        frames (int): Traceback depth kept by tracemalloc; deeper finds
+            dicesapi frames under more library code, at more cost
+    '''
+
+    report = ProfileReport()
+    profiler = cProfile.Profile() if cpu else None
+    tracing_memory = memory and not tracemalloc.is_tracing()
+
+    if tracing_memory:
+        tracemalloc.start(frames)
+    if profiler is not None:
+        profiler.enable()
+    t0 = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.seconds = time.perf_counter() - t0
+        if profiler is not None:
+            profiler.disable()
+            report.cpu = pstats.Stats(profiler)
+        if memory and tracemalloc.is_tracing():
+            report.memory = tracemalloc.take_snapshot()
+            report.peak_bytes = tracemalloc.get_traced_memory()[1]
+        if tracing_memory:
+            tracemalloc.stop()
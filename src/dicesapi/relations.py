@@ -0,0 +1,139 @@
+'''relations - kinship between speakers and addressees, in bulk
+
+Checking a relation speech by speech (with manto.charIsMantoTie() or
+wikidata.checkWDRelation()) resolves the same pairs of characters over and
+over. `relationMatrix()` instead collects the distinct speaker-addressee
+character pairs of a SpeechGroup, resolves each pair once, and returns one
+boolean column per relation:
+
+    from dicesapi.relations import relationMatrix
+
+    speeches = api.getSpeeches(work_id=1)
+    matrix = relationMatrix(speeches, ['mother', 'child'], source='manto')
+    to_mothers = speeches.filterBy('id', set(matrix.speech_id[matrix.mother]))
+
+A relation holds for a speech if some addressee is that relation of some
+speaker, e.g. 'mother' marks speeches addressed by a child to its mother.
+'''
+
+import pandas as pd
+
+from . import logger
+
+SOURCES = ('manto', 'wikidata')
+
+# relations supported by each source
+MANTO_RELATIONS = ('parent', 'mother', 'father', 'child', 'son', 'daughter',
+                    'spouse', 'sibling')
+WIKIDATA_RELATIONS = ('parent', 'mother', 'father', 'child', 'spouse', 'sibling')
+
+
+def _pairs(speeches):
+    '''Return {char id: Character} and, per speech, its set of (spkr, addr) char ids'''
+
+    chars = {}
+    speech_pairs = []
+    for speech in speeches:
+        pairs = set()
+        for spkr in speech.spkr:
+            if spkr.char is None:
+                continue
+            chars[spkr.char.id] = spkr.char
+            for addr in speech.addr:
+                if addr.char is None:
+                    continue
+                chars[addr.char.id] = addr.char
+                pairs.add((spkr.char.id, addr.char.id))
+        speech_pairs.append(pairs)
+    return chars, speech_pairs
+
+
+def _resolveManto(chars, pairs, relations, **prefetch_args):
+    '''Map each pair to the relations that hold for it, via a KinshipGraph'''
+
+    from . import manto
+
+    graph = manto.KinshipGraph(chars.values(), **prefetch_args)
+    return {(a, b): {r for r in relations if b in graph.related(a, r)}
+                for a, b in pairs}
+
+
+def _resolveWikidata(chars, pairs, relations):
+    '''Map each pair to the relations that hold for it, via WikiData claims'''
+
+    from . import wikidata as wd
+
+    properties = dict(
+        parent = (wd.HAS_PARENT, wd.HAS_MOTHER, wd.HAS_FATHER),
+        mother = (wd.HAS_MOTHER,),
+        father = (wd.HAS_FATHER,),
+        child = (wd.HAS_CHILD,),
+        spouse = (wd.HAS_SPOUSE,),
+        sibling = (wd.HAS_SIBLING,),
+    )
+
+    wd.prefetch(chars.values())
+
+    # targets of each speaker's claims, looked up once per speaker
+    targets = {}
+    for a in {a for a, b in pairs}:
+        for r in relations:
+            found = set()
+            for prop in properties[r]:
+                found |= wd.relatedIDs(chars[a], prop) or set()
+            targets[(a, r)] = found
+
+    return {(a, b): {r for r in relations
+                        if chars[b].wd and chars[b].wd in targets[(a, r)]}
+                for a, b in pairs}
+
+
+def relationMatrix(speeches, relations=('mother', 'father', 'child', 'spouse', 'sibling'),
+                    source='manto', **prefetch_args):
+    '''Flag the speeches in which a speaker addresses a relative
+
+    Args:
+        speeches (SpeechGroup): Speeches to check
+        relations (list): Relations to test, read as "addressee is the
+            speaker's ...": 'parent', 'mother', 'father', 'child', 'spouse',
+            'sibling', and with source='manto' also 'son', 'daughter'
+        source (str): 'manto' or 'wikidata'
+        **prefetch_args: Passed on to manto.prefetch(), e.g. max_concurrency
+
+    Returns:
+        pandas.DataFrame with a 'speech_id' column and one boolean column
+        per relation, one row per speech in the order given
+    '''
+
+    if isinstance(relations, str):
+        relations = [relations]
+    relations = list(relations)
+
+    if source == 'manto':
+        supported = MANTO_RELATIONS
+    elif source == 'wikidata':
+        supported = WIKIDATA_RELATIONS
+    else:
+        raise ValueError(f"Unknown source '{source}'; choose from {', '.join(SOURCES)}")
+    for r in relations:
+        if r not in supported:
+            raise ValueError(f"Relation '{r}' not available from {source}; "
+                                f"choose from {', '.join(supported)}")
+
+    speeches = list(speeches)
+    chars, speech_pairs = _pairs(speeches)
+    pairs = set().union(*speech_pairs)
+
+    if source == 'manto':
+        pair_relations = _resolveManto(chars, pairs, relations, **prefetch_args)
+    else:
+        pair_relations = _resolveWikidata(chars, pairs, relations)
+
+    logger.info(f"Resolved {len(pairs)} speaker-addressee pairs "
+                    f"for {len(speeches)} speeches from {source}")
+
+    table = {'speech_id': [s.id for s in speeches]}
+    for r in relations:
+        table[r] = [any(r in pair_relations[pair] for pair in pairs)
+                        for pairs in speech_pairs]
+    return pd.DataFrame(table).astype({r: bool for r in relations})
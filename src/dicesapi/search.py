@@ -0,0 +1,226 @@
+'''search - full-text search over fetched speech passages
+
+Builds an inverted index from normalized tokens to their positions in the
+passages of already-fetched speeches (see `Speech.fetchPassage()`), so that
+words and phrases can be found without scanning every `Passage.text`.
+
+Tokens are normalized before indexing, and queries the same way:
+    - case is folded;
+    - Greek diacritics are removed and final sigma is folded to σ;
+    - Latin v/j are folded to u/i.
+
+Usage:
+
+    api.initializeCts()
+    speeches = api.getSpeeches(work_id=1)
+    speeches.fetchPassages()
+    api.buildTextIndex(speeches)
+    found, hits = api.searchText("arma virumque")
+'''
+
+import gzip
+import json
+import re
+import unicodedata
+
+from . import logger
+
+# a run of word characters, allowing combining marks inside Greek words
+TOKEN_RE = re.compile(r'[\w\u0300-\u036f]+')
+
+_FOLD = str.maketrans({
+    'ς': 'σ',
+    'ϲ': 'σ',   # lunate sigma
+    'v': 'u',
+    'j': 'i',
+})
+
+INDEX_FORMAT_VERSION = 1
+
+# fields of a posting, stored as a tuple
+P_SPEECH, P_LINE, P_OFFSET, P_LENGTH, P_POS = range(5)
+
+
+def normalize(token):
+    '''Fold case, Greek diacritics and Latin u/v, i/j'''
+
+    token = unicodedata.normalize('NFD', token.lower())
+    token = ''.join(c for c in token if not unicodedata.combining(c))
+    return token.translate(_FOLD)
+
+
+def tokenize(text):
+    '''Yield (normalized token, char offset, length) for each word in text'''
+
+    for match in TOKEN_RE.finditer(text):
+        token = normalize(match.group())
+        if token:
+            yield token, match.start(), match.end() - match.start()
+
+
+class TextIndex(object):
+    '''Inverted index over the passages of a set of speeches
+
+    Maps each normalized token to a list of postings
+    (speech id, line seq, char offset, length, token position), where
+    `line seq` indexes the passage's line_array and `char offset` is
+    relative to the start of that line.
+    '''
+
+    def __init__(self):
+        self._postings = {}
+        self._lines = {}
+        self._speech_tokens = {}
+
+    def __len__(self):
+        '''Number of speeches indexed'''
+        return len(self._lines)
+
+    def __contains__(self, speech_id):
+        return speech_id in self._lines
+
+    @property
+    def vocabulary(self):
+        '''Set of distinct normalized tokens'''
+        return set(self._postings)
+
+    def addPassage(self, speech_id, line_array):
+        '''Index the lines of one passage, replacing any previous entry'''
+
+        if speech_id in self._lines:
+            self.remove(speech_id)
+
+        pos = 0
+        tokens = set()
+        for seq, line in enumerate(line_array):
+            for token, offset, length in tokenize(line['text']):
+                self._postings.setdefault(token, []).append(
+                    (speech_id, seq, offset, length, pos))
+                tokens.add(token)
+                pos += 1
+
+        self._lines[speech_id] = [line['n'] for line in line_array]
+        self._speech_tokens[speech_id] = tokens
+
+    def addSpeech(self, speech):
+        '''Index a speech's fetched passage; returns False if there is none'''
+
+        passage = speech.passage
+        if passage is None or not passage.line_array:
+            return False
+
+        self.addPassage(speech.id, passage.line_array)
+        return True
+
+    def addSpeeches(self, speeches):
+        '''Index every speech in `speeches` that has a fetched passage'''
+
+        added = 0
+        for speech in speeches:
+            if self.addSpeech(speech):
+                added += 1
+        logger.info(f"Indexed {added} of {len(speeches)} passages")
+        return added
+
+    def remove(self, speech_id):
+        '''Drop a speech from the index'''
+
+        for token in self._speech_tokens.pop(speech_id, ()):
+            postings = [p for p in self._postings[token] if p[P_SPEECH] != speech_id]
+            if postings:
+                self._postings[token] = postings
+            else:
+                del self._postings[token]
+        self._lines.pop(speech_id, None)
+
+    def lookup(self, token):
+        '''Return raw postings for a single (unnormalized) token'''
+
+        return self._postings.get(normalize(token), [])
+
+    def search(self, query):
+        '''Find a word or phrase
+
+        Args:
+            query (str): One or more words; multiple words must occur
+                consecutively (punctuation and line breaks are ignored)
+
+        Returns:
+            list of dicts with keys 'speech_id', 'n' (line number),
+            'line' (index into line_array), 'offset' (char offset within
+            the line) and 'length' (chars, to the end of the last word if
+            the match is on one line), in index order
+        '''
+
+        terms = [token for token, offset, length in tokenize(query)]
+        if not terms:
+            return []
+
+        postings = [self._postings.get(term) for term in terms]
+        if any(p is None for p in postings):
+            return []
+
+        if len(terms) == 1:
+            matches = postings[0]
+        else:
+            # start from the rarest term to keep candidate sets small
+            pivot = min(range(len(terms)), key=lambda k: len(postings[k]))
+            starts = {(p[P_SPEECH], p[P_POS] - pivot) for p in postings[pivot]}
+            for k, plist in enumerate(postings):
+                if k == pivot:
+                    continue
+                starts &= {(p[P_SPEECH], p[P_POS] - k) for p in plist}
+                if not starts:
+                    return []
+            ends = {(p[P_SPEECH], p[P_POS]): p for p in postings[-1]}
+            matches = []
+            for p in postings[0]:
+                if (p[P_SPEECH], p[P_POS]) in starts:
+                    last = ends[(p[P_SPEECH], p[P_POS] + len(terms) - 1)]
+                    if last[P_LINE] == p[P_LINE]:
+                        length = last[P_OFFSET] + last[P_LENGTH] - p[P_OFFSET]
+                    else:
+                        length = p[P_LENGTH]
+                    matches.append(p[:P_LENGTH] + (length, p[P_POS]))
+
+        return [dict(
+                    speech_id = p[P_SPEECH],
+                    n = self._lines[p[P_SPEECH]][p[P_LINE]],
+                    line = p[P_LINE],
+                    offset = p[P_OFFSET],
+                    length = p[P_LENGTH],
+                ) for p in matches]
+
+    def save(self, path):
+        '''Write the index to a gzipped JSON file'''
+
+        data = dict(
+            version = INDEX_FORMAT_VERSION,
+            lines = [[sid, lines] for sid, lines in self._lines.items()],
+            postings = self._postings,
+        )
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        logger.info(f"Saved text index of {len(self)} passages to {path}")
+
+    @classmethod
+    def load(cls, path):
+        '''Read an index written by save()'''
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported text index version in {path}: "
+                                f"{data.get('version')}")
+
+        index = cls()
+        index._lines = {sid: lines for sid, lines in data['lines']}
+        index._speech_tokens = {sid: set() for sid in index._lines}
+        for token, plist in data['postings'].items():
+            index._postings[token] = [tuple(p) for p in plist]
+            for p in plist:
+                index._speech_tokens[p[P_SPEECH]].add(token)
+
+        logger.info(f"Loaded text index of {len(index)} passages from {path}")
+        return index
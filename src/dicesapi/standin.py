@@ -0,0 +1,532 @@
+'''standin - a local stand-in for the DICES API
+
+Serves the `speeches`, `clusters`, `characters`, `instances`, `works`,
+`authors` and `schema` endpoints from a DB dump, speaking the same
+paginated protocol as the real API (`count`/`next`/`previous`/`results`,
+`page` and `page_size` parameters), so that DicesAPI can be tested and
+benchmarked with real HTTP round trips, fully offline.
+
+Latency and server errors can be injected, and the server counts requests
+and bytes sent:
+
+    from dicesapi import DicesAPI
+    from dicesapi.standin import DicesStandIn
+
+    with DicesStandIn('speechdb.json', page_size=50, latency=0.02) as server:
+        api = DicesAPI(dices_api=server.url)
+        speeches = api.getSpeeches(author_name='Homer')
+        print(server.stats())
+
+Or from the command line:
+
+    python -m dicesapi.standin speechdb.json --port 8000 --page-size 50
+
+To keep the server's own CPU time and memory out of measurements of the
+client, run it in a child process with `StandInProcess` instead; it has
+the same `url`, `stats()` and `resetStats()`.
+
+Records are serialized the way the API nests them: works include their
+author, instances their character, speeches their work, cluster and
+speaker/addressee instances. Only a common subset of the API's filters is
+supported; see `DicesStandIn.FILTERS`, or the schema endpoint.
+'''
+
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from . import logger, _dumpTables
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+API_PATH = '/api/'
+
+ENDPOINTS = ('speeches', 'clusters', 'characters', 'instances', 'works', 'authors')
+
+# number of filtered queries kept, least recently used dropped first
+QUERY_CACHE_SIZE = 64
+
+
+def _chars(insts, field):
+    '''Values of `field` for the characters behind a list of instances'''
+    return [inst['char'].get(field) for inst in insts if inst.get('char')]
+
+
+def _names(insts):
+    '''Instance names and character names'''
+    return [inst.get('name') for inst in insts] + _chars(insts, 'name')
+
+
+def _author(work, field):
+    author = (work or {}).get('author') or {}
+    return author.get(field)
+
+
+class DicesStandIn(object):
+    '''A threaded HTTP server answering like the DICES API, from a snapshot
+
+    Args:
+        snapshot: DB dump records (as for DicesAPI.fromDump()), or the path
+            of a dump file
+        page_size (int): Results per page, unless a request asks for
+            another `page_size` (up to `max_page_size`)
+        max_page_size (int): Largest page a request may ask for
+        latency (float): Seconds to wait before answering each request
+        error_rate (float): Fraction of requests answered with a 503 error
+        seed: Seed for choosing which requests fail
+        host (str): Address to bind
+        port (int): Port to bind; 0 picks a free one
+    '''
+
+    # filter parameters: name -> (type, getter returning candidate values)
+    FILTERS = dict(
+        speeches = dict(
+            id = ('integer', lambda r: [r['id']]),
+            work_id = ('integer', lambda r: [(r['work'] or {}).get('id')]),
+            work_title = ('string', lambda r: [(r['work'] or {}).get('title')]),
+            author_id = ('integer', lambda r: [_author(r['work'], 'id')]),
+            author_name = ('string', lambda r: [_author(r['work'], 'name')]),
+            lang = ('string', lambda r: [(r['work'] or {}).get('lang')]),
+            cluster_id = ('integer', lambda r: [(r['cluster'] or {}).get('id')]),
+            type = ('string', lambda r: [r.get('type')]),
+            part = ('integer', lambda r: [r.get('part')]),
+            level = ('integer', lambda r: [r.get('level')]),
+            spkr_id = ('integer', lambda r: _chars(r['spkr'], 'id')),
+            spkr_name = ('string', lambda r: _names(r['spkr'])),
+            spkr_gender = ('string', lambda r: _chars(r['spkr'], 'gender')),
+            spkr_being = ('string', lambda r: _chars(r['spkr'], 'being')),
+            spkr_number = ('string', lambda r: _chars(r['spkr'], 'number')),
+            addr_id = ('integer', lambda r: _chars(r['addr'], 'id')),
+            addr_name = ('string', lambda r: _names(r['addr'])),
+            addr_gender = ('string', lambda r: _chars(r['addr'], 'gender')),
+            addr_being = ('string', lambda r: _chars(r['addr'], 'being')),
+            addr_number = ('string', lambda r: _chars(r['addr'], 'number')),
+        ),
+        clusters = dict(
+            id = ('integer', lambda r: [r['id']]),
+            type = ('string', lambda r: [r.get('type')]),
+            work_id = ('integer', lambda r: [(r['work'] or {}).get('id')]),
+            work_title = ('string', lambda r: [(r['work'] or {}).get('title')]),
+            author_name = ('string', lambda r: [_author(r['work'], 'name')]),
+        ),
+        characters = dict(
+            id = ('integer', lambda r: [r['id']]),
+            name = ('string', lambda r: [r.get('name')]),
+            being = ('string', lambda r: [r.get('being')]),
+            number = ('string', lambda r: [r.get('number')]),
+            gender = ('string', lambda r: [r.get('gender')]),
+            wd = ('string', lambda r: [r.get('wd')]),
+            manto = ('string', lambda r: [r.get('manto')]),
+        ),
+        instances = dict(
+            id = ('integer', lambda r: [r['id']]),
+            char_id = ('integer', lambda r: _chars([r], 'id')),
+            name = ('string', lambda r: _names([r])),
+            being = ('string', lambda r: [r.get('being')]),
+            number = ('string', lambda r: [r.get('number')]),
+            gender = ('string', lambda r: [r.get('gender')]),
+        ),
+        works = dict(
+            id = ('integer', lambda r: [r['id']]),
+            title = ('string', lambda r: [r.get('title')]),
+            author_id = ('integer', lambda r: [_author(r, 'id')]),
+            author_name = ('string', lambda r: [_author(r, 'name')]),
+            lang = ('string', lambda r: [r.get('lang')]),
+            urn = ('string', lambda r: [r.get('urn')]),
+            wd = ('string', lambda r: [r.get('wd')]),
+        ),
+        authors = dict(
+            id = ('integer', lambda r: [r['id']]),
+            name = ('string', lambda r: [r.get('name')]),
+            urn = ('string', lambda r: [r.get('urn')]),
+            wd = ('string', lambda r: [r.get('wd')]),
+        ),
+    )
+
+    # string filters whose distinct values are listed as choices in the schema
+    CHOICE_FILTERS = ('type', 'lang', 'gender', 'being', 'number',
+                        'spkr_gender', 'spkr_being', 'spkr_number',
+                        'addr_gender', 'addr_being', 'addr_number')
+
+    def __init__(self, snapshot, page_size=DEFAULT_PAGE_SIZE, max_page_size=MAX_PAGE_SIZE,
+                    latency=0, error_rate=0, seed=None, host='127.0.0.1', port=0):
+        if not isinstance(snapshot, list):
+            with open(snapshot, encoding='utf-8') as f:
+                snapshot = json.load(f)
+
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+        self._records = self._serialize(_dumpTables(snapshot))
+        # (endpoint, filters) -> matching records, so paging through a
+        # query filters the records once rather than once per page
+        self._queries = OrderedDict()
+        self._schema = self._buildSchema()
+        self.resetStats()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        '''Base URL of the API, for DicesAPI(dices_api=...)'''
+        return f'http://{self.host}:{self.port}{API_PATH}'
+
+    def start(self):
+        '''Start serving in a background thread'''
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"DICES stand-in serving {self.url}")
+
+    def stop(self):
+        '''Stop serving'''
+
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+            self._thread = None
+
+    def serveForever(self):
+        '''Serve in the calling thread until interrupted'''
+
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stats(self):
+        '''Return request counters since start or the last resetStats()
+
+        Returns:
+            dict with keys 'requests', 'errors' (injected or not), 'bytes'
+            (response bodies) and 'endpoints' ({endpoint: requests})
+        '''
+
+        with self._lock:
+            return dict(self._stats, endpoints=dict(self._stats['endpoints']))
+
+    def resetStats(self):
+        with self._lock:
+            self._stats = dict(requests=0, errors=0, bytes=0, endpoints={})
+
+    def _serialize(self, tables):
+        '''Nest related records the way the API's serializers do'''
+
+        authors = {row['id']: row for row in tables['author']}
+
+        works = {}
+        for row in tables['work']:
+            work = dict(row)
+            work['author'] = authors.get(row.get('author'))
+            works[row['id']] = work
+
+        characters = {row['id']: row for row in tables['character']}
+
+        instances = {}
+        for row in tables['characterinstance']:
+            inst = dict(row)
+            inst['char'] = characters.get(row.get('char'))
+            instances[row['id']] = inst
+
+        clusters = {}
+        for row in tables['speechcluster']:
+            clust = dict(row)
+            clust['work'] = works.get(row.get('work'))
+            clusters[row['id']] = clust
+
+        speeches = []
+        for row in tables['speech']:
+            speech = dict(row)
+            clust = clusters.get(row.get('cluster'))
+            speech['cluster'] = None if clust is None else dict(id=clust['id'],
+                                                                type=clust.get('type'))
+            speech['work'] = works.get(row.get('work'))
+            speech['spkr'] = [instances[i] for i in row.get('spkr', []) if i in instances]
+            speech['addr'] = [instances[i] for i in row.get('addr', []) if i in instances]
+            speeches.append(speech)
+        speeches.sort(key=lambda s: ((s['work'] or {}).get('id') or 0, s.get('seq') or 0, s['id']))
+
+        def by_id(records):
+            return [records[k] for k in sorted(records)]
+
+        return dict(
+            speeches = speeches,
+            clusters = by_id(clusters),
+            characters = by_id(characters),
+            instances = by_id(instances),
+            works = by_id(works),
+            authors = by_id(authors),
+        )
+
+    def _buildSchema(self):
+        '''An OpenAPI document listing each endpoint's query parameters'''
+
+        paging = [
+            dict(name='page', required=False, **{'in': 'query'},
+                    schema=dict(type='integer'),
+                    description='A page number within the paginated result set.'),
+            dict(name='page_size', required=False, **{'in': 'query'},
+                    schema=dict(type='integer'),
+                    description='Number of results to return per page.'),
+        ]
+
+        paths = {}
+        for endpoint, filters in self.FILTERS.items():
+            params = list(paging)
+            for name, (ftype, getter) in filters.items():
+                param = dict(name=name, required=False, schema=dict(type=ftype),
+                                **{'in': 'query'})
+                if name in self.CHOICE_FILTERS:
+                    values = sorted({str(v) for r in self._records[endpoint]
+                                        for v in getter(r) if v is not None})
+                    param['schema']['enum'] = values
+                    param['description'] = '\n\n'.join(f'* `{v}` - {v}' for v in values)
+                params.append(param)
+            paths[f'{API_PATH}{endpoint}/'] = dict(get=dict(
+                operationId=f'{endpoint}_list', parameters=params))
+        paths[f'{API_PATH}schema/'] = dict(get=dict(operationId='schema_retrieve',
+                                                    parameters=[]))
+
+        return dict(
+            openapi = '3.0.3',
+            info = dict(title='DICES API (local stand-in)', version='1.0.0'),
+            paths = paths,
+        )
+
+    def _filter(self, endpoint, params):
+        '''Records of `endpoint` matching every known filter in `params`
+
+        Results are cached per query (the last QUERY_CACHE_SIZE of them),
+        as every page of a query asks for the same list.
+        '''
+
+        filters = self.FILTERS[endpoint]
+        active = sorted((name, value.lower()) for name, value in params.items()
+                            if name in filters)
+        key = (endpoint, tuple(active))
+
+        with self._lock:
+            results = self._queries.get(key)
+            if results is not None:
+                self._queries.move_to_end(key)
+                return results
+
+        getters = [(filters[name][1], value) for name, value in active]
+        results = []
+        for rec in self._records[endpoint]:
+            if all(any(v is not None and str(v).lower() == value for v in getter(rec))
+                    for getter, value in getters):
+                results.append(rec)
+
+        with self._lock:
+            self._queries[key] = results
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                self._queries.popitem(last=False)
+        return results
+
+    def _page(self, endpoint, params, base_url):
+        '''Return (status, payload) for one page of a list endpoint'''
+
+        try:
+            page = int(params.get('page', 1))
+            page_size = int(params.get('page_size', self.page_size))
+        except ValueError:
+            return 404, dict(detail='Invalid page.')
+        page_size = max(1, min(page_size, self.max_page_size))
+
+        results = self._filter(endpoint, params)
+        count = len(results)
+        n_pages = max(1, -(-count // page_size))
+        if page < 1 or page > n_pages:
+            return 404, dict(detail='Invalid page.')
+
+        def link(n):
+            query = dict(params, page=n)
+            if n == 1:
+                del query['page']
+            return f'{base_url}?{urlencode(query)}' if query else base_url
+
+        start = (page - 1) * page_size
+        return 200, dict(
+            count = count,
+            next = link(page + 1) if page < n_pages else None,
+            previous = link(page - 1) if page > 1 else None,
+            results = results[start:start + page_size],
+        )
+
+    def _route(self, path):
+        '''Return (status, endpoint, payload) for a request path'''
+
+        parsed = urlparse(path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+        if not parsed.path.startswith(API_PATH):
+            return 404, None, dict(detail='Not found.')
+        endpoint = parsed.path[len(API_PATH):].strip('/')
+
+        if endpoint == 'schema':
+            return 200, endpoint, self._schema
+        if endpoint in ENDPOINTS:
+            base_url = f'http://{self.host}:{self.port}{API_PATH}{endpoint}/'
+            status, payload = self._page(endpoint, params, base_url)
+            return status, endpoint, payload
+
+        return 404, None, dict(detail='Not found.')
+
+    def _respond(self, handler):
+        '''Answer one request, after any injected latency or error'''
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+
+        if fail:
+            status, endpoint = 503, None
+            payload = dict(detail='Service temporarily unavailable (injected).')
+        else:
+            status, endpoint, payload = self._route(handler.path)
+
+        body = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['bytes'] += len(body)
+            if status >= 400:
+                self._stats['errors'] += 1
+            if endpoint is not None:
+                self._stats['endpoints'][endpoint] = self._stats['endpoints'].get(endpoint, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''Hands every GET to the server's DicesStandIn'''
+
+    server_version = 'DicesStandIn/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.standin._respond(self)
+
+    def log_message(self, format, *args):
+        logger.debug(f"stand-in: {format % args}")
+
+
+def _serveChild(snapshot, options, conn):
+    '''Child process body for StandInProcess: serve, and answer commands'''
+
+    server = DicesStandIn(snapshot, **options)
+    server.start()
+    conn.send(server.url)
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'stats':
+                conn.send(server.stats())
+            elif command == 'reset':
+                server.resetStats()
+                conn.send(None)
+            elif command == 'stop':
+                break
+    except EOFError:
+        pass
+    finally:
+        server.stop()
+        conn.close()
+
+
+class StandInProcess(object):
+    '''A DicesStandIn running in a child process
+
+    Takes the same arguments as DicesStandIn and starts serving at once.
+    Use as a context manager, or call stop() when done.
+    '''
+
+    def __init__(self, snapshot, **options):
+        ctx = multiprocessing.get_context('spawn')
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_serveChild, args=(snapshot, options, child_conn),
+                                    daemon=True)
+        self._process.start()
+        child_conn.close()
+        self.url = self._conn.recv()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        '''The server's request counters; see DicesStandIn.stats()'''
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def resetStats(self):
+        self._conn.send('reset')
+        self._conn.recv()
+
+    def stop(self):
+        if self._process is not None:
+            self._conn.send('stop')
+            self._process.join()
+            self._conn.close()
+            self._process = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a DICES DB dump like the DICES API')
+    parser.add_argument('snapshot', help='DB dump (JSON)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds to wait before each response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server = DicesStandIn(args.snapshot, page_size=args.page_size, latency=args.latency,
+                            error_rate=args.error_rate, seed=args.seed,
+                            host=args.host, port=args.port)
+    print(f"Serving {server.url} (Ctrl-C to stop)")
+    server.serveForever()
+
+
+if __name__ == '__main__':
+    main()
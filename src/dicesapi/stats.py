@@ -0,0 +1,311 @@
+'''stats - request and cache instrumentation
+
+A `Stats` collector records, per source (the DICES API, CTS, MANTO,
+WikiData), per endpoint and per host:
+    - the number of requests, failed requests and retries (requests
+      repeating one that failed: MANTO re-requests ids whose stored error
+      has expired; nothing else retries);
+    - a histogram of request latencies;
+    - bytes received (for WikiData, whose client hands back decoded JSON,
+      the size of that JSON re-encoded; see jsonSize());
+and, per query, how many pages it took to collect, plus hits and misses of
+each cache: the DicesAPI object indexes, the CTS passage cache, the MANTO
+index and store, and the WikiData entity cache and claim index.
+
+Every DicesAPI has its own collector, for its requests to the DICES API
+and CTS and for its object indexes. The MANTO and WikiData modules keep
+process-wide caches, so they record into the module-level `shared`
+collector. `DicesAPI.stats()` reports both.
+
+Callbacks added with `addCallback()` are called with each event, as a
+dict, when it is recorded, e.g.
+
+    {'event': 'request', 'source': 'dices', 'endpoint': 'speeches',
+     'host': 'db.dices.mta.ca', 'seconds': 0.21, 'bytes': 48213,
+     'ok': True, 'retry': False}
+
+Usage:
+
+    api = DicesAPI()
+    api.addStatsCallback(print)
+    speeches = api.getSpeeches(work_id=1)
+    api.stats()['requests']['dices']['speeches']['count']
+'''
+
+import bisect
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+from . import tracing
+
+# the package logger; not imported from dicesapi, which imports this module
+logger = logging.getLogger('dicesapi')
+
+# upper bounds, in seconds, of the latency histogram's buckets; a final
+# bucket counts anything slower
+LATENCY_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _host(url):
+    '''Host name of a URL, or '' if it has none'''
+
+    if not url:
+        return ''
+    return urlparse(url).hostname or ''
+
+
+def responseSize(res):
+    '''Bytes in the body of a requests.Response, or None if unknown'''
+
+    content = getattr(res, 'content', None)
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    return None
+
+
+def jsonSize(data):
+    '''Approximate bytes of a JSON response body, from its decoded data
+
+    For clients that return parsed JSON rather than the response. The data
+    is re-encoded compactly, so whitespace and escapes in the original body
+    aren't counted. None for no data.
+    '''
+
+    if data is None:
+        return None
+    return len(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def _newEntry():
+    return dict(count=0, errors=0, retries=0, bytes=0, seconds=0.0, max_seconds=0.0,
+                latency=[0] * (len(LATENCY_BOUNDS) + 1))
+
+
+def _addEntry(total, entry):
+    '''Add the counts of one request entry to another, in place'''
+
+    for key in ('count', 'errors', 'retries', 'bytes', 'seconds'):
+        total[key] += entry[key]
+    total['max_seconds'] = max(total['max_seconds'], entry['max_seconds'])
+    total['latency'] = [a + b for a, b in zip(total['latency'], entry['latency'])]
+
+
+class RequestTimer(object):
+    '''Context manager timing one request, made by Stats.timeRequest()
+
+    Call `done()` with the response size and status once the response is
+    in; a request that raises, or never calls `done()`, counts as failed.
+    While tracing is on (see dicesapi.tracing), the request is also a span.
+    '''
+
+    def __init__(self, stats, source, endpoint, url, retry=False):
+        self.stats = stats
+        self.source = source
+        self.endpoint = endpoint
+        self.url = url
+        self.retry = retry
+        self.nbytes = None
+        self.ok = False
+
+    def done(self, nbytes=None, ok=True):
+        self.nbytes = nbytes
+        self.ok = ok
+
+    def __enter__(self):
+        self._span = tracing.span(f'{self.source}:{self.endpoint}', cat='http', url=self.url)
+        self._span.__enter__()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._t0
+        self._span.set(bytes=self.nbytes, ok=self.ok)
+        self._span.__exit__(exc_type, exc, tb)
+        self.stats.recordRequest(self.source, self.endpoint, self.url, seconds,
+                                    nbytes=self.nbytes, ok=self.ok and exc_type is None,
+                                    retry=self.retry)
+        return False
+
+
+class Stats(object):
+    '''Thread-safe counters of requests, queries and cache lookups'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reset()
+
+
+    def reset(self):
+        '''Zero all counters; callbacks stay registered'''
+
+        with self._lock:
+            self._requests = {}     # (source, endpoint) -> entry
+            self._hosts = {}        # host -> entry
+            self._queries = {}      # (source, endpoint) -> [queries, pages, max pages]
+            self._caches = {}       # cache name -> [hits, misses]
+
+
+    def addCallback(self, callback):
+        '''Call `callback(event)` with every event recorded from now on'''
+
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+        return callback
+
+
+    def removeCallback(self, callback):
+        '''Stop calling a callback added with addCallback()'''
+
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+    def _emit(self, event):
+        for callback in list(self._callbacks):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception(f"Stats callback {callback!r} failed on {event['event']} event")
+
+
+    def timeRequest(self, source, endpoint, url=None, retry=False):
+        '''Return a RequestTimer for a request, to use as a context manager
+
+            with stats.timeRequest('dices', 'speeches', url) as req:
+                res = requests.get(url)
+                req.done(responseSize(res), res.ok)
+        '''
+
+        return RequestTimer(self, source, endpoint, url, retry=retry)
+
+
+    def recordRequest(self, source, endpoint, url=None, seconds=0.0, nbytes=None,
+                        ok=True, retry=False):
+        '''Count one request
+
+        Args:
+            source (str): Service asked, e.g. 'dices', 'cts', 'manto', 'wikidata'
+            endpoint (str): Endpoint asked, e.g. 'speeches'
+            url (str): URL requested, for the per-host counts
+            seconds (float): Time taken
+            nbytes (int): Bytes received, if known
+            ok (bool): False if the request failed
+            retry (bool): True if this repeats an earlier, failed request
+        '''
+
+        host = _host(url)
+        bucket = bisect.bisect_left(LATENCY_BOUNDS, seconds)
+
+        with self._lock:
+            for entry in (self._requests.setdefault((source, endpoint), _newEntry()),
+                            self._hosts.setdefault(host, _newEntry())):
+                entry['count'] += 1
+                entry['errors'] += not ok
+                entry['retries'] += bool(retry)
+                entry['bytes'] += nbytes or 0
+                entry['seconds'] += seconds
+                entry['max_seconds'] = max(entry['max_seconds'], seconds)
+                entry['latency'][bucket] += 1
+
+        if self._callbacks:
+            self._emit(dict(event='request', source=source, endpoint=endpoint, host=host,
+                            seconds=seconds, bytes=nbytes, ok=ok, retry=bool(retry)))
+
+
+    def recordQuery(self, source, endpoint, pages):
+        '''Count one query, which took `pages` paged requests to collect'''
+
+        with self._lock:
+            counts = self._queries.setdefault((source, endpoint), [0, 0, 0])
+            counts[0] += 1
+            counts[1] += pages
+            counts[2] = max(counts[2], pages)
+
+        if self._callbacks:
+            self._emit(dict(event='query', source=source, endpoint=endpoint, pages=pages))
+
+
+    def recordCache(self, cache, hit, count=1):
+        '''Count `count` lookups in a cache, e.g. 'index.speech' or 'cts'
+
+        Called for every object indexed, so it takes no lock: counts from
+        threads racing on the same cache may, rarely, be a little low.
+        '''
+
+        counts = self._caches.get(cache)
+        if counts is None:
+            counts = self._caches.setdefault(cache, [0, 0])
+        counts[not hit] += count
+
+        if self._callbacks:
+            self._emit(dict(event='cache', cache=cache, hit=bool(hit), count=count))
+
+
+    def snapshot(self):
+        '''Return the counts so far as a dict of plain values
+
+        Returns:
+            dict with keys
+                'requests': {source: {endpoint: entry}}
+                'hosts': {host: entry}
+                'queries': {source: {endpoint: {'count', 'pages', 'max_pages'}}}
+                'caches': {cache: {'hits', 'misses'}}
+                'latency_bounds': LATENCY_BOUNDS
+            where each entry has 'count', 'errors', 'retries', 'bytes',
+            'seconds' (total), 'max_seconds' and 'latency' (requests per
+            histogram bucket; see LATENCY_BOUNDS)
+        '''
+
+        with self._lock:
+            requests = {}
+            for (source, endpoint), entry in self._requests.items():
+                requests.setdefault(source, {})[endpoint] = dict(entry, latency=list(entry['latency']))
+            hosts = {host: dict(entry, latency=list(entry['latency']))
+                        for host, entry in self._hosts.items()}
+            queries = {}
+            for (source, endpoint), (count, pages, max_pages) in self._queries.items():
+                queries.setdefault(source, {})[endpoint] = dict(count=count, pages=pages,
+                                                                max_pages=max_pages)
+            caches = {name: dict(hits=hits, misses=misses)
+                        for name, (hits, misses) in self._caches.items()}
+
+        return dict(requests=requests, hosts=hosts, queries=queries, caches=caches,
+                    latency_bounds=list(LATENCY_BOUNDS))
+
+
+def combine(*snapshots):
+    '''Add up several Stats.snapshot() results into one'''
+
+    result = dict(requests={}, hosts={}, queries={}, caches={},
+                    latency_bounds=list(LATENCY_BOUNDS))
+
+    for snap in snapshots:
+        for source, endpoints in snap['requests'].items():
+            for endpoint, entry in endpoints.items():
+                total = result['requests'].setdefault(source, {}).setdefault(endpoint, _newEntry())
+                _addEntry(total, entry)
+        for host, entry in snap['hosts'].items():
+            _addEntry(result['hosts'].setdefault(host, _newEntry()), entry)
+        for source, endpoints in snap['queries'].items():
+            for endpoint, q in endpoints.items():
+                total = result['queries'].setdefault(source, {}).setdefault(
+                                endpoint, dict(count=0, pages=0, max_pages=0))
+                total['count'] += q['count']
+                total['pages'] += q['pages']
+                total['max_pages'] = max(total['max_pages'], q['max_pages'])
+        for name, c in snap['caches'].items():
+            total = result['caches'].setdefault(name, dict(hits=0, misses=0))
+            total['hits'] += c['hits']
+            total['misses'] += c['misses']
+
+    return result
+
+
+# collector for the process-wide MANTO and WikiData caches
+shared = Stats()
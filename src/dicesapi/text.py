@@ -8,13 +8,12 @@ For part-of-speech tagging, lemmatization, etc., see the optional
 imported.
 '''
 
-import requests
-from copy import deepcopy
-from lxml import etree
-import bisect
 import re
+from functools import lru_cache
 
 from . import logger
+from . import stats as _stats
+from . import tracing
 
 DEFAULT_CTS_PATTERN = "https://atlas.perseus.tufts.edu/library/passage/{cts_urn}/xml/"
 PUNCT = r'[ ,·.;\n—‘’“”]+'
@@ -72,18 +71,52 @@ PERSEUS_ADJUSTMENTS = {
                                                      (r"4\.850", r"4.842")],
 }
 
+# compiled adjustments, memoized per work URN; see getAdjustments()
+_adjustment_cache = {}
+
+
+def getAdjustments(work_urn):
+    '''Return the compiled PERSEUS_ADJUSTMENTS for a work, as a tuple
+
+    Patterns are compiled once per work and memoized. If you edit
+    PERSEUS_ADJUSTMENTS at runtime, call clearAdjustmentCache() afterwards.
+    '''
+
+    if work_urn not in _adjustment_cache:
+        _adjustment_cache[work_urn] = tuple(
+            (re.compile(pat), repl)
+            for pat, repl in PERSEUS_ADJUSTMENTS.get(work_urn, [])
+        )
+    return _adjustment_cache[work_urn]
+
+
+def clearAdjustmentCache():
+    '''Forget compiled adjustments and adjusted loci'''
+
+    _adjustment_cache.clear()
+    adjustLocus.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def adjustLocus(work_urn, loc):
+    '''Apply a work's Perseus adjustments to a single locus (memoized)'''
+
+    for pat, repl in getAdjustments(work_urn):
+        loc = pat.sub(repl, loc)
+    return loc
+
+
 def getAdjustedUrn(speech):
     '''Work-specific cludges
         - to accommodate peculiarities of the way Perseus translates loci into URNs
     '''
 
-    l_fi, l_la = speech.l_fi, speech.l_la
+    work_urn = speech.work.urn
     
-    if speech.work.urn in PERSEUS_ADJUSTMENTS:
-        for pat, repl in PERSEUS_ADJUSTMENTS[speech.work.urn]:
-            l_fi = re.sub(pat, repl, l_fi)
-            l_la = re.sub(pat, repl, l_la)
-        urn = f"{speech.work.urn}:{l_fi}-{l_la}"
+    if work_urn in PERSEUS_ADJUSTMENTS:
+        l_fi = adjustLocus(work_urn, speech.l_fi)
+        l_la = adjustLocus(work_urn, speech.l_la)
+        urn = f"{work_urn}:{l_fi}-{l_la}"
     
         return urn
     else:
@@ -109,6 +142,7 @@ class Passage(object):
         self.spacy_doc = None
         self._line_offsets = None
         self._token_index = None
+        self._alignment = None
 
 
     def _buildLineArray(self):
@@ -121,6 +155,8 @@ class Passage(object):
         # initialize line array
         line_array = []
 
+        from copy import deepcopy
+
         # work from copy of xml
         xml = deepcopy(self.xml)
 
@@ -164,7 +200,8 @@ class Passage(object):
     def _buildLineIndex(self):
         '''Build _line_offsets: cumulative character start positions for each line.
 
-        Used to map a token's character position back to its verse line via bisect.
+        Used to map token character positions back to verse lines via
+        np.searchsorted (see alignTokens).
         '''
 
         # bail if no line_array
@@ -185,7 +222,10 @@ class Passage(object):
             logger.warning(f"_buildLineIndex: character count doesn't match: {self.speech}")
             return None
 
-        self._line_offsets = line_offsets
+        import numpy as np
+
+        self._line_offsets = np.asarray(line_offsets, dtype=np.int64)
+        self._alignment = None
 
 
     def getTextPos(self, word):
@@ -198,51 +238,95 @@ class Passage(object):
 
         # if passed a spaCy Token, get its integer index; otherwise
         # treat `word` as an index into self._token_index directly
-        if hasattr(word, 'text') and hasattr(word, 'i'):
-            word = self.getSpacyWordIndex(word)
+        word = self._tokenNumber(word)
         token_index = self._token_index
 
         try:
-            idx = token_index[word]
+            idx = int(token_index[word])
         except IndexError:
             idx = None
 
         return idx
 
 
-    def getLineIndex(self, word):
-        if self.nlp is None:
-            return
+    def alignTokens(self):
+        '''Map every token to its verse line at once
+
+        Returns:
+            A (line_index, line_pos) tuple of NumPy int arrays, with one
+            entry per token: the index of the token's line in line_array,
+            and the token's character offset within that line. Returns None
+            if the passage hasn't been parsed and indexed.
+
+        The result is cached until the token or line index is rebuilt.
+        '''
+
         if self._token_index is None:
             return
         if self._line_offsets is None:
             return
 
-        # get position within the long string of the first character of this word
-        char_pos = self.getTextPos(word)
+        if self._alignment is not None and self._alignment[0] is self._token_index:
+            return self._alignment[1]
+
+        import numpy as np
+
+        char_pos = np.asarray(self._token_index, dtype=np.int64)
+        offsets = np.asarray(self._line_offsets, dtype=np.int64)
+
+        line_index = np.searchsorted(offsets, char_pos, side='right') - 1
+        line_pos = char_pos - offsets[line_index]
 
-        if char_pos is None:
+        self._alignment = (self._token_index, (line_index, line_pos))
+        return line_index, line_pos
+
+
+    def _tokenNumber(self, word):
+        '''Resolve a spaCy Token or integer token index to an integer index'''
+
+        if hasattr(word, 'text') and hasattr(word, 'i'):
+            return self.getSpacyWordIndex(word)
+        return word
+
+
+    def getLineIndex(self, word):
+        '''Return the index in line_array of a word's verse line'''
+
+        if self.nlp is None:
             return
-            
-        # find appropriate line for this character position
-        i = bisect.bisect_right(self._line_offsets, char_pos) - 1
 
-        return i
+        alignment = self.alignTokens()
+        if alignment is None:
+            return
+
+        try:
+            return int(alignment[0][self._tokenNumber(word)])
+        except IndexError:
+            return
 
 
     def getLinePos(self, word):
         '''Return a word's character position within its verse line'''
 
-        char_pos = self.getTextPos(word)
-        i = self.getLineIndex(word)
+        if self.nlp is None:
+            return
+
+        alignment = self.alignTokens()
+        if alignment is None:
+            return
 
-        return char_pos - self._line_offsets[i]
+        try:
+            return int(alignment[1][self._tokenNumber(word)])
+        except IndexError:
+            return
 
 
     def getLine(self, word):
         '''Return a word's containing line from line_array'''
 
         idx = self.getLineIndex(word)
+        if idx is None:
+            return
         return self.line_array[idx]
 
 
@@ -280,23 +364,33 @@ def getXML(speech, force=False):
     if not speech.work.urn:
         return None
 
+    import requests
+    from lxml import etree
+
     config = speech.api.config
     url = config['cts_pattern'].format(cts_urn=getAdjustedUrn(speech))
     cache = config['cts_cache']
 
-    if not force and url in cache:
+    stats = speech.api._stats
+    hit = not force and url in cache
+    stats.recordCache('cts', hit)
+    if hit:
         return cache[url]
 
-    res = requests.get(url)
+    with stats.timeRequest('cts', 'passage', url) as req:
+        res = requests.get(url)
+        req.done(_stats.responseSize(res), res.ok)
     if not res.ok:
         logger.warning(f"failed to download {speech.urn}: {res.status_code}: {res.reason}")
         return None
 
-    xml = etree.fromstring(res.content)
+    with tracing.span('parseXML', cat='text'):
+        xml = etree.fromstring(res.content)
     cache[url] = xml
     return xml
 
 
+@tracing.traced(cat='text')
 def getPassage(speech, force=False):
     '''Download and parse the text for a speech. Returns a Passage object.
 
@@ -309,6 +403,16 @@ def getPassage(speech, force=False):
 
     p = Passage(speech)
     p.xml = xml
-    p._buildLineArray()
-    p._buildLineIndex()
+    with tracing.span('buildLineArray', cat='text'):
+        p._buildLineArray()
+        p._buildLineIndex()
     return p
+
+
+def __getattr__(name):
+    # requests is imported by getXML(); kept as an attribute so that
+    # `dicesapi.text.requests.get` can still be patched
+    if name == 'requests':
+        import requests
+        return requests
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -0,0 +1,280 @@
+'''tracing - hierarchical timing spans for client operations
+
+Tracing is off by default. When it's on, high-level calls -- the
+DicesAPI.get*() queries, fromGitDump() and fromDump(),
+SpeechGroup.fetchPassages() and runSpacyPipeline() -- open spans, and the
+work they do -- HTTP requests, XML parses, hydration of API records into
+objects, spaCy batches -- is recorded in child spans. A trace shows which
+layer a slow job spent its time in.
+
+Usage:
+
+    from dicesapi import tracing
+
+    with tracing.trace('notebook.json') as tracer:
+        speeches = api.getSpeeches(author_name='Homer')
+        speeches.fetchPassages()
+    print(tracer.summary())
+
+The trace is written when the block exits. A path ending in .jsonl gets
+one JSON span per line. Any other path gets the Chrome trace event
+format, which can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+Spans nest per thread. Spans opened in worker threads (e.g. by
+manto.prefetch()) are top-level spans of their own thread.
+'''
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_FORMATS = ('chrome', 'jsonl')
+
+_tracer = None
+
+
+class _NullSpan(object):
+    '''Stands in for a span while tracing is off'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    '''One timed operation; a context manager, made by Tracer.span()'''
+
+    __slots__ = ('tracer', 'name', 'cat', 'attrs', 'id', 'parent', 'thread',
+                    'start', 'end')
+
+    def __init__(self, tracer, name, cat, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.attrs = attrs
+        self.id = None
+        self.parent = None
+        self.thread = None
+        self.start = None
+        self.end = None
+
+    def set(self, **attrs):
+        '''Add attributes, e.g. a count known only at the end'''
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.tracer._open(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer._close(self)
+        return False
+
+
+class Tracer(object):
+    '''Collects finished spans from all threads'''
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self._origin = clock()
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.spans = []
+
+
+    def span(self, name, cat='client', **attrs):
+        '''Return a Span to use as a context manager'''
+        return Span(self, name, cat, attrs)
+
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+    def _open(self, span):
+        stack = self._stack()
+        span.id = next(self._ids)
+        span.parent = stack[-1].id if stack else None
+        span.thread = threading.get_ident()
+        stack.append(span)
+        span.start = self._clock() - self._origin
+
+
+    def _close(self, span):
+        span.end = self._clock() - self._origin
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        with self._lock:
+            self.spans.append(span)
+
+
+    def records(self):
+        '''Finished spans as dicts, in order of starting time
+
+        Each has 'id', 'parent' (id or None), 'name', 'cat', 'start' and
+        'seconds' (both in seconds, from the tracer's creation), 'thread'
+        and 'attrs'.
+        '''
+
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s.start, s.id))
+        return [dict(id=s.id, parent=s.parent, name=s.name, cat=s.cat, start=s.start,
+                        seconds=s.end - s.start, thread=s.thread, attrs=dict(s.attrs))
+                for s in spans]
+
+
+    def summary(self):
+        '''Total and self time per span name
+
+        Self time excludes time spent in child spans, so the self times of
+        all spans add up to the time traced.
+
+        Returns:
+            dict mapping span name to a dict with 'cat', 'count', 'seconds'
+            and 'self_seconds', slowest (by self time) first
+        '''
+
+        records = self.records()
+        child_time = {}
+        for r in records:
+            if r['parent'] is not None:
+                child_time[r['parent']] = child_time.get(r['parent'], 0) + r['seconds']
+
+        totals = {}
+        for r in records:
+            t = totals.setdefault(r['name'], dict(cat=r['cat'], count=0, seconds=0.0,
+                                                    self_seconds=0.0))
+            t['count'] += 1
+            t['seconds'] += r['seconds']
+            t['self_seconds'] += r['seconds'] - child_time.get(r['id'], 0)
+
+        return dict(sorted(totals.items(), key=lambda kv: -kv[1]['self_seconds']))
+
+
+    def exportJSONL(self, path):
+        '''Write one JSON span record (see records()) per line'''
+
+        with open(path, 'w', encoding='utf-8') as f:
+            for r in self.records():
+                f.write(json.dumps(r, default=str) + '\n')
+
+
+    def exportChrome(self, path):
+        '''Write the spans in Chrome's trace event format'''
+
+        pid = os.getpid()
+        events = [dict(name=r['name'], cat=r['cat'], ph='X', pid=pid, tid=r['thread'],
+                        ts=r['start'] * 1e6, dur=r['seconds'] * 1e6,
+                        args=dict(r['attrs'], span_id=r['id'], parent_id=r['parent']))
+                    for r in self.records()]
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit='ms'), f, default=str)
+
+
+    def export(self, path, format=None):
+        '''Write the trace to `path`, as 'jsonl' or 'chrome'
+
+        By default the format is guessed from the path: .jsonl means
+        JSON lines, anything else the Chrome format.
+        '''
+
+        if format is None:
+            format = 'jsonl' if path.endswith('.jsonl') else 'chrome'
+        if format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format '{format}'; choose from {', '.join(TRACE_FORMATS)}")
+
+        if format == 'jsonl':
+            self.exportJSONL(path)
+        else:
+            self.exportChrome(path)
+
+
+def active():
+    '''Return the Tracer in use, or None if tracing is off'''
+    return _tracer
+
+
+def enable(tracer=None):
+    '''Turn tracing on, recording into `tracer` (by default a new Tracer)'''
+
+    global _tracer
+    _tracer = tracer if tracer is not None else Tracer()
+    return _tracer
+
+
+def disable():
+    '''Turn tracing off, returning the Tracer that was in use'''
+
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def span(name, cat='client', **attrs):
+    '''Open a span in the active tracer; does nothing while tracing is off
+
+        with tracing.span('hydrate', cat='hydrate', records=len(results)):
+            ...
+    '''
+
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, cat, **attrs)
+
+
+def traced(name=None, cat='client'):
+    '''Decorator running a function inside a span named after it'''
+
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with tracer.span(span_name, cat):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def trace(path=None, format=None, tracer=None):
+    '''Trace the body of a with block, writing the trace to `path` if given
+
+    Yields the Tracer. Tracing that was on already is restored afterwards.
+    '''
+
+    global _tracer
+    previous = _tracer
+    tracer = enable(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+        if path is not None:
+            tracer.export(path, format=format)
@@ -7,9 +7,16 @@ respects Wikidata's bot policy and is unusable as of mid-2026.
     pip install dices-client[wikidata]
 '''
 
-from dicesapi import Character, CharacterInstance
+import gzip
+import json
+import os
+from urllib.parse import urlencode
+
+from dicesapi import Character, CharacterInstance, logger
+from dicesapi import stats as _stats
+from dicesapi import tracing
 from wikidata.client import Client
-from wikidata.entity import Entity
+from wikidata.entity import Entity, EntityState
 
 __wd_cache__ = dict()
 __settings__ = dict(
@@ -23,6 +30,12 @@ HAS_MOTHER = 'P25'
 HAS_FATHER = 'P22'
 HAS_SPOUSE = 'P26'
 HAS_CHILD = 'P40'
+HAS_SIBLING = 'P3373'
+
+# most ids the wbgetentities API accepts in one request
+BATCH_SIZE = 50
+
+CLAIM_INDEX_FORMAT_VERSION = 1
 
 
 def settings(**kwargs):
@@ -30,6 +43,127 @@ def settings(**kwargs):
         __settings__[k] = v
 
 
+class ClaimIndex(object):
+    '''Entity-valued claims of WikiData entities, by (entity id, property)
+
+    Holds, for every entity added, the set of target ids of each of its
+    claims whose value is another entity (e.g. P25 "mother" -> {"Q..."}),
+    so that relation checks are set lookups rather than walks over full
+    Entity objects. Can be saved to disk and reloaded, so relations already
+    seen need no network access in later sessions.
+
+    Normally used through useClaimIndex() and checkWDRelation().
+    '''
+
+    def __init__(self):
+        self._claims = {}
+
+    def __len__(self):
+        '''Number of entities indexed'''
+        return len(self._claims)
+
+    def __contains__(self, wd_id):
+        return wd_id in self._claims
+
+    def add(self, entity):
+        '''Index the claims of an Entity, or of raw entity data (a dict)'''
+
+        if isinstance(entity, Entity):
+            wd_id, data = entity.id, entity.data
+        else:
+            wd_id, data = entity.get('id'), entity
+        if wd_id is None or data is None:
+            return
+
+        claims = {}
+        for prop, statements in (data.get('claims') or {}).items():
+            targets = set()
+            for statement in statements:
+                snak = statement.get('mainsnak', {})
+                value = snak.get('datavalue', {})
+                if snak.get('snaktype') == 'value' and value.get('type') == 'wikibase-entityid':
+                    targets.add(value['value']['id'])
+            if targets:
+                claims[prop] = targets
+        self._claims[wd_id] = claims
+
+    def targets(self, wd_id, prop):
+        '''Return the set of ids `wd_id` has a `prop` claim for
+
+        Returns None if `wd_id` hasn't been indexed, so that "no claims"
+        can be told apart from "don't know".
+        '''
+
+        claims = self._claims.get(wd_id)
+        if claims is None:
+            return None
+        return claims.get(prop, set())
+
+    def save(self, path):
+        '''Write the index to a gzipped JSON file'''
+
+        data = dict(
+            version = CLAIM_INDEX_FORMAT_VERSION,
+            claims = {wd_id: {prop: sorted(targets) for prop, targets in claims.items()}
+                        for wd_id, claims in self._claims.items()},
+        )
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f)
+        logger.info(f"Saved WikiData claims for {len(self)} entities to {path}")
+
+    @classmethod
+    def load(cls, path):
+        '''Read an index written by save()'''
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data.get('version') != CLAIM_INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported claim index version in {path}: "
+                                f"{data.get('version')}")
+
+        index = cls()
+        index._claims = {wd_id: {prop: set(targets) for prop, targets in claims.items()}
+                            for wd_id, claims in data['claims'].items()}
+        logger.info(f"Loaded WikiData claims for {len(index)} entities from {path}")
+        return index
+
+
+__claim_index__ = ClaimIndex()
+__claim_index_path__ = None
+
+
+def useClaimIndex(path=None):
+    '''Switch to a claim index persisted at `path`
+
+    Loads the index from `path` if the file exists, otherwise starts an
+    empty one there; saveClaimIndex() writes it back. Pass path=None for a
+    fresh in-memory index.
+
+    Returns:
+        The ClaimIndex
+    '''
+
+    global __claim_index__, __claim_index_path__
+
+    if path is not None and os.path.exists(path):
+        __claim_index__ = ClaimIndex.load(path)
+    else:
+        __claim_index__ = ClaimIndex()
+    __claim_index_path__ = path
+    return __claim_index__
+
+
+def saveClaimIndex(path=None):
+    '''Save the current claim index, by default where useClaimIndex() read it'''
+
+    if path is None:
+        path = __claim_index_path__
+    if path is None:
+        raise ValueError("No path given, and no claim index file in use")
+    __claim_index__.save(path)
+
+
 def getClient():
     '''Return the module's shared wikidata.client.Client, creating it if needed'''
 
@@ -39,15 +173,30 @@ def getClient():
     return _client
 
 
+def _loadEntity(wd_id):
+    '''Download one entity, counting the request'''
+
+    client = getClient()
+    with _stats.shared.timeRequest('wikidata', 'entity', str(client.base_url)) as req:
+        entity = client.get(wd_id, load=True)
+        req.done(_stats.jsonSize(entity.data))
+    return entity
+
+
 def getWDfromID(wd_id, cache=__wd_cache__):
     '''Return WikiData entity for a given WikiData ID'''
 
     if wd_id is not None and wd_id != '':
         if cache is None:
-            return getClient().get(wd_id, load=True)
+            entity = _loadEntity(wd_id)
+            __claim_index__.add(entity)
+            return entity
         else:
-            if wd_id not in cache:
-                cache[wd_id] = getClient().get(wd_id, load=True)
+            hit = wd_id in cache
+            _stats.shared.recordCache('wikidata', hit)
+            if not hit:
+                cache[wd_id] = _loadEntity(wd_id)
+                __claim_index__.add(cache[wd_id])
             return cache[wd_id]
 
 
@@ -85,6 +234,78 @@ def getWD(obj, cache=__wd_cache__):
     return result
 
 
+def _wdIDs(things):
+    '''Collect distinct WikiData ids from Characters, CharacterInstances or id strings'''
+
+    ids = []
+    seen = set()
+    for thing in things:
+        if isinstance(thing, (Character, CharacterInstance)):
+            thing = thing.wd
+        if thing is None or thing == '' or thing in seen:
+            continue
+        seen.add(thing)
+        ids.append(thing)
+    return ids
+
+
+@tracing.traced('wikidata.prefetch', cat='wikidata')
+def prefetch(characters, cache=__wd_cache__, batch_size=BATCH_SIZE):
+    '''Download WikiData entities for many characters in a few requests
+
+    Uses the wbgetentities API, which returns up to `batch_size` (at most
+    50) entities per request, instead of one request per entity. Fills
+    `cache`, so that later calls to getWD(), checkWDRelation() etc. for
+    these characters make no requests. Ids already in the cache are not
+    requested again.
+
+    Args:
+        characters: Characters, CharacterInstances and/or WikiData id strings
+        cache (dict): Entity cache to fill
+        batch_size (int): Ids per request
+
+    Returns:
+        dict mapping each requested id to its Entity; ids WikiData doesn't
+        know are left out
+    '''
+
+    ids = _wdIDs(characters)
+    todo = [wd_id for wd_id in ids if wd_id not in cache]
+    for wd_id in ids:
+        _stats.shared.recordCache('wikidata', wd_id in cache)
+    batch_size = max(1, min(batch_size, BATCH_SIZE))
+
+    client = getClient()
+    n_requests = 0
+    for i in range(0, len(todo), batch_size):
+        batch = todo[i:i + batch_size]
+        query = urlencode(dict(action='wbgetentities', ids='|'.join(batch), format='json'))
+        with _stats.shared.timeRequest('wikidata', 'wbgetentities', str(client.base_url)) as req:
+            result = client.request(f'./w/api.php?{query}')
+            req.done(_stats.jsonSize(result))
+        n_requests += 1
+
+        entities = (result or {}).get('entities', {})
+        for wd_id in batch:
+            data = entities.get(wd_id)
+            if data is None or 'missing' in data:
+                if __settings__['DEBUG']:
+                    print(f"WikiData has no entity {wd_id}")
+                continue
+
+            # a redirected id resolves to its target entity
+            entity = client.get(data.get('id', wd_id))
+            entity.data = data
+            entity.state = EntityState.loaded
+            cache[wd_id] = entity
+            __claim_index__.add(entity)
+
+    logger.info(f"Prefetched {len(todo)} WikiData entities in {n_requests} requests "
+                    f"({len(ids) - len(todo)} already cached)")
+
+    return {wd_id: cache[wd_id] for wd_id in ids if wd_id in cache}
+
+
 def getLabel(entity, lang='en'):
     '''Return an entity's label in the given language, or None if absent'''
 
@@ -98,27 +319,73 @@ def getLabel(entity, lang='en'):
         return label.get('value')
 
 
-def checkWDRelation(wd1, wd2, relation, cache=__wd_cache__):
-    '''Return True if relation holds between two WikiData entities'''
+def _wdID(obj):
+    '''WikiData id of an Entity, id string, Character or CharacterInstance'''
 
-    if not isinstance(wd1, Entity):
-        wd1 = getWD(wd1, cache=cache)
-        if wd1 is None:
-            return
-    if not isinstance(wd2, Entity):
-        wd2 = getWD(wd2, cache=cache)
-        if wd2 is None:
+    if isinstance(obj, Entity):
+        return obj.id
+    if isinstance(obj, (Character, CharacterInstance)):
+        obj = obj.wd
+    if obj is not None and obj != '':
+        return obj
+
+
+def _canonicalID(wd_id, cache=__wd_cache__):
+    '''The id an entity is indexed under: for an id WikiData redirects, the
+    target's, if the entity cache holds it'''
+
+    entity = cache.get(wd_id) if cache is not None else None
+    return wd_id if entity is None else entity.id
+
+
+def relatedIDs(obj, relation, cache=__wd_cache__):
+    '''Return the set of ids `obj` has a `relation` claim for
+
+    Looks in the claim index first; only an entity that hasn't been
+    indexed yet is downloaded. Returns None if `obj` can't be resolved to
+    a WikiData entity.
+
+    Args:
+        obj: An Entity, id string, Character or CharacterInstance
+        relation (str): A property id, e.g. HAS_MOTHER
+    '''
+
+    wd_id = _wdID(obj)
+    if wd_id is None:
+        if __settings__['DEBUG']:
+            print(f"Can't resolve {obj} to a WikiData entity!")
+        return
+
+    targets = __claim_index__.targets(_canonicalID(wd_id, cache), relation)
+    _stats.shared.recordCache('wikidata.claims', targets is not None)
+    if targets is None:
+        entity = obj if isinstance(obj, Entity) else getWD(wd_id, cache=cache)
+        if entity is None:
             return
+        # index under the entity's own id, which differs for redirects
+        if entity.id not in __claim_index__:
+            __claim_index__.add(entity)
+        targets = __claim_index__.targets(entity.id, relation)
+
+    return targets
+
+
+def checkWDRelation(wd1, wd2, relation, cache=__wd_cache__):
+    '''Return True if relation holds between two WikiData entities
 
-    if cache is None:
-        cache = {}
+    A set lookup in the claim index (see ClaimIndex); only wd1 is ever
+    downloaded, and only if it hasn't been indexed yet. Claims name their
+    targets by their own ids, so wd2 is looked up by the id a redirected
+    one resolves to, where the entity cache knows it.
+    '''
 
-    # cache by entity id strings, not Entity objects
-    key = (wd1.id, wd2.id, relation)
+    id2 = _wdID(wd2)
+    if id2 is None:
+        return
+    id2 = _canonicalID(id2, cache)
 
-    if key not in cache:
-        relation_entity = getClient().get(relation, load=True)
-        related = wd1.getlist(relation_entity)
-        cache[key] = wd2 in related
+    targets = relatedIDs(wd1, relation, cache=cache)
+    if targets is None:
+        return
 
-    return cache[key]
+    return id2 in targets
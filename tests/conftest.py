@@ -5,10 +5,33 @@ returned by the DICES API (see dices/speechdb/serializers.py), so that the
 client-side classes can be tested without a network connection.
 '''
 
+import importlib.util
+import os
+
 import pytest
 
 from dicesapi import DicesAPI
 
+BENCH_DIR = os.path.join(os.path.dirname(__file__), '..', 'benchmarks')
+
+
+@pytest.fixture(scope='session')
+def load_bench():
+    '''Import a module of benchmarks/ by name, e.g. load_bench('synth'),
+    once per session'''
+
+    modules = {}
+
+    def load(name):
+        if name not in modules:
+            spec = importlib.util.spec_from_file_location(name, os.path.join(BENCH_DIR, f'{name}.py'))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            modules[name] = module
+        return modules[name]
+
+    return load
+
 
 @pytest.fixture
 def api():
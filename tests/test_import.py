@@ -0,0 +1,74 @@
+'''tests for the lazy package import, and a smoke test of its benchmark'''
+
+import subprocess
+import sys
+
+import pytest
+
+import dicesapi
+
+
+@pytest.fixture(scope='module')
+def bench(load_bench):
+    return load_bench('import_bench')
+
+
+def test_import_defers_dependencies():
+    '''A fresh interpreter imports dicesapi without its heavy dependencies,
+    and loads the client, but not requests, when DicesAPI is first used'''
+
+    code = (
+        "import sys\n"
+        "import dicesapi\n"
+        "loaded = [m for m in ('pandas', 'numpy', 'requests', 'lxml', 'dicesapi.client')\n"
+        "            if m in sys.modules]\n"
+        "assert not loaded, loaded\n"
+        "api = dicesapi.DicesAPI(dices_api='')\n"
+        "assert 'dicesapi.client' in sys.modules\n"
+        "assert 'requests' not in sys.modules\n"
+        "from dicesapi import text\n"
+        "assert 'lxml' not in sys.modules\n"
+        "print('ok')\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'ok'
+
+
+def test_public_names():
+    from dicesapi import client, locus, models
+
+    assert dicesapi.DicesAPI is client.DicesAPI
+    assert dicesapi.Speech is models.Speech
+    assert dicesapi.SpeechGroup is models.SpeechGroup
+    assert dicesapi.parseLocus is locus.parseLocus
+    assert dicesapi._dumpTables is client._dumpTables
+    assert dicesapi.stats is sys.modules['dicesapi.stats']
+    assert 'DicesAPI' in dir(dicesapi)
+    assert 'Speech' in dicesapi.__all__
+
+    import requests
+    assert dicesapi.requests is requests
+
+
+def test_unknown_name():
+    with pytest.raises(AttributeError):
+        dicesapi.NoSuchThing
+    with pytest.raises(ImportError):
+        from dicesapi import NoSuchThing  # noqa: F401
+
+
+def test_bench_smoke(bench):
+    results = bench.run(cases=['package', 'client'], repeat=1)
+
+    assert [r['case'] for r in results] == ['package', 'client']
+    for r in results:
+        assert 0 < r['seconds'] < r['process_seconds']
+        assert r['heavy'] == []
+        assert r['modules'] > 0
+
+
+def test_unknown_case(bench):
+    with pytest.raises(ValueError):
+        bench.run(cases=['nothing'])
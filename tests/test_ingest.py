@@ -0,0 +1,241 @@
+'''tests for DicesAPI.ingest(), the bulk hydration path, and re-hydration'''
+
+import copy
+import gc
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from dicesapi import (DicesAPI, _dumpTables, Author, Work, Character, CharacterInstance, Speech,
+                        SpeechCluster, SpeechGroup)
+
+MODELS = (Author, Work, Character, CharacterInstance, Speech, SpeechCluster)
+
+
+def _norm(value):
+    if isinstance(value, MODELS):
+        return (type(value).__name__, value.id)
+    if isinstance(value, list):
+        return [_norm(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _norm(v) for k, v in value.items()}
+    return value
+
+
+def _state(api):
+    '''Every indexed object's attributes, with nested objects as (class, id)'''
+
+    return {model: {key: {name: _norm(value) for name, value in vars(obj).items()
+                            if name not in ('api', '_payload')}
+                        for key, obj in getattr(api, f'_{model}_index').items()}
+            for model in DicesAPI.INGEST_ORDER}
+
+
+def test_ingest_matches_indexed_speech(load_bench):
+    synth = load_bench('synth')
+    payloads = synth.apiPayloads(synth.synthDump(200, seed=2))
+
+    one_by_one = DicesAPI(dices_api='')
+    for p in copy.deepcopy(payloads):
+        one_by_one.indexedSpeech(p)
+
+    bulk = DicesAPI(dices_api='')
+    speeches = bulk.ingest('speeches', copy.deepcopy(payloads))
+
+    assert isinstance(speeches, SpeechGroup)
+    assert [s.id for s in speeches] == [p['id'] for p in payloads]
+    assert _state(bulk) == _state(one_by_one)
+
+
+def test_from_dump_matches_indexed_rows(load_bench):
+    synth = load_bench('synth')
+    dump = synth.synthDump(200, seed=3)
+
+    one_by_one = DicesAPI(dices_api='')
+    tables = _dumpTables(copy.deepcopy(dump))
+    for model in DicesAPI.INGEST_ORDER:
+        method = getattr(one_by_one, 'indexed' + dict(
+            characterinstance='CharacterInstance', speechcluster='SpeechCluster').get(
+                model, model.capitalize()))
+        for row in tables[model]:
+            method(row)
+
+    assert _state(DicesAPI.fromDump(copy.deepcopy(dump))) == _state(one_by_one)
+
+
+def test_nested_payloads_hydrated_once(api, speech_data):
+    second = copy.deepcopy(speech_data)
+    second['id'] = 2
+    second['work']['title'] = 'Iliad (rev.)'
+
+    speeches = api.ingest('speech', [speech_data, second])
+
+    first, last = speeches
+    assert first.work is last.work
+    assert last.work.title == 'Iliad (rev.)'
+    assert first.spkr[0] is last.spkr[0]
+    assert isinstance(first.spkr[0].char, Character)
+    # payloads in _attributes hold objects, as they would record by record
+    assert speech_data['spkr'][0] is first.spkr[0]
+    assert second['spkr'][0] is first.spkr[0]
+
+
+def test_ingest_ids_and_objects(api, speech_data):
+    speech = api.indexedSpeech(speech_data)
+
+    group = api.ingest('speech', [speech, 1, 5])
+
+    assert group[0] is speech and group[1] is speech
+    assert group[2].id == 5 and api._speech_index[5] is group[2]
+
+
+def test_ingest_records_cache_stats(api, speech_data):
+    api.resetStats()
+    api.ingest('speech', [speech_data, 1])
+
+    caches = api.stats()['caches']
+    assert caches['index.speech']['misses'] == 1
+    assert caches['index.characterinstance']['misses'] == 2
+    assert caches['index.author']['misses'] == 1
+
+
+def test_ingest_unknown_model(api):
+    with pytest.raises(ValueError):
+        api.ingest('tags', [])
+
+
+def test_ingest_restores_gc(api, speech_data):
+    assert gc.isenabled()
+    api.ingest('speech', [speech_data])
+    assert gc.isenabled()
+
+    gc.disable()
+    try:
+        api.ingest('speech', [2])
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_ingest_restores_gc_after_concurrent_ingests(api, speech_data, monkeypatch):
+    other = DicesAPI(dices_api='')
+    started, finish = threading.Event(), threading.Event()
+
+    def ingest(model, records):
+        started.set()
+        finish.wait(5)
+
+    monkeypatch.setattr(other, '_ingest', ingest)
+    thread = threading.Thread(target=other.ingest, args=('speech', [1]))
+    try:
+        thread.start()
+        assert started.wait(5)
+        api.ingest('speech', [speech_data])
+        # the other ingest is still running
+        assert not gc.isenabled()
+    finally:
+        finish.set()
+        thread.join()
+        enabled = gc.isenabled()
+        gc.enable()
+    assert enabled
+
+
+def test_ingest_bench_runs(load_bench):
+    bench = load_bench('ingest_bench')
+
+    results = bench.run(size=60, memory=False)
+
+    assert [r['case'] for r in results] == list(bench.CASES)
+    assert all(r['objects'] > 60 and r['speedup'] > 0 for r in results)
+
+
+def test_unchanged_payload_not_rehydrated(api, speech_data):
+    api.indexedSpeech(copy.deepcopy(speech_data))
+
+    with patch.object(Speech, '_from_data', autospec=True,
+                        side_effect=Speech._from_data) as speech_from_data, \
+            patch.object(CharacterInstance, '_from_data', autospec=True,
+                            side_effect=CharacterInstance._from_data) as inst_from_data:
+        api.indexedSpeech(copy.deepcopy(speech_data))
+        api.ingest('speech', [copy.deepcopy(speech_data)])
+        # a new speech with the same speaker hydrates only the speech
+        other = copy.deepcopy(speech_data)
+        other['id'] = 2
+        api.indexedSpeech(other)
+
+    assert speech_from_data.call_count == 1
+    assert inst_from_data.call_count == 0
+
+
+def test_changed_payload_rehydrated(api, speech_data):
+    api.indexedSpeech(copy.deepcopy(speech_data))
+
+    changed = copy.deepcopy(speech_data)
+    changed['spkr'][0]['char']['gender'] = 'female'
+    speech = api.indexedSpeech(changed)
+    assert speech.spkr[0].char.gender == 'female'
+
+    changed = copy.deepcopy(speech_data)
+    changed['spkr'][0]['char']['gender'] = 'female'
+    changed['l_la'] = '1.9'
+    speech = api.ingest('speech', [changed])[0]
+    assert speech.l_la == '1.9'
+
+    # and after all that, the first payload again is a change too
+    speech = api.ingest('speech', [copy.deepcopy(speech_data)])[0]
+    assert speech.l_la == '1.7' and speech.spkr[0].char.gender == 'male'
+
+
+def test_changed_timestamp(api, character_instance_data):
+    data = dict(character_instance_data[0], changed='2024-01-01T00:00:00Z')
+    inst = api.indexedCharacterInstance(copy.deepcopy(data))
+
+    with patch.object(CharacterInstance, '_from_data') as from_data:
+        api.indexedCharacterInstance(copy.deepcopy(data))
+        assert from_data.call_count == 0
+        api.indexedCharacterInstance(dict(copy.deepcopy(data), changed='2024-02-01T00:00:00Z'))
+        assert from_data.call_count == 1
+
+
+def test_kept_payload_shares_nested_payloads(api, speech_data):
+    speech = api.indexedSpeech(copy.deepcopy(speech_data))
+    # kept only once there's a payload to compare
+    assert speech._payload is None
+
+    api.indexedSpeech(copy.deepcopy(speech_data))
+    assert speech._payload == speech_data
+    assert speech._payload['spkr'][0] is speech.spkr[0]._payload
+    assert speech._payload['work']['author'] is speech.work.author._payload
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def test_nested_update_then_original_payload(api, speech_data, bulk):
+    '''The last payload for a nested record wins, even where the record
+    containing it is unchanged'''
+
+    api.indexedSpeech(copy.deepcopy(speech_data))
+    api.indexedSpeech(copy.deepcopy(speech_data))
+    inst = api.indexedCharacterInstance(dict(copy.deepcopy(speech_data['spkr'][0]), context='NEW'))
+    assert inst.context == 'NEW'
+
+    if bulk:
+        speech = api.ingest('speech', [copy.deepcopy(speech_data)])[0]
+    else:
+        speech = api.indexedSpeech(copy.deepcopy(speech_data))
+
+    assert speech.spkr[0] is inst
+    assert inst.context == speech_data['spkr'][0]['context']
+
+
+def test_ingest_nested_last_payload_wins(api, speech_data):
+    api.indexedSpeech(copy.deepcopy(speech_data))
+    api.indexedSpeech(copy.deepcopy(speech_data))
+
+    other = copy.deepcopy(speech_data)
+    other['id'] = 2
+    other['spkr'][0]['context'] = 'NEW'
+    speeches = api.ingest('speech', [other, copy.deepcopy(speech_data)])
+
+    assert speeches[0].spkr[0].context == speech_data['spkr'][0]['context']
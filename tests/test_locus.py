@@ -0,0 +1,147 @@
+'''tests for dicesapi.locus: locus parsing and natural ordering'''
+
+from copy import deepcopy
+
+import numpy as np
+
+from dicesapi import SpeechGroup
+from dicesapi.locus import parseLocus, parseLoci, locusKey, locusArrays, naturalSort
+
+
+def test_parse_locus_components():
+    loc = parseLocus('9.312')
+
+    assert loc.parts == ('9', '312')
+    assert loc.book == '9'
+    assert loc.prefix == '9'
+    assert loc.line == '312'
+    assert loc.lineno == 312
+    assert loc.suffix == ''
+    assert loc.depth == 2
+
+
+def test_parse_locus_is_memoized():
+    assert parseLocus('9.312') is parseLocus('9.312')
+    assert parseLocus(None) is None
+    assert parseLocus('  ') is None
+
+
+def test_parse_locus_suffix_and_praef():
+    loc = parseLocus('2.praef.4a')
+
+    assert loc.prefix == '2.praef'
+    assert loc.book == '2'
+    assert loc.lineno == 4
+    assert loc.suffix == 'a'
+    assert loc.isPraef()
+
+    assert parseLocus('pr.3').isPraef()
+    assert parseLocus('3.1').isPraef() is False
+
+
+def test_natural_ordering():
+    loci = ['10.1', '9.999', '9.100', '9.99', '1.praef.5', '1.1', '9.99a', '1.pr.2']
+
+    assert naturalSort(loci) == ['1.pr.2', '1.praef.5', '1.1', '9.99', '9.99a',
+                                    '9.100', '9.999', '10.1']
+    assert parseLocus('9.999') < parseLocus('10.1')
+    assert locusKey(None) < locusKey('1')
+
+
+def test_locus_arrays():
+    arrays = locusArrays(['10.1', '9.5', None, '9.5', '12a'])
+
+    # '12a' has no book, but its single component still sorts after book 10
+    assert arrays['rank'].tolist() == [1, 0, -1, 0, 2]
+    assert arrays['lineno'].tolist() == [1, 5, -1, 5, 12]
+    assert arrays['depth'].tolist() == [2, 2, 0, 2, 1]
+    assert arrays['prefix'].tolist() == ['10', '9', '', '9', '']
+
+    order = np.argsort(arrays['rank'][arrays['rank'] >= 0], kind='stable')
+    assert order.tolist() == [1, 2, 0, 3]
+
+
+def test_parse_loci_shares_objects():
+    a, b = parseLoci(['1.1', '1.1'])
+    assert a is b
+
+
+def test_speech_locus_properties(api, speech_data):
+    speech = api.indexedSpeech(speech_data)
+
+    assert speech.loc_fi is parseLocus('1.1')
+    assert speech.loc_la.lineno == 7
+
+
+def test_sorted_by_locus(api, speech_data):
+    speeches = []
+    for i, (l_fi, l_la) in enumerate([('10.1', '10.5'), ('9.100', '9.120'), ('9.99', '9.99')]):
+        data = dict(deepcopy(speech_data), id=i + 1, l_fi=l_fi, l_la=l_la)
+        speeches.append(api.indexedSpeech(data))
+    group = SpeechGroup(speeches, api=api)
+
+    assert group.sortedByLocus().getL_fis() == ['9.99', '9.100', '10.1']
+    assert group.sortedByLocus(reverse=True).getL_fis() == ['10.1', '9.100', '9.99']
+
+
+def _speeches(api, speech_data, ranges):
+    speeches = []
+    for i, (l_fi, l_la) in enumerate(ranges):
+        data = dict(deepcopy(speech_data), id=i + 1, l_fi=l_fi, l_la=l_la)
+        speeches.append(api.indexedSpeech(data))
+    return speeches
+
+
+def test_interval_index_point_queries():
+    from dicesapi.locus import IntervalIndex
+
+    class S:
+        def __init__(self, l_fi, l_la):
+            self.l_fi, self.l_la = l_fi, l_la
+
+    a, b, c, d = S('9.300', '9.320'), S('9.310', '9.311'), S('9.999', '10.5'), S('10.5', None)
+    index = IntervalIndex([c, a, d, b])
+
+    assert len(index) == 4
+    assert index.at('9.312') == [a]
+    assert index.at('9.310') == [a, b]
+    assert index.at('10.2') == [c]
+    assert index.at('10.5') == [c, d]
+    assert index.at('9.1') == []
+    assert index.overlapping('9.319', '9.999') == [a, c]
+    assert index.overlapping('10.6', '11.1') == []
+
+
+def test_api_speeches_at(api, speech_data):
+    first, second, third = _speeches(api, speech_data,
+                                        [('9.300', '9.320'), ('9.999', '10.5'), ('10.6', '10.9')])
+    work = first.work
+
+    assert api.speechesAt(work, '9.312').list == [first]
+    assert api.speechesAt(work.id, '10.1').list == [second]
+    assert api.speechesOverlapping(work, '10.4', '10.7').list == [second, third]
+    assert len(api.speechesAt(999, '1.1')) == 0
+
+
+def test_api_interval_index_sees_new_speeches(api, speech_data):
+    first, = _speeches(api, speech_data, [('1.1', '1.7')])
+    assert api.speechesAt(first.work, '1.3').list == [first]
+
+    data = dict(deepcopy(speech_data), id=99, l_fi='1.2', l_la='1.4')
+    later = api.indexedSpeech(data)
+
+    assert api.speechesAt(first.work, '1.3').list == [first, later]
+
+
+def test_api_interval_index_sees_moved_speeches(api, speech_data):
+    first, second = _speeches(api, speech_data, [('1.1', '1.7'), ('2.1', '2.4')])
+    work = first.work
+    assert api.speechesAt(work, '1.3').list == [first]
+
+    api.indexedSpeech(dict(deepcopy(speech_data), id=1, l_fi='5.1', l_la='5.9'))
+    assert api.speechesAt(work, '1.3').list == []
+    assert api.speechesAt(work, '5.3').list == [first]
+
+    api.ingest('speech', [dict(deepcopy(speech_data), id=2, l_fi='5.2', l_la='5.4')])
+    assert api.speechesAt(work, '2.2').list == []
+    assert api.speechesAt(work, '5.3').list == [first, second]
@@ -0,0 +1,299 @@
+'''tests for dicesapi.manto, with MANTO's API mocked out'''
+
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dicesapi import manto
+from dicesapi.manto import TokenBucket, Tie
+
+
+def _entity_payload(manto_id, name, ties=None):
+    '''build a MANTO API response for one entity, with optional {tie: [ids]}'''
+
+    definitions = {}
+    for tie, ids in (ties or {}).items():
+        definitions[tie] = {
+            'object_definition_ref_object_id': [{manto.NGID: {i: {} for i in ids}}],
+        }
+    return {'data': {'objects': {manto_id: {
+        'object': {'object_name': name},
+        'object_definitions': definitions,
+    }}}}
+
+
+def _response(payload, status=200):
+    res = Mock()
+    res.ok = status == 200
+    res.status_code = status
+    res.json.return_value = payload
+    return res
+
+
+@pytest.fixture(autouse=True)
+def clean_index(monkeypatch):
+    '''isolate each test from the module-level index and rate limit'''
+
+    monkeypatch.setattr(manto, '__manto_index__', {})
+    monkeypatch.setattr(manto, '__manto_store__', None)
+    monkeypatch.setattr(manto, '_limiter', TokenBucket(rate=1e6, capacity=1e6))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_spaces_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=5, capacity=1, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire() == 0
+    for _ in range(4):
+        bucket.acquire()
+
+    # five requests at 5/s: the first is free, the rest wait 0.2 s each
+    assert clock.now == pytest.approx(0.8)
+
+
+def test_token_bucket_allows_bursts():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, capacity=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0
+    bucket.acquire()
+    assert clock.now == pytest.approx(1)
+
+
+def test_token_bucket_rate_function():
+    clock = FakeClock()
+    rate = [1.0]
+    bucket = TokenBucket(rate=lambda: rate[0], capacity=1, clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.now == pytest.approx(1)
+
+    rate[0] = 4.0
+    bucket.acquire()
+    assert clock.now == pytest.approx(1.25)
+
+
+def test_shared_limiter_follows_request_delay(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(manto, '_limiter', TokenBucket(manto._sharedRate, clock=clock,
+                                                        sleep=clock.sleep))
+    monkeypatch.setattr(manto, 'REQUEST_DELAY', 1.0)
+
+    with patch('dicesapi.manto.requests.get',
+                return_value=_response(_entity_payload('X', 'X'))):
+        for manto_id in ('A', 'B', 'C'):
+            manto.dlMantoData(manto_id)
+        assert clock.now == pytest.approx(2)
+
+        monkeypatch.setattr(manto, 'REQUEST_DELAY', 0)
+        manto.dlMantoData('D')
+    assert clock.now == pytest.approx(2)
+
+
+def test_prefetch_fills_index_once_per_id(character_data):
+    from dicesapi import Character
+
+    achilles, agamemnon = [Character(c) for c in character_data]
+    payloads = {
+        'MANTO_ACHILLES': _entity_payload('MANTO_ACHILLES', 'Achilles'),
+        'MANTO_AGAMEMNON': _entity_payload('MANTO_AGAMEMNON', '<b>Agamemnon</b>'),
+    }
+    calls = []
+    lock = threading.Lock()
+
+    def fake_get(url, headers=None):
+        manto_id = url.rsplit('/', 1)[-1]
+        with lock:
+            calls.append(manto_id)
+        return _response(payloads[manto_id])
+
+    with patch('dicesapi.manto.requests.get', side_effect=fake_get):
+        result = manto.prefetch([achilles, agamemnon, 'MANTO_ACHILLES'], max_concurrency=2)
+        again = manto.prefetch([achilles])
+
+    assert sorted(calls) == ['MANTO_ACHILLES', 'MANTO_AGAMEMNON']
+    assert result['MANTO_AGAMEMNON'].name == 'Agamemnon'
+    assert again['MANTO_ACHILLES'] is result['MANTO_ACHILLES']
+
+    with patch('dicesapi.manto.requests.get') as mock_get:
+        assert manto.getMantoChar(achilles).name == 'Achilles'
+    mock_get.assert_not_called()
+
+
+def test_prefetch_uses_rate_limit(monkeypatch):
+    limiter = Mock()
+    limiter.acquire.return_value = 0
+    shared = Mock()
+    shared.acquire.return_value = 0
+    monkeypatch.setattr(manto, '_limiter', shared)
+
+    with patch('dicesapi.manto.TokenBucket', return_value=limiter), \
+            patch('dicesapi.manto.requests.get',
+                    return_value=_response(_entity_payload('X', 'X'))):
+        manto.prefetch(['X', 'Y'], max_rate=2)
+
+    # max_rate adds a limit of its own; the shared one still applies
+    assert limiter.acquire.call_count == 2
+    assert shared.acquire.call_count == 2
+
+
+@pytest.mark.parametrize('max_rate', [0, -1, float('nan')])
+def test_prefetch_rejects_bad_rate(max_rate):
+    with patch('dicesapi.manto.requests.get') as mock_get, pytest.raises(ValueError):
+        manto.prefetch(['X'], max_rate=max_rate)
+    mock_get.assert_not_called()
+
+
+def test_get_ties(monkeypatch):
+    payload = _entity_payload('MANTO_ACHILLES', 'Achilles',
+                                {Tie.SON: ['MANTO_PELEUS', 'MANTO_THETIS']})
+    ent = manto.MantoEntity('MANTO_ACHILLES', payload)
+
+    assert ent.getTies(Tie.SON, as_ent=False) == ['MANTO_PELEUS', 'MANTO_THETIS']
+    assert ent.getTies(Tie.DAUGHTER, as_ent=False) == []
+
+
+def test_store_avoids_network_after_restart(tmp_path, monkeypatch):
+    path = str(tmp_path / 'manto.sqlite')
+    manto.useStore(path)
+
+    with patch('dicesapi.manto.requests.get',
+                return_value=_response(_entity_payload('MANTO_THETIS', 'Thetis'))) as mock_get:
+        assert manto.getMantoID('MANTO_THETIS').name == 'Thetis'
+    assert mock_get.call_count == 1
+
+    # simulate a restart: empty the in-memory index, reopen the store
+    monkeypatch.setattr(manto, '__manto_index__', {})
+    store = manto.useStore(path)
+    assert store.ids() == ['MANTO_THETIS']
+
+    with patch('dicesapi.manto.requests.get') as mock_get:
+        assert manto.getMantoID('MANTO_THETIS').name == 'Thetis'
+    mock_get.assert_not_called()
+    manto.useStore(None)
+
+
+def test_store_records_empty_and_error_responses(tmp_path):
+    store = manto.useStore(str(tmp_path / 'manto.sqlite'))
+
+    with patch('dicesapi.manto.requests.get', side_effect=[
+                _response({'data': {'objects': {}}}),
+                _response(None, status=500),
+            ]):
+        assert manto.getMantoID('MANTO_NOBODY').data == {}
+        assert manto.getMantoID('MANTO_BROKEN').data == {}
+
+    assert store.get('MANTO_NOBODY')['status'] == manto.STATUS_EMPTY
+    broken = store.get('MANTO_BROKEN')
+    assert broken['status'] == manto.STATUS_ERROR
+    assert broken['error'] == 'HTTP status: 500'
+
+    # a fresh empty entry is not re-requested, even though it isn't
+    # kept in memory; a stale error is
+    store.error_max_age = 0
+    store._clock = lambda: broken['fetched'] + 1
+    with patch('dicesapi.manto.requests.get',
+                return_value=_response(_entity_payload('MANTO_BROKEN', 'Fixed'))) as mock_get:
+        assert manto.getMantoID('MANTO_NOBODY').data == {}
+        assert manto.getMantoID('MANTO_BROKEN').name == 'Fixed'
+    assert mock_get.call_count == 1
+    assert store.get('MANTO_BROKEN')['status'] == manto.STATUS_OK
+    manto.useStore(None)
+
+
+def test_store_refresh_if_older_than(tmp_path):
+    clock = FakeClock()
+    store = manto.MantoStore(str(tmp_path / 'manto.sqlite'), max_age=60, clock=clock)
+    store.put('MANTO_X', manto.STATUS_OK, _entity_payload('MANTO_X', 'X'))
+
+    assert store.isFresh(store.get('MANTO_X'))
+    clock.now += 61
+    assert not store.isFresh(store.get('MANTO_X'))
+
+
+@pytest.fixture
+def family(speech_data):
+    '''Peleus and Thetis, parents of Achilles, with ties recorded unevenly'''
+
+    from dicesapi import Character
+
+    people = {
+        1: ('M_PELEUS', 'Peleus', 'male', {Tie.HUSBAND: ['M_THETIS']}),
+        2: ('M_THETIS', 'Thetis', 'female', {Tie.MOTHER: ['M_ACHILLES']}),
+        3: ('M_ACHILLES', 'Achilles', 'male', {Tie.SON: ['M_PELEUS']}),
+        4: ('M_POLYMELE', 'Polymele', 'female', {Tie.DAUGHTER: ['M_PELEUS']}),
+        5: ('M_PATROCLUS', 'Patroclus', 'male', {}),
+    }
+    chars = {}
+    for char_id, (manto_id, name, gender, ties) in people.items():
+        manto._indexEntity(manto_id, _entity_payload(manto_id, name, ties))
+        chars[name] = Character(dict(id=char_id, name=name, gender=gender, manto=manto_id))
+    return chars
+
+
+def test_kinship_graph_derives_relations(family):
+    graph = manto.KinshipGraph(family.values(), fetch=False)
+    peleus, thetis, achilles, polymele, patroclus = [c.id for c in family.values()]
+
+    assert graph.parents(achilles) == {peleus, thetis}
+    assert graph.mothers(achilles) == {thetis}
+    assert graph.fathers(achilles) == {peleus}
+    assert graph.children(peleus) == {achilles, polymele}
+    assert graph.related(thetis, 'son') == {achilles}
+    assert graph.related(peleus, 'daughter') == {polymele}
+    assert graph.spouses(thetis) == {peleus}
+    assert graph.siblings(achilles) == {polymele}
+    assert graph.parents(patroclus) == set()
+
+    assert graph.hasTie(family['Achilles'], family['Peleus'], [Tie.SON]) is True
+    assert graph.hasTie(family['Achilles'], 99, [Tie.SON], err_val='n/a') == 'n/a'
+    with pytest.raises(ValueError):
+        graph.related(achilles, 'cousin')
+
+
+def test_kinship_graph_answers_without_network(family):
+    graph = manto.KinshipGraph(family.values(), fetch=False)
+
+    with patch('dicesapi.manto.requests.get') as mock_get:
+        assert manto.charIsChild(family['Achilles'], family['Peleus'], graph=graph)
+        assert not manto.charIsChild(family['Peleus'], family['Achilles'], graph=graph)
+    mock_get.assert_not_called()
+
+
+def test_kin_speeches(family, api, speech_data):
+    from copy import deepcopy
+    from dicesapi import SpeechGroup
+
+    def speech(speech_id, spkr, addr):
+        data = deepcopy(speech_data)
+        data['id'] = speech_id
+        for k, (key, char) in enumerate((('spkr', spkr), ('addr', addr))):
+            data[key] = [dict(id=speech_id * 10 + k, name=char.name,
+                            char=dict(id=char.id, name=char.name, manto=char.manto))]
+        return api.indexedSpeech(data)
+
+    speeches = SpeechGroup([
+        speech(1, family['Thetis'], family['Achilles']),
+        speech(2, family['Achilles'], family['Thetis']),
+        speech(3, family['Achilles'], family['Patroclus']),
+    ], api=api)
+    graph = manto.KinshipGraph(family.values(), fetch=False)
+
+    assert [s.id for s in graph.kinSpeeches(speeches, ['child'])] == [1]
+    assert [s.id for s in graph.kinSpeeches(speeches, ['child'], symmetric=True)] == [1, 2]
+    assert [s.id for s in graph.kinSpeeches(speeches)] == [1, 2]
@@ -0,0 +1,69 @@
+'''tests for DicesAPI.memoryReport() and dicesapi.memory'''
+
+from unittest.mock import Mock, patch
+
+from dicesapi import DicesAPI
+from dicesapi.memory import deepSize
+
+TEI = b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><l n="1">arma virumque cano</l></TEI>'
+
+DUMP = [
+    {'model': 'speechdb.author', 'pk': 1, 'fields': {'name': 'Vergil', 'urn': 'urn:cts:latinLit:phi0690'}},
+    {'model': 'speechdb.work', 'pk': 1, 'fields': {'title': 'Aeneid', 'author': 1, 'lang': 'latin',
+                                                    'urn': 'urn:cts:latinLit:phi0690.phi003'}},
+    {'model': 'speechdb.character', 'pk': 1, 'fields': {'name': 'Aeneas'}},
+    {'model': 'speechdb.characterinstance', 'pk': 1, 'fields': {'char': 1}},
+    {'model': 'speechdb.speechcluster', 'pk': 1, 'fields': {'type': 'D', 'work': 1}},
+    {'model': 'speechdb.speech', 'pk': 1, 'fields': {'cluster': 1, 'work': 1, 'seq': 1,
+        'l_fi': '1.1', 'l_la': '1.5', 'spkr': [1], 'addr': [1], 'type': 'D'}},
+]
+
+
+def test_deep_size_counts_shared_objects_once():
+    shared = ['x' * 1000]
+    seen = set()
+    first = deepSize({'a': shared}, seen)
+    second = deepSize({'b': shared}, seen)
+    assert first > 1000
+    assert second < 1000
+
+
+def test_deep_size_stops_at_types():
+    class Leaf(object):
+        pass
+
+    leaf = Leaf()
+    leaf.payload = 'y' * 5000
+    assert deepSize([leaf], set(), stop=(Leaf,)) < 5000
+    assert deepSize([leaf], set()) > 5000
+
+
+def test_memory_report(api):
+    dump_api = DicesAPI.fromDump(DUMP)
+    dump_api.initializeCts()
+    speech = dump_api._speech_index[1]
+
+    res = Mock()
+    res.ok = True
+    res.content = TEI
+    with patch('dicesapi.text.requests.get', return_value=res):
+        speech.fetchPassage()
+
+    report = dump_api.memoryReport()
+
+    assert list(report.columns) == ['objects', 'bytes']
+    for name in ('speech', 'characterinstance', 'character', 'work', 'author', 'speechcluster'):
+        assert report.loc[f'{name}_index', 'objects'] == 1
+        assert report.loc[f'{name}_index', 'bytes'] > 0
+    assert report.loc['attributes', 'objects'] == 6
+    assert report.loc['raw_data', 'objects'] == 6
+    assert report.loc['cts_cache', 'objects'] == 1
+    assert report.loc['cts_cache', 'bytes'] >= len(TEI)
+    assert report.loc['passages', 'objects'] == 1
+    assert report.loc['passages', 'bytes'] > 0
+    assert report.loc['spacy_docs', 'objects'] == 0
+
+
+def test_memory_report_empty(api):
+    report = api.memoryReport()
+    assert report['objects'].sum() == 0
@@ -0,0 +1,147 @@
+'''tests for the mother-child benchmark harness, on a tiny local snapshot'''
+
+import json
+
+import pytest
+
+from dicesapi import DicesAPI, manto
+from dicesapi.manto import Tie, TokenBucket
+
+
+@pytest.fixture(scope='module')
+def bench(load_bench):
+    return load_bench('moms_bench')
+
+
+@pytest.fixture(autouse=True)
+def clean_manto(monkeypatch):
+    monkeypatch.setattr(manto, '__manto_index__', {})
+    monkeypatch.setattr(manto, '__manto_store__', None)
+    monkeypatch.setattr(manto, '_limiter', TokenBucket(rate=1e6, capacity=1e6))
+
+
+def _record(model, pk, **fields):
+    return {'model': f'speechdb.{model}', 'pk': pk, 'fields': fields}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    '''Iliad 1: Achilles and Thetis talk twice; Achilles also addresses Agamemnon'''
+
+    dump = [
+        _record('metadata', 1, name='date', value='2026-01-01'),
+        _record('author', 1, name='Homer'),
+        _record('work', 1, title='Iliad', author=1),
+        _record('character', 1, name='Achilles', gender='male', manto='M_ACHILLES',
+                    wd='Q1'),
+        _record('character', 2, name='Thetis', gender='female', manto='M_THETIS',
+                    wd='Q2'),
+        _record('character', 3, name='Agamemnon', gender='male', manto='M_AGAMEMNON',
+                    wd='Q3'),
+    ]
+    for char_id in (1, 2, 3):
+        dump.append(_record('characterinstance', char_id, char=char_id))
+    for pk, (l_fi, l_la, spkr, addr) in enumerate([
+            ('1.121', '1.129', 1, 3),
+            ('1.352', '1.356', 1, 2),
+            ('1.362', '1.363', 2, 1)], start=1):
+        dump.append(_record('speech', pk, work=1, seq=pk, l_fi=l_fi, l_la=l_la,
+                            spkr=[spkr], addr=[addr]))
+
+    path = tmp_path / 'speechdb.json'
+    path.write_text(json.dumps(dump))
+    return str(path)
+
+
+@pytest.fixture
+def manto_store(tmp_path):
+    '''MANTO stand-in: Achilles is recorded as "son of" Thetis only'''
+
+    path = str(tmp_path / 'manto.sqlite')
+    store = manto.MantoStore(path)
+    for manto_id, ties in [('M_ACHILLES', {Tie.SON: ['M_THETIS']}),
+                            ('M_THETIS', {}), ('M_AGAMEMNON', {})]:
+        definitions = {tie: {'object_definition_ref_object_id':
+                                [{manto.NGID: {i: {} for i in ids}}]}
+                        for tie, ids in ties.items()}
+        store.put(manto_id, manto.STATUS_OK, {'data': {'objects': {manto_id: {
+            'object': {'object_name': manto_id}, 'object_definitions': definitions}}}})
+    store.close()
+    return path
+
+
+@pytest.fixture
+def gold(tmp_path):
+    path = tmp_path / 'gold.csv'
+    path.write_text('work,l_first,l_last,spkr,addr\n'
+                    'Iliad,1.352,356,Achilles,Thetis\n'
+                    'Iliad,1.362,363,Thetis,Achilles\n'
+                    'Iliad,1.365,412,Achilles,Thetis\n')
+    return str(path)
+
+
+def test_from_dump_file(snapshot):
+    api = DicesAPI.fromDumpFile(snapshot)
+
+    assert len(api._speech_index) == 3
+    assert api._dump_timestamp == '2026-01-01'
+    assert api._speech_index[2].addr[0].char.name == 'Thetis'
+
+
+def test_load_gold_expands_last_line(bench):
+    gold = bench.loadGold()
+
+    assert len(gold) == 61
+    assert ('iliad', '1.352', '1.356') in gold
+
+
+@pytest.mark.parametrize('strategy', ['manto-graph', 'manto-pairwise'])
+def test_manto_strategies(bench, snapshot, manto_store, gold, strategy):
+    [result] = bench.run(snapshot, manto_path=manto_store, strategies=[strategy],
+                            gold_path=gold)
+
+    assert (result['tp'], result['fp'], result['fn']) == (2, 0, 1)
+    assert result['precision'] == 1.0
+    assert result['recall'] == pytest.approx(2 / 3)
+    assert result['gold_missing'] == 1
+    assert result['requests'] == 0
+    assert result['lookups'] > 0
+    assert manto.__manto_store__ is None
+
+
+def test_wikidata_strategy(bench, snapshot, gold, tmp_path):
+    pytest.importorskip('wikidata')
+
+    mother = {'rank': 'normal', 'mainsnak': {
+        'snaktype': 'value', 'datatype': 'wikibase-item',
+        'datavalue': {'type': 'wikibase-entityid',
+                        'value': {'entity-type': 'item', 'id': 'Q2', 'numeric-id': 2}}}}
+    entities = {
+        'Q1': {'id': 'Q1', 'type': 'item', 'claims': {'P25': [mother]}},
+        'Q2': {'id': 'Q2', 'type': 'item', 'claims': {}},
+        'P25': {'id': 'P25', 'type': 'property'},
+        'P40': {'id': 'P40', 'type': 'property'},
+    }
+    path = tmp_path / 'wikidata.json'
+    path.write_text(json.dumps(entities))
+
+    [result] = bench.run(snapshot, wikidata_path=str(path), gold_path=gold)
+
+    assert result['strategy'] == 'wikidata'
+    assert (result['tp'], result['fp']) == (2, 0)
+    assert result['batch_requests'] == 1
+    # Agamemnon (Q3) isn't in the stand-in: counted, never sent
+    assert result['requests'] == 1
+
+
+def test_manto_counters_read_shared_stats(bench):
+    manto.__manto_index__['MANTO_A'] = manto.MantoEntity('MANTO_A', {'object': 'A'})
+    manto._resolve('MANTO_A')
+
+    with bench.MantoCounters() as counters:
+        manto._resolve('MANTO_A')
+        manto._resolve('MANTO_B', debug=False)
+    manto._resolve('MANTO_A')
+
+    assert counters.report() == dict(requests=1, lookups=2, memory_hits=1, store_hits=0,
+                                        hit_rate=0.5)
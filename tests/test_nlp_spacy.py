@@ -0,0 +1,288 @@
+'''tests for dicesapi.nlp_spacy, using blank spaCy pipelines
+
+These only need the `spacy` package, not the trained Greek/Latin models,
+and are skipped if spacy is not installed.
+'''
+
+from copy import deepcopy
+
+import pytest
+
+from dicesapi import SpeechGroup
+from dicesapi.text import Passage
+
+spacy = pytest.importorskip('spacy')
+
+
+@pytest.fixture(autouse=True)
+def nlp_spacy():
+    '''Import nlp_spacy lazily, so that collecting this file doesn't attach
+    its methods to Passage before test_module_split runs'''
+
+    import dicesapi.nlp_spacy
+    return dicesapi.nlp_spacy
+
+
+def _speech_with_lines(api, speech_data, speech_id, lang, lines):
+    data = deepcopy(speech_data)
+    data['id'] = speech_id
+    data['work'] = dict(data['work'], id=10 + speech_id, lang=lang)
+    speech = api.indexedSpeech(data)
+    passage = Passage(speech)
+    passage.line_array = [dict(n=str(i + 1), seq=i, text=text) for i, text in enumerate(lines)]
+    passage._buildLineIndex()
+    speech.passage = passage
+    return speech
+
+
+@pytest.fixture
+def nlp_api(api):
+    api.config['nlp'] = {'latin': spacy.blank('la'), 'greek': spacy.blank('grc')}
+    return api
+
+
+@pytest.fixture
+def speeches(nlp_api, speech_data):
+    return SpeechGroup([
+        _speech_with_lines(nlp_api, speech_data, 1, 'latin', ['arma virumque cano', 'Troiae qui primus']),
+        _speech_with_lines(nlp_api, speech_data, 2, 'greek', ['μῆνιν ἄειδε θεὰ']),
+        _speech_with_lines(nlp_api, speech_data, 3, 'latin', ['at regina gravi']),
+    ], api=nlp_api)
+
+
+def test_passage_run_spacy_pipeline(speeches):
+    passage = speeches[0].passage
+    passage.runSpacyPipeline()
+
+    assert [t.text for t in passage.spacy_doc] == ['arma', 'virumque', 'cano', 'Troiae', 'qui', 'primus']
+    assert passage._token_index.tolist() == [0, 5, 14, 19, 26, 30]
+
+
+def test_token_alignment(speeches):
+    passage = speeches[0].passage
+    passage.runSpacyPipeline()
+
+    line_index, line_pos = passage.alignTokens()
+    assert line_index.tolist() == [0, 0, 0, 1, 1, 1]
+    assert line_pos.tolist() == [0, 5, 14, 0, 7, 11]
+
+    troiae = passage.spacy_doc[3]
+    assert passage.getSpacyWordIndex(troiae) == 3
+    assert passage.getLineIndex(troiae) == 1
+    assert passage.getLinePos(troiae) == 0
+    assert passage.getLine(troiae)['text'] == 'Troiae qui primus'
+    assert passage.getTextPos(troiae) == 19
+
+
+def test_group_run_spacy_pipeline_batches_by_language(speeches):
+    count = speeches.runSpacyPipeline(batch_size=2)
+
+    assert count == 3
+    for speech in speeches:
+        assert speech.passage.spacy_doc.text == speech.passage.text
+        assert speech.passage._token_index is not None
+    assert speeches[1].passage.spacy_doc.lang_ == 'grc'
+
+
+def test_group_run_spacy_pipeline_skips_missing_passages(speeches):
+    speeches[2].passage = None
+
+    assert speeches.runSpacyPipeline() == 2
+
+
+def test_group_run_spacy_pipeline_requires_model(speeches):
+    del speeches.api.config['nlp']['greek']
+
+    with pytest.raises(RuntimeError):
+        speeches.runSpacyPipeline()
+
+
+def test_doc_cache_round_trip(nlp_spacy, tmp_path):
+    nlp = spacy.blank('la')
+    cache = nlp_spacy.DocCache(str(tmp_path))
+
+    assert cache.get(nlp, 'arma virumque cano') is None
+    cache.put(nlp, 'arma virumque cano', nlp('arma virumque cano'))
+
+    doc = cache.get(nlp, 'arma virumque cano')
+    assert [t.text for t in doc] == ['arma', 'virumque', 'cano']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a new cache object over the same directory sees the stored doc
+    assert len(nlp_spacy.DocCache(str(tmp_path))) == 1
+
+    # a different model doesn't reuse it
+    assert cache.get(spacy.blank('grc'), 'arma virumque cano') is None
+
+
+def test_doc_cache_evicts_least_recently_used(nlp_spacy, tmp_path):
+    import os
+    import time
+
+    nlp = spacy.blank('la')
+    cache = nlp_spacy.DocCache(str(tmp_path), max_entries=2)
+    texts = ['arma', 'virumque', 'cano']
+    cache.putMany(nlp, texts[:2], [nlp(t) for t in texts[:2]])
+
+    # make 'arma' the oldest entry
+    old = time.time() - 100
+    os.utime(cache._path(cache.modelKey(nlp), 'arma'), (old, old))
+
+    cache.put(nlp, 'cano', nlp('cano'))
+
+    assert len(cache) == 2
+    assert cache.getMany(nlp, texts)[0] is None
+    assert cache.get(nlp, 'cano') is not None
+
+
+def test_doc_cache_prune_skips_deleted_files(nlp_spacy, tmp_path):
+    import os
+
+    nlp = spacy.blank('la')
+    cache = nlp_spacy.DocCache(str(tmp_path), max_entries=2)
+    cache.putMany(nlp, ['arma', 'virumque'], [nlp('arma'), nlp('virumque')])
+    os.remove(cache._path(cache.modelKey(nlp), 'arma'))
+
+    cache.put(nlp, 'cano', nlp('cano'))
+
+    assert len(cache) == 2
+    assert cache.get(nlp, 'virumque') is not None
+    assert cache.get(nlp, 'cano') is not None
+
+
+def test_group_pipeline_uses_doc_cache(nlp_spacy, speeches, tmp_path):
+    api = speeches.api
+    api.config['nlp_cache'] = nlp_spacy.DocCache(str(tmp_path))
+
+    speeches.runSpacyPipeline()
+    assert api.config['nlp_cache'].misses == 3
+    assert len(api.config['nlp_cache']) == 3
+
+    speeches.runSpacyPipeline()
+    assert api.config['nlp_cache'].hits == 3
+    assert [t.text for t in speeches[0].passage.spacy_doc][:2] == ['arma', 'virumque']
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    '''A minimal Latin model saved to disk, loadable by path'''
+
+    nlp = spacy.blank('la')
+    nlp.add_pipe('sentencizer')
+    path = tmp_path / 'la_test_model'
+    nlp.to_disk(path)
+    return str(path)
+
+
+def test_models_load_lazily_and_are_shared(nlp_spacy, model_path):
+    from dicesapi import DicesAPI
+
+    nlp_spacy.clearSharedModels()
+    first = DicesAPI(dices_api='http://testserver/api/')
+    second = DicesAPI(dices_api='http://testserver/api/')
+    first.initializeNlp(latin_model=model_path)
+    second.initializeNlp(latin_model=model_path)
+
+    models = first.config['nlp']
+    assert 'latin' in models and 'greek' not in models
+    assert not models.isLoaded('latin')
+
+    assert models['latin'] is second.config['nlp']['latin']
+    assert models.isLoaded('latin')
+
+
+def test_missing_model_raises_at_initialization(nlp_spacy, api):
+    with pytest.raises(RuntimeError) as e:
+        api.initializeNlp(latin_model='la_core_web_md_not_installed')
+    assert 'could not be loaded' in str(e.value)
+
+
+def test_load_time_exclude(nlp_spacy, model_path):
+    nlp_spacy.clearSharedModels()
+    models = nlp_spacy.spacy_load(latin_model=model_path, lazy=False, exclude=['sentencizer'])
+
+    assert models.isLoaded('latin')
+    assert models['latin'].pipe_names == []
+
+
+def test_per_call_enable_disable(nlp_spacy, speeches, model_path):
+    nlp_spacy.clearSharedModels()
+    speeches.api.config['nlp'] = nlp_spacy.spacy_load(latin_model=model_path)
+    latin = speeches.filterIDs([1, 3])
+
+    latin.runSpacyPipeline(disable=['sentencizer'])
+    assert not latin[0].passage.spacy_doc.has_annotation('SENT_START')
+
+    latin.runSpacyPipeline()
+    assert latin[0].passage.spacy_doc.has_annotation('SENT_START')
+
+    # the model's own pipeline is unchanged afterwards
+    assert speeches.api.config['nlp']['latin'].pipe_names == ['sentencizer']
+
+
+def test_enable_disable_leaves_shared_model_alone(nlp_api, speeches):
+    '''Components are skipped per call, not switched off on the model,
+    which other threads may be using meanwhile'''
+
+    nlp = nlp_api.config['nlp']['latin']
+    seen = []
+
+    @spacy.Language.component('dicesapi_test_pipe_names')
+    def pipe_names(doc):
+        seen.append(list(nlp.pipe_names))
+        return doc
+
+    nlp.add_pipe('sentencizer')
+    nlp.add_pipe('dicesapi_test_pipe_names')
+    latin = speeches.filterIDs([1, 3])
+
+    latin.runSpacyPipeline(disable=['sentencizer'])
+    assert not latin[0].passage.spacy_doc.has_annotation('SENT_START')
+    latin[0].passage.runSpacyPipeline(enable=['dicesapi_test_pipe_names'])
+    assert not latin[0].passage.spacy_doc.has_annotation('SENT_START')
+
+    assert seen == [['sentencizer', 'dicesapi_test_pipe_names']] * 3
+
+
+def test_unknown_component_raises(nlp_spacy, speeches, model_path):
+    nlp_spacy.clearSharedModels()
+    speeches.api.config['nlp'] = nlp_spacy.spacy_load(latin_model=model_path)
+    latin = speeches.filterIDs([1, 3])
+
+    with pytest.raises(ValueError) as e:
+        latin.runSpacyPipeline(enable=['lemmatiser'])
+    assert 'lemmatiser' in str(e.value)
+
+    with pytest.raises(ValueError):
+        latin[0].passage.runSpacyPipeline(disable=['sentencizer', 'ner'])
+    assert latin[0].passage.spacy_doc is None
+
+
+def test_token_table(speeches):
+    speeches.runSpacyPipeline()
+    for speech in speeches:
+        for tok in speech.passage.spacy_doc:
+            tok.lemma_ = tok.text.lower()
+            tok.pos_ = 'PROPN' if tok.text[0].isupper() else 'NOUN'
+
+    table = speeches.tokenTable(attrs=['lemma', 'pos'])
+
+    assert len(table) == 6 + 3 + 3
+    assert list(table.columns) == ['speech_id', 'token', 'line', 'n', 'lemma', 'pos']
+    assert table['speech_id'].tolist()[:7] == [1, 1, 1, 1, 1, 1, 2]
+    assert table['line'].tolist()[:6] == [0, 0, 0, 1, 1, 1]
+    assert table['n'].tolist()[:6] == ['1', '1', '1', '2', '2', '2']
+    assert table['lemma'].tolist()[:3] == ['arma', 'virumque', 'cano']
+    assert table['pos'].dtype == 'category'
+    assert table.groupby('pos', observed=True).size().to_dict() == {'NOUN': 11, 'PROPN': 1}
+
+
+def test_token_table_unknown_attr(speeches):
+    with pytest.raises(ValueError):
+        speeches.tokenTable(attrs=['nonsense'])
+
+
+def test_token_table_without_docs(speeches):
+    table = speeches.tokenTable(attrs=['lemma'])
+    assert len(table) == 0
+    assert list(table.columns) == ['speech_id', 'token', 'line', 'n', 'lemma']
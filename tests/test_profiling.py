@@ -0,0 +1,103 @@
+'''tests for dicesapi.profiling'''
+
+import inspect
+import json
+import os
+import tracemalloc
+
+from dicesapi import DicesAPI, profiling
+from dicesapi.profiling import SUBSYSTEMS, subsystem
+
+DUMP = [
+    {'model': 'speechdb.author', 'pk': 1, 'fields': {'name': 'Homer'}},
+    {'model': 'speechdb.work', 'pk': 1, 'fields': {'title': 'Iliad', 'author': 1}},
+    {'model': 'speechdb.character', 'pk': 1, 'fields': {'name': 'Achilles'}},
+    {'model': 'speechdb.characterinstance', 'pk': 1, 'fields': {'char': 1}},
+    {'model': 'speechdb.speechcluster', 'pk': 1, 'fields': {'type': 'D', 'work': 1}},
+    {'model': 'speechdb.speech', 'pk': 1, 'fields': {'cluster': 1, 'work': 1, 'seq': 1,
+        'l_fi': '1.1', 'l_la': '1.5', 'spkr': [1], 'addr': [1], 'type': 'D'}},
+]
+
+
+def test_subsystem():
+    init = os.path.join(profiling.PACKAGE_DIR, '__init__.py')
+    assert subsystem(init, 'getPagedJSON') == 'paging'
+    assert subsystem(init, 'indexedSpeech') == 'hydration'
+    assert subsystem(init, 'filterBy') == 'filtering'
+    assert subsystem(os.path.join(profiling.PACKAGE_DIR, 'client.py'), 'getPagedJSON') == 'paging'
+    assert subsystem(os.path.join(profiling.PACKAGE_DIR, 'models.py'), 'filterBy') == 'filtering'
+    assert subsystem(os.path.join(profiling.PACKAGE_DIR, 'manto.py'), 'getMantoID') == 'kinship'
+    assert subsystem(os.path.join(profiling.PACKAGE_DIR, 'text.py'), 'getXML') == 'text'
+    client = os.path.join(profiling.PACKAGE_DIR, 'client.py')
+    for name in ('ingest', '_ingest', '_ingested', '_rehydrate', '_unchanged', '_keepPayload',
+                    '_storedPayload', '_nestedPayload'):
+        assert subsystem(client, name) == 'hydration'
+
+
+def test_comprehensions_count_toward_their_function(api, speech_data):
+    lines, start = inspect.getsourcelines(DicesAPI._ingest)
+    line = start + next(i for i, text in enumerate(lines) if '[_ingested(' in text)
+    client = inspect.getsourcefile(DicesAPI)
+    assert subsystem(client, '<listcomp>', line) == 'hydration'
+    assert subsystem(client, '<genexpr>', line) == 'hydration'
+
+    with api.profile(memory=False) as report:
+        for i in range(50):
+            api.ingest('speech', [dict(speech_data, id=i + 1)])
+
+    by_subsystem = report.bySubsystem()
+    assert by_subsystem.loc['hydration', 'self_seconds'] > by_subsystem.loc['other', 'self_seconds']
+
+
+def test_profile_reports_dicesapi_frames(api, tmp_path):
+    with api.profile() as report:
+        dump_api = DicesAPI.fromDump(DUMP)
+        dump_api.cachedSpeeches().filterBy('type', {'D'})
+
+    assert not tracemalloc.is_tracing()
+    assert report.seconds > 0
+    assert report.peak_bytes > 0
+
+    funcs = report.functions()
+    assert len(funcs)
+    assert funcs['function'].str.contains('indexedSpeech').any()
+    assert set(funcs['subsystem']) <= set(SUBSYSTEMS)
+
+    by_subsystem = report.bySubsystem()
+    assert list(by_subsystem.index) == list(SUBSYSTEMS)
+    assert by_subsystem.loc['hydration', 'calls'] > 0
+    assert by_subsystem.loc['filtering', 'calls'] > 0
+    assert by_subsystem['bytes'].sum() > 0
+
+    assert 'hydration' in report.summary()
+
+    path = str(tmp_path / 'profile.json')
+    report.save(path)
+    with open(path) as f:
+        doc = json.load(f)
+    assert doc['subsystems']['hydration']['calls'] > 0
+    assert doc['functions']
+
+
+def test_profile_cpu_only(api):
+    with api.profile(memory=False) as report:
+        DicesAPI.fromDump(DUMP)
+
+    assert report.memory is None
+    assert report.peak_bytes is None
+    assert len(report.allocations()) == 0
+    assert report.bySubsystem()['bytes'].sum() == 0
+
+
+def test_profile_keeps_existing_tracemalloc(api):
+    tracemalloc.start()
+    try:
+        with api.profile(cpu=False) as report:
+            DicesAPI.fromDump(DUMP)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+    assert report.cpu is None
+    assert report.memory is not None
+    assert len(report.functions()) == 0
@@ -0,0 +1,108 @@
+'''tests for dicesapi.relations, with MANTO and Wikidata stubbed out'''
+
+from copy import deepcopy
+from unittest.mock import patch
+
+import pytest
+
+from dicesapi import SpeechGroup, manto
+from dicesapi.manto import Tie, TokenBucket
+from dicesapi.relations import relationMatrix
+
+
+@pytest.fixture(autouse=True)
+def clean_manto(monkeypatch):
+    monkeypatch.setattr(manto, '__manto_index__', {})
+    monkeypatch.setattr(manto, '__manto_store__', None)
+    monkeypatch.setattr(manto, '_limiter', TokenBucket(rate=1e6, capacity=1e6))
+
+
+PEOPLE = {
+    # id: (name, gender, manto id, wikidata id, manto ties)
+    1: ('Thetis', 'female', 'M_THETIS', 'Q2', {Tie.MOTHER: ['M_ACHILLES']}),
+    2: ('Achilles', 'male', 'M_ACHILLES', 'Q1', {}),
+    3: ('Patroclus', 'male', 'M_PATROCLUS', 'Q3', {}),
+}
+
+
+@pytest.fixture
+def speeches(api, speech_data):
+    chars = {}
+    for char_id, (name, gender, manto_id, wd_id, ties) in PEOPLE.items():
+        definitions = {tie: {'object_definition_ref_object_id':
+                                [{manto.NGID: {i: {} for i in ids}}]}
+                        for tie, ids in ties.items()}
+        manto._indexEntity(manto_id, {'data': {'objects': {manto_id: {
+            'object': {'object_name': name}, 'object_definitions': definitions}}}})
+        chars[char_id] = dict(id=char_id, name=name, gender=gender, manto=manto_id, wd=wd_id)
+
+    def speech(speech_id, spkrs, addrs):
+        data = deepcopy(speech_data)
+        data['id'] = speech_id
+        data['spkr'] = [dict(id=speech_id * 10 + i, char=chars[c]) for i, c in enumerate(spkrs)]
+        data['addr'] = [dict(id=speech_id * 10 + 5 + i, char=chars[c])
+                            for i, c in enumerate(addrs)]
+        return api.indexedSpeech(data)
+
+    return SpeechGroup([
+        speech(1, [1], [2]),        # Thetis to Achilles
+        speech(2, [2], [1, 3]),     # Achilles to Thetis and Patroclus
+        speech(3, [2], [3]),        # Achilles to Patroclus
+        speech(4, [1], [2]),        # Thetis to Achilles again
+    ], api=api)
+
+
+def test_relation_matrix_manto(speeches):
+    with patch('dicesapi.manto.requests.get') as mock_get:
+        matrix = relationMatrix(speeches, ['mother', 'child', 'son', 'spouse'])
+    mock_get.assert_not_called()
+
+    assert list(matrix.columns) == ['speech_id', 'mother', 'child', 'son', 'spouse']
+    assert list(matrix.speech_id) == [1, 2, 3, 4]
+    assert list(matrix['mother']) == [False, True, False, False]
+    assert list(matrix['child']) == [True, False, False, True]
+    assert list(matrix['son']) == [True, False, False, True]
+    assert not matrix['spouse'].any()
+    assert matrix['mother'].dtype == bool
+
+
+def test_relation_matrix_resolves_each_pair_once(speeches):
+    related = manto.KinshipGraph.related
+    with patch.object(manto.KinshipGraph, 'related', autospec=True,
+                        side_effect=related) as mock_related:
+        matrix = relationMatrix(speeches, ['mother'])
+
+    assert matrix['mother'].sum() == 1
+
+    # Thetis->Achilles, Achilles->Thetis, Achilles->Patroclus
+    assert mock_related.call_count == 3
+
+
+def test_relation_matrix_wikidata(speeches, monkeypatch):
+    pytest.importorskip('wikidata')
+    from dicesapi import wikidata as wd
+
+    index = wd.ClaimIndex()
+    index.add({'id': 'Q1', 'claims': {wd.HAS_MOTHER: [{'mainsnak': {
+        'snaktype': 'value', 'datavalue': {'type': 'wikibase-entityid',
+                                            'value': {'id': 'Q2'}}}}]}})
+    index.add({'id': 'Q2', 'claims': {}})
+    index.add({'id': 'Q3', 'claims': {}})
+    monkeypatch.setattr(wd, '__claim_index__', index)
+
+    with patch.object(wd, 'prefetch') as prefetch:
+        matrix = relationMatrix(speeches, ['mother', 'parent', 'child'], source='wikidata')
+    prefetch.assert_called_once()
+
+    assert list(matrix['mother']) == [False, True, False, False]
+    assert list(matrix['parent']) == [False, True, False, False]
+    assert not matrix['child'].any()
+
+
+def test_relation_matrix_rejects_unknown(speeches):
+    with pytest.raises(ValueError):
+        relationMatrix(speeches, ['cousin'])
+    with pytest.raises(ValueError):
+        relationMatrix(speeches, ['son'], source='wikidata')
+    with pytest.raises(ValueError):
+        relationMatrix(speeches, source='tt')
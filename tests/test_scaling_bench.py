@@ -0,0 +1,46 @@
+'''smoke tests for the scaling benchmark suite and its synthetic corpora'''
+
+import json
+
+import pytest
+
+from dicesapi import DicesAPI
+
+@pytest.fixture(scope='module')
+def bench(load_bench):
+    return load_bench('scaling_bench')
+
+
+def test_synth_dump_is_reproducible(bench, load_bench):
+    synth = load_bench('synth')
+    dump = synth.synthDump(100, seed=1)
+
+    assert dump == synth.synthDump(100, seed=1)
+    api = DicesAPI.fromDump(dump)
+    assert len(api._speech_index) == 100
+    assert api._character_index[1].name == 'Achilles'
+    assert len(synth.apiPayloads(dump)) == 100
+
+
+def test_run_reports_every_case(bench):
+    results = bench.run(sizes=[60], repeat=1, memory=True, max_quadratic=50)
+
+    assert [r['case'] for r in results] == list(bench.CASES)
+    by_case = {r['case']: r for r in results}
+    assert by_case['difference']['status'] == 'skipped'
+    assert by_case['union']['status'] == 'ok'
+    assert by_case['indexedSpeech']['seconds'] > 0
+    assert by_case['fromDump']['peak_bytes'] > 0
+    assert by_case['buildLineArray']['items'] == 6
+
+
+def test_main_writes_json(bench, tmp_path):
+    path = tmp_path / 'results.json'
+    bench.main(['--sizes', '30', '--cases', 'filterBy,sorted', '--no-memory',
+                '--output', str(path)])
+
+    doc = json.loads(path.read_text())
+    assert doc['suite'] == 'scaling'
+    assert doc['environment']['python']
+    assert [(r['case'], r['n'], r['peak_bytes']) for r in doc['results']] == [
+        ('filterBy', 30, None), ('sorted', 30, None)]
@@ -0,0 +1,32 @@
+'''smoke test for the scenario benchmarks, against a stand-in in a child process'''
+
+import pytest
+
+from dicesapi import DicesAPI, SpeechGroup
+
+
+@pytest.fixture(scope='module')
+def bench(load_bench):
+    return load_bench('scenario_bench')
+
+
+def test_scenarios_report_traffic_and_results(bench):
+    results = bench.run(size=90, scenarios=['speeches_from_author', 'men_to_women'],
+                        page_size=20, seed=3)
+
+    # the same workloads, run locally on the same corpus
+    api = DicesAPI.fromDump(bench.synthDump(90, seed=3))
+    speeches = SpeechGroup(list(api._speech_index.values()), api=api)
+    homer = [s for s in speeches if s.work.author.name == 'Homer']
+
+    by_name = {r['scenario']: r for r in results}
+    assert by_name['speeches_from_author']['result'] == len(homer)
+    assert by_name['men_to_women']['requests'] == 5
+    assert by_name['men_to_women']['bytes'] > 0
+    assert by_name['men_to_women']['peak_bytes'] > 0
+    assert by_name['men_to_women']['errors'] == 0
+
+
+def test_unknown_scenario(bench):
+    with pytest.raises(ValueError):
+        bench.run(size=10, scenarios=['nothing'])
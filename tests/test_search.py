@@ -0,0 +1,166 @@
+'''tests for dicesapi.search: the full-text inverted index'''
+
+from copy import deepcopy
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dicesapi import DicesAPI, SpeechGroup
+from dicesapi.search import TextIndex, normalize
+from dicesapi.text import Passage
+
+
+def _speech_with_lines(api, speech_data, speech_id, lines):
+    data = dict(deepcopy(speech_data), id=speech_id)
+    speech = api.indexedSpeech(data)
+    passage = Passage(speech)
+    passage.line_array = [dict(n=n, seq=i, text=text) for i, (n, text) in enumerate(lines)]
+    speech.passage = passage
+    return speech
+
+
+@pytest.fixture
+def indexed_api(api, speech_data):
+    _speech_with_lines(api, speech_data, 1, [
+        ('1', 'Arma virumque cano, Troiae qui primus ab oris'),
+        ('2', 'Italiam, fato profugus, Laviniaque venit'),
+    ])
+    _speech_with_lines(api, speech_data, 2, [
+        ('1', 'μῆνιν ἄειδε θεὰ Πηληϊάδεω Ἀχιλῆος'),
+    ])
+    _speech_with_lines(api, speech_data, 3, [
+        ('5', 'et iam arma uirumque'),
+    ])
+    api.buildTextIndex()
+    return api
+
+
+def test_normalize_folds_greek_and_latin():
+    assert normalize('Μῆνιν') == 'μηνιν'
+    assert normalize('λόγος') == 'λογοσ'
+    assert normalize('Virumque') == 'uirumque'
+    assert normalize('Iuppiter') == normalize('Juppiter')
+
+
+def test_search_single_word_across_speeches(indexed_api):
+    speeches, hits = indexed_api.searchText('ARMA')
+
+    assert isinstance(speeches, SpeechGroup)
+    assert speeches.getIDs() == [1, 3]
+    assert [(h['speech'].id, h['n'], h['offset']) for h in hits] == [(1, '1', 0), (3, '5', 7)]
+
+
+def test_search_greek_without_diacritics(indexed_api):
+    speeches, hits = indexed_api.searchText('μηνιν αειδε')
+
+    assert speeches.getIDs() == [2]
+    assert hits[0]['offset'] == 0
+    assert hits[0]['length'] == len('μῆνιν ἄειδε')
+
+
+def test_search_phrase_requires_adjacency(indexed_api):
+    speeches, hits = indexed_api.searchText('arma uirumque')
+    assert speeches.getIDs() == [1, 3]
+
+    speeches, hits = indexed_api.searchText('arma cano')
+    assert len(speeches) == 0
+
+
+def test_search_phrase_across_line_break(indexed_api):
+    speeches, hits = indexed_api.searchText('oris italiam')
+
+    assert speeches.getIDs() == [1]
+    assert hits[0]['n'] == '1'
+
+
+def test_search_missing_word(indexed_api):
+    speeches, hits = indexed_api.searchText('nusquam')
+    assert len(speeches) == 0
+    assert hits == []
+
+
+def test_reindexing_replaces_postings():
+    index = TextIndex()
+    index.addPassage(1, [dict(n='1', text='arma')])
+    index.addPassage(1, [dict(n='1', text='cano')])
+
+    assert index.lookup('arma') == []
+    assert len(index.lookup('cano')) == 1
+    assert index.vocabulary == {'cano'}
+
+
+def test_save_and_load_round_trip(indexed_api, tmp_path):
+    path = tmp_path / 'index.json.gz'
+    indexed_api.config['text_index'].save(path)
+
+    index = TextIndex.load(path)
+    assert len(index) == 3
+    assert index.search('arma uirumque') == indexed_api.config['text_index'].search('arma uirumque')
+
+
+def test_search_without_index_raises(api):
+    with pytest.raises(RuntimeError):
+        api.searchText('arma')
+
+
+def _page(results):
+    res = Mock()
+    res.status_code = 200
+    res.json.return_value = {'count': len(results), 'next': None, 'results': results}
+    return res
+
+
+def test_search_loaded_index_hydrates_matches(indexed_api, speech_data, tmp_path):
+    path = tmp_path / 'index.json.gz'
+    indexed_api.config['text_index'].save(path)
+
+    api = DicesAPI(dices_api='http://testserver/api/')
+    api.indexedSpeech(dict(deepcopy(speech_data), id=3, l_fi='9.5'))
+    api.loadTextIndex(path)
+
+    fetched = dict(deepcopy(speech_data), id=1, l_fi='1.1', l_la='1.2')
+    with patch('dicesapi.requests.get', return_value=_page([fetched])) as mock_get:
+        speeches, hits = api.searchText('arma uirumque', hydrate=True)
+
+    mock_get.assert_called_once_with('http://testserver/api/speeches', {'id': 1})
+    assert speeches.getIDs() == [1, 3]
+    assert [s.l_fi for s in speeches] == ['1.1', '9.5']
+    assert hits[0]['speech'] is speeches[0]
+
+
+def test_search_loaded_index_without_hydrating(indexed_api, tmp_path):
+    path = tmp_path / 'index.json.gz'
+    indexed_api.config['text_index'].save(path)
+
+    api = DicesAPI(dices_api='http://testserver/api/')
+    api.loadTextIndex(path)
+
+    with patch('dicesapi.requests.get') as mock_get:
+        speeches, hits = api.searchText('arma')
+
+    mock_get.assert_not_called()
+    assert speeches.getIDs() == [1, 3]
+    assert speeches[0].l_fi is None
+
+
+def test_search_loaded_index_hydrating_requests(indexed_api, speech_data, tmp_path):
+    path = tmp_path / 'index.json.gz'
+    indexed_api.config['text_index'].save(path)
+
+    api = DicesAPI(dices_api='http://testserver/api/')
+    api.loadTextIndex(path)
+
+    pages = {i: _page([dict(deepcopy(speech_data), id=i)]) for i in (1, 3)}
+    with patch('dicesapi.requests.get', side_effect=lambda url, params: pages[params['id']]) as mock_get:
+        speeches, hits = api.searchText('arma')
+        assert mock_get.call_count == 0
+
+        # one request for each speech that isn't hydrated
+        speeches, hits = api.searchText('arma', hydrate=True)
+        assert mock_get.call_count == 2
+
+        # and none once they're hydrated
+        api.searchText('arma', hydrate=True)
+        assert mock_get.call_count == 2
+
+    assert speeches.getIDs() == [1, 3]
@@ -0,0 +1,134 @@
+'''tests for the local DICES API stand-in, over real HTTP'''
+
+import pytest
+import requests
+
+from dicesapi import DicesAPI, SpeechGroup
+from dicesapi.standin import DicesStandIn
+
+
+def _record(model, pk, **fields):
+    return {'model': f'speechdb.{model}', 'pk': pk, 'fields': fields}
+
+
+@pytest.fixture(scope='module')
+def snapshot():
+    '''Two works; Achilles speaks to Agamemnon in every Iliad speech'''
+
+    dump = [
+        _record('author', 1, name='Homer'),
+        _record('author', 2, name='Vergil'),
+        _record('work', 1, title='Iliad', author=1, lang='greek'),
+        _record('work', 2, title='Aeneid', author=2, lang='latin'),
+        _record('character', 1, name='Achilles', gender='male', being='mortal'),
+        _record('character', 2, name='Agamemnon', gender='male', being='mortal'),
+        _record('character', 3, name='Venus', gender='female', being='divine'),
+        _record('characterinstance', 1, char=1),
+        _record('characterinstance', 2, char=2),
+        _record('characterinstance', 3, char=3),
+        _record('speechcluster', 1, type='D', work=1),
+        _record('speechcluster', 2, type='M', work=2),
+    ]
+    for pk in range(1, 24):
+        dump.append(_record('speech', pk, work=1, cluster=1, seq=pk, type='D',
+                            l_fi=f'1.{pk * 10}', l_la=f'1.{pk * 10 + 5}',
+                            spkr=[1], addr=[2]))
+    dump.append(_record('speech', 24, work=2, cluster=2, seq=1, type='M',
+                        l_fi='1.1', l_la='1.5', spkr=[3], addr=[1]))
+    return dump
+
+
+@pytest.fixture(scope='module')
+def server(snapshot):
+    with DicesStandIn(snapshot, page_size=5) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    server.resetStats()
+    return DicesAPI(dices_api=server.url)
+
+
+def test_paging_follows_next(client, server):
+    speeches = client.getSpeeches()
+
+    assert isinstance(speeches, SpeechGroup)
+    assert len(speeches) == 24
+    assert server.stats()['endpoints'] == {'speeches': 5}
+    assert server.stats()['bytes'] > 0
+
+    s = speeches[0]
+    assert s.work.title == 'Iliad'
+    assert s.work.author.name == 'Homer'
+    assert s.spkr[0].char.name == 'Achilles'
+    assert s.cluster.id == 1
+
+
+def test_filters(client, server):
+    assert len(client.getSpeeches(author_name='vergil')) == 1
+    assert len(client.getSpeeches(work_id=1, spkr_name='Achilles')) == 23
+    assert len(client.getSpeeches(addr_gender='male')) == 24
+    assert len(client.getSpeeches(spkr_being='divine', addr_name='Achilles')) == 1
+    assert client.getWorks(lang='latin').getTitles() == ['Aeneid']
+    assert len(client.getCharacters(gender='female')) == 1
+    assert len(client.getClusters(work_title='Iliad')) == 1
+    assert len(client.getInstances(char_id=2)) == 1
+    assert len(client.getAuthors()) == 2
+
+
+def test_page_size_and_invalid_page(server):
+    res = requests.get(f'{server.url}speeches/', {'page_size': 20, 'page': 2})
+    data = res.json()
+    assert (data['count'], len(data['results']), data['next']) == (24, 4, None)
+    assert 'page_size=20' in data['previous']
+
+    assert requests.get(f'{server.url}speeches/', {'page': 9}).status_code == 404
+    assert requests.get(f'{server.url}nothing/').status_code == 404
+
+
+def test_schema(client):
+    fields = client.getSearchFields('speeches')
+
+    assert fields['spkr_gender']['choices'] == {'female': 'female', 'male': 'male'}
+    assert fields['work_id']['type'] == 'integer'
+    with pytest.raises(ValueError):
+        client.getSearchFields('nothing')
+
+
+def test_injected_errors_and_latency(snapshot):
+    with DicesStandIn(snapshot, error_rate=1.0, latency=0.01) as server:
+        client = DicesAPI(dices_api=server.url)
+        with pytest.raises(requests.HTTPError):
+            client.getAuthors()
+        stats = server.stats()
+    assert (stats['requests'], stats['errors']) == (1, 1)
+
+
+def test_query_filtered_once_for_all_pages(snapshot, monkeypatch):
+    from dicesapi import standin
+
+    server = DicesStandIn(snapshot, page_size=5)
+    calls = []
+    filters = dict(DicesStandIn.FILTERS)
+    getter = filters['speeches']['work_id'][1]
+    filters['speeches'] = dict(filters['speeches'],
+                                work_id=('integer', lambda r: calls.append(r) or getter(r)))
+    monkeypatch.setattr(server, 'FILTERS', filters)
+
+    base = 'http://testserver/api/speeches/'
+    status, payload = server._page('speeches', {'work_id': '1'}, base)
+    pages = [payload]
+    while payload['next']:
+        page = int(payload['next'].rsplit('page=', 1)[1])
+        status, payload = server._page('speeches', {'work_id': '1', 'page': str(page)}, base)
+        pages.append(payload)
+
+    assert len(pages) == 5
+    assert sum(len(p['results']) for p in pages) == 23
+    assert len(calls) == 24
+
+    monkeypatch.setattr(standin, 'QUERY_CACHE_SIZE', 2)
+    for work in ('2', '3', '4'):
+        server._page('speeches', {'work_id': work}, base)
+    assert len(server._queries) == 2
@@ -0,0 +1,233 @@
+'''tests for dicesapi.stats and the instrumentation of DicesAPI, text, manto and wikidata'''
+
+import logging
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dicesapi import manto, stats
+from dicesapi.manto import TokenBucket
+from dicesapi.stats import LATENCY_BOUNDS, Stats, combine
+from dicesapi.text import getXML
+
+
+@pytest.fixture(autouse=True)
+def clean_shared(monkeypatch):
+    '''isolate each test from the process-wide collector and MANTO index'''
+
+    monkeypatch.setattr(stats, 'shared', Stats())
+    monkeypatch.setattr(manto, '__manto_index__', {})
+    monkeypatch.setattr(manto, '__manto_store__', None)
+    monkeypatch.setattr(manto, '_limiter', TokenBucket(rate=1e6, capacity=1e6))
+
+
+def _response(payload, content=b'', status=200):
+    res = Mock()
+    res.ok = status == 200
+    res.status_code = status
+    res.content = content
+    res.json.return_value = payload
+    return res
+
+
+def test_record_request_counts_by_endpoint_and_host():
+    s = Stats()
+    s.recordRequest('dices', 'speeches', 'http://a.example.org/api/speeches', 0.003, nbytes=10)
+    s.recordRequest('dices', 'speeches', 'http://a.example.org/api/speeches?page=2', 0.3,
+                    nbytes=5, ok=False, retry=True)
+    s.recordRequest('dices', 'works', 'http://b.example.org/api/works', 20)
+
+    snap = s.snapshot()
+    speeches = snap['requests']['dices']['speeches']
+    assert speeches['count'] == 2
+    assert speeches['errors'] == 1
+    assert speeches['retries'] == 1
+    assert speeches['bytes'] == 15
+    assert speeches['max_seconds'] == 0.3
+    assert speeches['latency'][0] == 1
+    assert speeches['latency'][LATENCY_BOUNDS.index(0.5)] == 1
+    assert sum(speeches['latency']) == 2
+
+    assert snap['hosts']['a.example.org']['count'] == 2
+    assert snap['hosts']['b.example.org']['latency'][-1] == 1
+
+
+def test_record_query_and_cache():
+    s = Stats()
+    s.recordQuery('dices', 'speeches', 3)
+    s.recordQuery('dices', 'speeches', 1)
+    s.recordCache('cts', True)
+    s.recordCache('cts', False)
+    s.recordCache('cts', True)
+
+    snap = s.snapshot()
+    assert snap['queries']['dices']['speeches'] == dict(count=2, pages=4, max_pages=3)
+    assert snap['caches']['cts'] == dict(hits=2, misses=1)
+
+
+def test_reset_keeps_callbacks():
+    s = Stats()
+    events = []
+    s.addCallback(events.append)
+    s.recordCache('cts', True)
+    s.reset()
+    s.recordCache('cts', False)
+
+    assert s.snapshot()['caches'] == {'cts': dict(hits=0, misses=1)}
+    assert [e['hit'] for e in events] == [True, False]
+
+
+def test_failing_callback_is_logged_not_raised(caplog):
+    s = Stats()
+
+    def broken(event):
+        raise RuntimeError('boom')
+
+    s.addCallback(broken)
+    with caplog.at_level(logging.ERROR, logger='dicesapi'):
+        s.recordQuery('dices', 'works', 1)
+
+    assert s.snapshot()['queries']['dices']['works']['count'] == 1
+    assert 'callback' in caplog.text
+
+    s.removeCallback(broken)
+    s.recordQuery('dices', 'works', 1)
+
+
+def test_time_request_counts_exceptions_as_errors():
+    s = Stats()
+    with pytest.raises(ConnectionError):
+        with s.timeRequest('manto', 'entity', 'https://api.example.org/x'):
+            raise ConnectionError()
+
+    entry = s.snapshot()['requests']['manto']['entity']
+    assert entry['count'] == 1
+    assert entry['errors'] == 1
+
+
+def test_combine_adds_snapshots():
+    a, b = Stats(), Stats()
+    a.recordRequest('dices', 'speeches', 'http://h/api/speeches', 0.01, nbytes=1)
+    b.recordRequest('dices', 'speeches', 'http://h/api/speeches', 2, nbytes=2)
+    b.recordRequest('manto', 'entity', 'https://m/x', 0.1)
+    a.recordCache('cts', True)
+    b.recordCache('cts', False)
+
+    snap = combine(a.snapshot(), b.snapshot())
+    assert snap['requests']['dices']['speeches']['count'] == 2
+    assert snap['requests']['dices']['speeches']['bytes'] == 3
+    assert snap['requests']['dices']['speeches']['max_seconds'] == 2
+    assert snap['requests']['manto']['entity']['count'] == 1
+    assert snap['hosts']['h']['count'] == 2
+    assert snap['caches']['cts'] == dict(hits=1, misses=1)
+
+
+def test_paged_json_records_requests_and_pages(api):
+    first = _response({'count': 2, 'next': 'http://testserver/api/authors?page=2',
+                        'results': [{'id': 1}]}, content=b'x' * 40)
+    second = _response({'count': 2, 'next': None, 'results': [{'id': 2}]}, content=b'x' * 30)
+
+    with patch('dicesapi.requests.get', side_effect=[first, second]) as mock_get:
+        api.getPagedJSON('authors')
+
+    mock_get.assert_any_call('http://testserver/api/authors', None)
+    snap = api.stats()
+    assert snap['requests']['dices']['authors']['count'] == 2
+    assert snap['requests']['dices']['authors']['bytes'] == 70
+    assert snap['hosts']['testserver']['count'] == 2
+    assert snap['queries']['dices']['authors'] == dict(count=1, pages=2, max_pages=2)
+
+
+def test_index_hits_and_misses(api, speech_data):
+    api.indexedSpeech(speech_data)
+    api.indexedSpeech(speech_data['id'])
+
+    caches = api.stats()['caches']
+    assert caches['index.speech'] == dict(hits=1, misses=1)
+    assert caches['index.work']['misses'] == 1
+    assert caches['index.characterinstance']['misses'] >= 1
+
+
+def test_cts_cache_and_requests(api, speech_data):
+    api.initializeCts()
+    speech = api.indexedSpeech(speech_data)
+    tei = b'<TEI xmlns="http://www.tei-c.org/ns/1.0"><l n="1">arma</l></TEI>'
+
+    with patch('dicesapi.text.requests.get', return_value=_response(None, content=tei)):
+        getXML(speech)
+        getXML(speech)
+
+    snap = api.stats()
+    assert snap['caches']['cts'] == dict(hits=1, misses=1)
+    assert snap['requests']['cts']['passage']['bytes'] == len(tei)
+    assert snap['hosts']['atlas.perseus.tufts.edu']['count'] == 1
+
+
+def test_manto_lookups_are_shared(api):
+    events = []
+    api.addStatsCallback(events.append)
+    payload = {'data': {'objects': {'M1': {'object': {'object_name': 'Thetis'},
+                                            'object_definitions': {}}}}}
+
+    with patch('dicesapi.manto.requests.get', return_value=_response(payload)):
+        manto.getMantoID('M1')
+        manto.getMantoID('M1')
+
+    snap = api.stats()
+    assert snap['caches']['manto'] == dict(hits=1, misses=1)
+    assert snap['requests']['manto']['entity']['count'] == 1
+    assert {e['event'] for e in events} == {'cache', 'request'}
+
+    api.removeStatsCallback(events.append)
+    api.resetStats()
+    assert api.stats()['caches'] == {}
+
+
+def test_wikidata_cache_lookups(api):
+    pytest.importorskip('wikidata')
+    from dicesapi import wikidata as wd
+
+    entity = object()
+    assert wd.getWDfromID('Q1', cache={'Q1': entity}) is entity
+    assert api.stats()['caches']['wikidata'] == dict(hits=1, misses=0)
+
+
+def test_manto_retry_of_expired_error(api, tmp_path):
+    clock = Mock(return_value=0.0)
+    manto.__manto_store__ = manto.MantoStore(str(tmp_path / 'manto.sqlite'),
+                                                error_max_age=10, clock=clock)
+
+    with patch('dicesapi.manto.requests.get',
+                return_value=_response(None, status=500)) as mock_get:
+        manto._resolve('M1', debug=False)
+        manto._resolve('M1', debug=False)
+        clock.return_value = 11.0
+        manto._resolve('M1', debug=False)
+
+    assert mock_get.call_count == 2
+    entry = api.stats()['requests']['manto']['entity']
+    assert (entry['count'], entry['errors'], entry['retries']) == (2, 2, 1)
+
+
+def test_wikidata_response_bytes(api, monkeypatch):
+    pytest.importorskip('wikidata')
+    from wikidata.entity import Entity
+    from dicesapi import wikidata as wd
+
+    result = {'entities': {'Q1': {'id': 'Q1', 'labels': {'en': {'value': 'Ἀχιλλεύς'}}}}}
+    client = Mock()
+    client.base_url = 'https://www.wikidata.org/'
+    client.request.return_value = result
+    entity = Entity('Q1', client)
+    entity.data = result['entities']['Q1']
+    client.get.return_value = entity
+    monkeypatch.setattr(wd, '_client', client)
+    monkeypatch.setattr(wd, '__claim_index__', wd.ClaimIndex())
+
+    wd.prefetch(['Q1'], cache={})
+    wd.getWDfromID('Q1', cache={})
+
+    requests = api.stats()['requests']['wikidata']
+    assert requests['wbgetentities']['bytes'] == stats.jsonSize(result)
+    assert requests['entity']['bytes'] == stats.jsonSize(result['entities']['Q1'])
+    assert stats.jsonSize(result) > len('Ἀχιλλεύς')
@@ -84,6 +84,35 @@ def test_get_line_for_text_position():
     assert line == passage.line_array[1]
 
 
+def test_align_tokens_vectorized():
+    passage = Passage()
+    passage.xml = _fake_xml()
+    passage._buildLineArray()
+    passage._buildLineIndex()
+
+    # three fake tokens: start of line 1, middle of line 1, start of line 2
+    second_line_start = len(passage.line_array[0]['text']) + 1
+    passage.nlp = ['Some', 'words', 'and']
+    passage._token_index = [0, 5, second_line_start]
+
+    line_index, line_pos = passage.alignTokens()
+
+    assert line_index.tolist() == [0, 0, 1]
+    assert line_pos.tolist() == [0, 5, 0]
+    assert passage.getLinePos(1) == 5
+    assert passage.getLineIndex(2) == 1
+
+    # cached until the token index changes
+    assert passage.alignTokens() is passage.alignTokens()
+    passage._token_index = [0]
+    assert passage.alignTokens()[0].tolist() == [0]
+
+
+def test_align_tokens_requires_index():
+    passage = Passage()
+    assert passage.alignTokens() is None
+
+
 def test_initialize_cts_sets_config(api):
     api.initializeCts()
     assert 'cts_pattern' in api.config
@@ -154,3 +183,26 @@ def test_fetch_passage_raises_without_init(api, speech_data):
         assert False, 'expected RuntimeError'
     except RuntimeError as e:
         assert 'initializeCts' in str(e)
+
+
+def test_adjusted_urn_applies_perseus_adjustments(api, speech_data):
+    from dicesapi.text import getAdjustedUrn, getAdjustments
+
+    urn = 'urn:cts:latinLit:stoa0089.stoa005.perseus-lat2'
+    speech_data['work']['urn'] = urn
+    speech_data['l_fi'] = '2.praef.1'
+    speech_data['l_la'] = '2.20'
+    speech = api.indexedSpeech(speech_data)
+
+    assert getAdjustedUrn(speech) == f'{urn}:2.pr.1-2.1.20'
+
+    # compiled patterns are memoized per work
+    assert getAdjustments(urn) is getAdjustments(urn)
+
+
+def test_adjusted_urn_unadjusted_work(api, speech_data):
+    from dicesapi.text import getAdjustedUrn
+
+    speech = api.indexedSpeech(speech_data)
+
+    assert getAdjustedUrn(speech) == speech.urn
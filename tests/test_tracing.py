@@ -0,0 +1,109 @@
+'''tests for dicesapi.tracing'''
+
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from dicesapi import DicesAPI, tracing
+from dicesapi.tracing import Tracer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _page(results, next_url=None):
+    res = Mock()
+    res.status_code = 200
+    res.content = b'{}'
+    res.json.return_value = {'count': 2, 'next': next_url, 'results': results}
+    return res
+
+
+def test_spans_nest_and_summarize():
+    clock = FakeClock()
+    tracer = Tracer(clock=clock)
+
+    with tracer.span('outer', cat='query'):
+        clock.now += 1
+        with tracer.span('inner', cat='http') as inner:
+            clock.now += 2
+            inner.set(bytes=10)
+        clock.now += 1
+
+    outer_rec, inner_rec = tracer.records()
+    assert outer_rec['name'] == 'outer' and outer_rec['parent'] is None
+    assert inner_rec['parent'] == outer_rec['id']
+    assert inner_rec['attrs'] == {'bytes': 10}
+    assert outer_rec['seconds'] == 4
+
+    summary = tracer.summary()
+    assert summary['outer']['self_seconds'] == 2
+    assert summary['inner']['self_seconds'] == 2
+    assert summary['outer']['seconds'] == 4
+
+
+def test_span_records_exception():
+    tracer = Tracer()
+    with pytest.raises(KeyError):
+        with tracer.span('failing'):
+            raise KeyError('x')
+
+    assert tracer.records()[0]['attrs']['error'] == 'KeyError'
+
+
+def test_span_is_noop_when_off():
+    assert tracing.active() is None
+    with tracing.span('nothing') as span:
+        span.set(x=1)
+
+
+def test_get_speeches_trace(api, speech_data, tmp_path):
+    pages = [_page([speech_data], 'http://testserver/api/speeches?page=2'), _page([])]
+    path = str(tmp_path / 'trace.json')
+
+    with patch('dicesapi.requests.get', side_effect=pages):
+        with tracing.trace(path) as tracer:
+            api.getSpeeches()
+    assert tracing.active() is None
+
+    records = {r['name']: r for r in tracer.records()}
+    query = records['DicesAPI.getSpeeches']
+    assert records['DicesAPI.getPagedJSON']['parent'] == query['id']
+    assert records['hydrate']['parent'] == query['id']
+    assert records['hydrate']['attrs']['records'] == 1
+    http = [r for r in tracer.records() if r['cat'] == 'http']
+    assert len(http) == 2
+    assert all(r['parent'] == records['DicesAPI.getPagedJSON']['id'] for r in http)
+
+    with open(path) as f:
+        doc = json.load(f)
+    events = doc['traceEvents']
+    assert {e['ph'] for e in events} == {'X'}
+    assert 'DicesAPI.getSpeeches' in {e['name'] for e in events}
+
+
+def test_from_dump_trace_jsonl(tmp_path):
+    dump = [{'model': 'speechdb.author', 'pk': 1, 'fields': {'name': 'Homer'}}]
+    path = str(tmp_path / 'trace.jsonl')
+
+    with tracing.trace(path):
+        DicesAPI.fromDump(dump)
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    names = [r['name'] for r in records]
+    assert names[0] == 'DicesAPI.fromDump'
+    assert 'dumpTables' in names
+    hydrated = [r['attrs']['model'] for r in records if r['name'] == 'hydrate']
+    assert hydrated[0] == 'author'
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        Tracer().export('trace.out', format='xml')
@@ -0,0 +1,142 @@
+'''tests for dicesapi.wikidata, with the Wikidata client stubbed out'''
+
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip('wikidata')
+
+from wikidata.client import Client
+
+from dicesapi import Character, wikidata as wd
+
+
+class StubClient(Client):
+    '''Answers wbgetentities and Special:EntityData requests from a dict'''
+
+    def __init__(self, entities):
+        super().__init__()
+        self.entities = entities
+        self.requests = []
+
+    def request(self, path):
+        self.requests.append(path)
+        if 'wbgetentities' in path:
+            ids = parse_qs(urlparse(path).query)['ids'][0].split('|')
+            return {'entities': {i: self.entities.get(i, {'id': i, 'missing': ''})
+                                    for i in ids}}
+        entity_id = path.rsplit('/', 1)[-1].split('.')[0]
+        return {'entities': {entity_id: self.entities[entity_id]}}
+
+
+def _claim(target):
+    return {'rank': 'normal', 'mainsnak': {
+        'snaktype': 'value', 'datatype': 'wikibase-item',
+        'datavalue': {'type': 'wikibase-entityid',
+                        'value': {'entity-type': 'item', 'id': target}}}}
+
+
+def _item(wd_id, label=None, claims=None):
+    data = {'id': wd_id, 'type': 'item',
+            'claims': {prop: [_claim(t) for t in targets]
+                        for prop, targets in (claims or {}).items()}}
+    if label is not None:
+        data['labels'] = {'en': {'language': 'en', 'value': label}}
+    return data
+
+
+@pytest.fixture
+def client(monkeypatch):
+    entities = {f'Q{n}': _item(f'Q{n}', f'item {n}') for n in range(1, 121)}
+    # Achilles (Q1001), son of Thetis (Q1002) and Peleus (Q1003)
+    entities['Q1001'] = _item('Q1001', 'Achilles',
+                                {wd.HAS_MOTHER: ['Q1002'], wd.HAS_FATHER: ['Q1003']})
+    entities['Q1002'] = _item('Q1002', 'Thetis', {wd.HAS_CHILD: ['Q1001']})
+    # Q200 was merged into Q1
+    entities['Q200'] = dict(entities['Q1'])
+    stub = StubClient(entities)
+    monkeypatch.setattr(wd, '_client', stub)
+    monkeypatch.setattr(wd, '__wd_cache__', {})
+    monkeypatch.setattr(wd, '__claim_index__', wd.ClaimIndex())
+    monkeypatch.setattr(wd, '__claim_index_path__', None)
+    return stub
+
+
+def test_prefetch_batches_requests(client):
+    cache = {}
+    ids = [f'Q{n}' for n in range(1, 121)]
+
+    found = wd.prefetch(ids, cache=cache)
+
+    assert len(client.requests) == 3
+    assert len(found) == 120
+    assert wd.getLabel(cache['Q57']) == 'item 57'
+
+    # everything is cached now
+    assert wd.getWDfromID('Q57', cache=cache) is cache['Q57']
+    wd.prefetch(ids, cache=cache)
+    assert len(client.requests) == 3
+
+
+def test_prefetch_characters_missing_and_redirected(client):
+    cache = {}
+    chars = [Character(dict(id=1, name='Achilles', wd='Q1')),
+                Character(dict(id=2, name='Nobody', wd='Q999')),
+                Character(dict(id=3, name='Merged', wd='Q200')),
+                Character(dict(id=4, name='Unlinked', wd=None))]
+
+    found = wd.prefetch(chars, cache=cache, batch_size=2)
+
+    assert len(client.requests) == 2
+    assert set(found) == {'Q1', 'Q200'}
+    assert found['Q200'] is found['Q1']
+    assert 'Q999' not in cache
+
+
+def test_check_relation_uses_claim_index(client):
+    cache = {}
+    wd.prefetch(['Q1001', 'Q1002'], cache=cache)
+    n_requests = len(client.requests)
+
+    achilles = Character(dict(id=1, name='Achilles', wd='Q1001'))
+    assert wd.checkWDRelation(achilles, 'Q1002', wd.HAS_MOTHER, cache=cache) is True
+    assert wd.checkWDRelation('Q1001', 'Q1003', wd.HAS_MOTHER, cache=cache) is False
+    assert wd.checkWDRelation('Q1002', achilles, wd.HAS_CHILD, cache=cache) is True
+    assert wd.relatedIDs('Q1001', wd.HAS_FATHER, cache=cache) == {'Q1003'}
+    # Peleus (Q1003) is only ever a target, so he is never downloaded
+    assert len(client.requests) == n_requests
+
+    # an unindexed subject is downloaded once, then indexed
+    assert wd.checkWDRelation('Q5', 'Q1', wd.HAS_MOTHER, cache=cache) is False
+    assert 'Q5' in wd.__claim_index__
+    assert wd.checkWDRelation(None, 'Q1', wd.HAS_MOTHER, cache=cache) is None
+
+
+def test_check_relation_redirected_ids(client):
+    # Q1004 was merged into Thetis (Q1002)
+    client.entities['Q1004'] = dict(client.entities['Q1002'])
+    cache = {}
+    wd.prefetch(['Q1001', 'Q1004'], cache=cache)
+    n_requests = len(client.requests)
+
+    assert wd.checkWDRelation('Q1001', 'Q1004', wd.HAS_MOTHER, cache=cache) is True
+    assert wd.checkWDRelation('Q1004', 'Q1001', wd.HAS_CHILD, cache=cache) is True
+    assert wd.relatedIDs('Q1004', wd.HAS_CHILD, cache=cache) == {'Q1001'}
+    assert len(client.requests) == n_requests
+
+
+def test_claim_index_persists(client, tmp_path):
+    path = str(tmp_path / 'claims.json.gz')
+    wd.useClaimIndex(path)
+    wd.prefetch(['Q1001'], cache={})
+    wd.saveClaimIndex()
+
+    index = wd.useClaimIndex(path)
+    assert index.targets('Q1001', wd.HAS_MOTHER) == {'Q1002'}
+    assert index.targets('Q1001', wd.HAS_SPOUSE) == set()
+    assert index.targets('Q9', wd.HAS_MOTHER) is None
+
+    # answered from the reloaded index, with an empty entity cache
+    n_requests = len(client.requests)
+    assert wd.checkWDRelation('Q1001', 'Q1003', wd.HAS_FATHER, cache={}) is True
+    assert len(client.requests) == n_requests